@@ -1,6 +1,9 @@
+from PyQt5.QtWidgets import QApplication
+
 from core.config import Config
 from core.db import Database
 from core.logger import AppLogger
+from core.tracing import TRACER
 from services.service_manager import ServiceManager
 from ui.main_window import MainWindow
 
@@ -13,11 +16,44 @@ class App:
         if not db_url.startswith("sqlite://"):
             db_url = f"sqlite:///{db_url}"
         self.db = Database(db_url)
-        self.logger = AppLogger(self.db)
+        TRACER.configure(
+            capacity=self.config.get('latency_trace_size', 2048),
+            enabled=self.config.get('latency_trace_enabled', True)
+        )
+        self.logger = AppLogger(
+            self.db,
+            level=self.config.get('log_level', 'INFO'),
+            source_levels=self.config.get('log_source_levels')
+        )
         self.service_manager = ServiceManager(self.logger, self.db, self.config)
         self.main_window = MainWindow(self.service_manager, self.logger, self.config)
+        # Background services, started in parallel; each optional one only
+        # when its setting is present
+        services = ['writer', 'maintenance', 'webhooks']
+        optional = {
+            'replication': 'replication_url',
+            'forwarder': 'api_endpoint',
+            'tcp_broadcast': 'tcp_broadcast_port',
+            'modbus': 'modbus_port',
+            'mqtt': 'mqtt_host'
+        }
+        services += [service_id for service_id, key in optional.items() if self.config.get(key)]
+        errors = self.service_manager.start_many(services)
+        # Other failures are logged and shown as errors in the service
+        # status, and must not keep the scale UI from starting; without
+        # the writer no sample would be stored
+        if errors.get('writer'):
+            raise RuntimeError(errors['writer'])
+        # Restarts whatever crashes, hangs or stalls from here on, including
+        # the services that failed to start above
+        self.service_manager.supervisor.start()
 
     def run(self):
         # show main window and wire logger callback
-        self.logger.set_ui_callback(self.main_window.append_log)
-        self.main_window.show()
\ No newline at end of file
+        self.main_window.setup_connections()
+        QApplication.instance().aboutToQuit.connect(self.shutdown)
+        self.main_window.show()
+
+    def shutdown(self):
+        self.service_manager.stop_all()
+        self.logger.close()
\ No newline at end of file
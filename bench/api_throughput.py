@@ -0,0 +1,126 @@
+"""
+Requests/s of the hot API endpoints, over HTTP and in-process.
+
+Runs the API service on a loopback port against stub services, so no scale
+or database is needed. ``--uncached`` makes every lookup in the response
+cache miss, which measures the encode-per-request path the cache replaced.
+
+Usage:
+    python -m bench.api_throughput [--seconds 3] [--clients 4] [--uncached]
+"""
+import argparse
+import http.client
+import logging
+import threading
+import time
+
+from core.response_cache import ResponseCache
+from core.sample import WeightSample
+from services.api_service import ApiService
+from services.service_manager import ServiceManager
+
+ENDPOINTS = ('/api/weight', '/api/status')
+
+
+class BenchScale:
+    """Serial service stand-in holding one stable reading."""
+
+    def __init__(self, logger, db, config, service_manager=None):
+        sample = WeightSample(1, 1234.5, True, time.time())
+        self.last_stable_sample = sample
+        self.stable_reading = (1, sample)
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def is_alive(self):
+        return self.running
+
+    def get_last_stable(self):
+        return self.last_stable_sample.weight_kg
+
+
+class BenchIdle(BenchScale):
+    """Another running service, so /api/status has a few entries to list."""
+
+
+class UncachedResponseCache(ResponseCache):
+    def get(self, key, max_age=None):
+        self.misses += 1
+        return None
+
+
+def http_rate(port, path, seconds, clients):
+    """Requests/s for ``clients`` keep-alive connections hammering ``path``"""
+    counts = [0] * clients
+    deadline = time.monotonic() + seconds
+
+    def client(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        try:
+            while time.monotonic() < deadline:
+                conn.request('GET', path)
+                conn.getresponse().read()
+                counts[index] += 1
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def in_process_rate(api, path, requests):
+    """Requests/s through the Flask test client: handler cost without sockets"""
+    client = api.app.test_client()
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0, help='HTTP run length per endpoint')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent keep-alive connections')
+    parser.add_argument('--requests', type=int, default=3000, help='In-process requests per endpoint')
+    parser.add_argument('--port', type=int, default=5124)
+    parser.add_argument('--uncached', action='store_true', help='Bypass the response cache')
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    manager = ServiceManager(logger, None, {})
+    manager._service_registry.clear()
+    manager.register_service('serial', 'bench.api_throughput', 'BenchScale')
+    for service_id in ('writer', 'maintenance'):
+        manager.register_service(service_id, 'bench.api_throughput', 'BenchIdle')
+    manager.start_many(['serial', 'writer', 'maintenance'])
+
+    config = {'flask_port': args.port, 'api_rate_limit': 1e9, 'api_rate_burst': 1e9}
+    api = ApiService(logger, config=config, service_manager=manager)
+    if args.uncached:
+        api.cache = UncachedResponseCache()
+    api.start()
+    try:
+        mode = 'uncached' if args.uncached else 'cached'
+        for path in ENDPOINTS:
+            rate = http_rate(args.port, path, args.seconds, args.clients)
+            print(f"{path:<14} {mode:<9} http        {rate:>9.0f} req/s")
+        for path in ENDPOINTS:
+            rate = in_process_rate(api, path, args.requests)
+            print(f"{path:<14} {mode:<9} in-process  {rate:>9.0f} req/s")
+    finally:
+        api.stop()
+        manager.stop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import json
+import math
+import threading
+import time
+
+from werkzeug.wsgi import ClosingIterator
+
+from core.metrics import REGISTRY
+
+REJECTED = REGISTRY.counter('api_rejected_total', 'Requests refused before routing', ['reason'])
+INFLIGHT = REGISTRY.gauge('api_inflight_requests', 'Requests being processed')
+
+
+class _ClientUsage:
+    __slots__ = ('tokens', 'updated', 'rate', 'burst', 'requests', 'limited', 'last_seen')
+
+    def __init__(self, rate, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+        self.rate = rate
+        self.burst = burst
+        self.requests = 0
+        self.limited = 0
+        self.last_seen = now
+
+
+class AdmissionControl:
+    """
+    WSGI middleware that admits or rejects requests before they reach Flask.
+
+    Every client gets a token bucket. A request carrying a configured API
+    key (``X-API-Key``) is charged to that key with its own limits. Any
+    other request is charged to its IP address, so unknown keys cannot be
+    used to mint fresh buckets. A client that has run out of tokens gets 429
+    with a ``Retry-After`` of when the next token is due. Admitted requests
+    also count against a global in-flight cap; beyond it the answer is an
+    immediate 503. Rejections are written straight to WSGI without routing
+    or logging, so an abusive poller costs microseconds per request.
+    """
+
+    def __init__(self, app, rate=20.0, burst=40, max_inflight=64, api_keys=None,
+                 exempt_prefixes=(), max_clients=4096, logger=None):
+        """
+        Args:
+            app: WSGI application to protect
+            rate: Sustained requests per second per client; 0 disables limiting
+            burst: Requests a client may make in a burst
+            max_inflight: Requests processed concurrently before 503
+            api_keys: Optional {key: {'name', 'rate', 'burst'}} overrides
+            exempt_prefixes: Paths not counted as in flight (long-lived streams)
+            max_clients: Idle clients are forgotten beyond this many
+        """
+        self.app = app
+        self.rate = rate
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.api_keys = api_keys or {}
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.max_clients = max_clients
+        self.logger = logger
+        self.inflight = 0
+        self.rejected_busy = 0
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._rejected_rate = REJECTED.labels('rate_limited')
+        self._rejected_busy = REJECTED.labels('busy')
+        INFLIGHT.set_function(lambda: self.inflight)
+
+    def __call__(self, environ, start_response):
+        client, rate, burst = self._identify(environ)
+        exempt = environ.get('PATH_INFO', '').startswith(self.exempt_prefixes)
+        now = time.monotonic()
+        retry_after = None
+        busy = False
+        with self._lock:
+            usage = self._clients.get(client)
+            if usage is None:
+                usage = self._add_client(client, rate, burst, now)
+            usage.requests += 1
+            usage.last_seen = now
+            if usage.rate:
+                usage.tokens = min(usage.burst, usage.tokens + (now - usage.updated) * usage.rate)
+                usage.updated = now
+                if usage.tokens < 1:
+                    usage.limited += 1
+                    retry_after = (1 - usage.tokens) / usage.rate
+                else:
+                    usage.tokens -= 1
+            if retry_after is None and not exempt:
+                if self.inflight >= self.max_inflight:
+                    self.rejected_busy += 1
+                    busy = True
+                else:
+                    self.inflight += 1
+
+        if retry_after is not None:
+            self._rejected_rate.inc()
+            if usage.limited == 1 and self.logger:
+                self.logger.warning(f"API client {client} exceeded its rate limit", source='api')
+            return self._reject(start_response, '429 Too Many Requests', retry_after, 'Rate limit exceeded')
+        if busy:
+            self._rejected_busy.inc()
+            return self._reject(start_response, '503 Service Unavailable', 1, 'Server busy')
+        if exempt:
+            return self.app(environ, start_response)
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self._release()
+            raise
+        return ClosingIterator(result, self._release)
+
+    def snapshot(self):
+        """Admission counters and per-client usage, for /api/status"""
+        with self._lock:
+            clients = {
+                client: {
+                    'requests': usage.requests,
+                    'rate_limited': usage.limited,
+                    'idle_s': round(time.monotonic() - usage.last_seen, 1)
+                }
+                for client, usage in self._clients.items()
+            }
+            return {
+                'inflight': self.inflight,
+                'max_inflight': self.max_inflight,
+                'rejected_busy': self.rejected_busy,
+                'clients': clients
+            }
+
+    def _identify(self, environ):
+        key = environ.get('HTTP_X_API_KEY')
+        if key and key in self.api_keys:
+            limits = self.api_keys[key]
+            return (
+                f"key:{limits.get('name', key[:4] + '…')}",
+                limits.get('rate', self.rate),
+                limits.get('burst', self.burst)
+            )
+        return f"ip:{environ.get('REMOTE_ADDR', '-')}", self.rate, self.burst
+
+    def _add_client(self, client, rate, burst, now):
+        if len(self._clients) >= self.max_clients:
+            # Forget the least recently seen half; their buckets were
+            # most likely full again anyway
+            idle = sorted(self._clients.items(), key=lambda item: item[1].last_seen)
+            for stale, _ in idle[:len(idle) // 2]:
+                del self._clients[stale]
+        usage = self._clients[client] = _ClientUsage(rate, burst, now)
+        return usage
+
+    def _release(self):
+        with self._lock:
+            self.inflight -= 1
+
+    @staticmethod
+    def _reject(start_response, status, retry_after, message):
+        body = json.dumps({'status': 'error', 'message': message}).encode('utf-8')
+        start_response(status, [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(max(1, math.ceil(retry_after))))
+        ])
+        return [body]
@@ -0,0 +1,202 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.db import Database
+
+
+class BackupError(Exception):
+    """Raised when a backup or restore cannot be completed safely."""
+
+
+class DatabaseBackup:
+    """
+    Online backup and hot restore of the SQLite database.
+
+    Backups are taken with the SQLite online backup API in small page steps
+    from a single read snapshot, so the writer keeps committing (WAL mode)
+    while the copy runs. Every backup is integrity-checked before it is
+    compressed and published under its final name.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, db_path, backup_dir=None, pages_per_step=512, step_pause=0.0):
+        """
+        Args:
+            db_path: Path of the live database file
+            backup_dir: Directory for backup files (default: ./backups next to the DB)
+            pages_per_step: Pages copied per backup step
+            step_pause: Seconds to sleep between steps to throttle disk I/O
+        """
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+
+    def create(self, progress=None, cancel_event=None):
+        """
+        Create a compressed, verified backup of the live database.
+
+        Args:
+            progress: Optional callable(stage, done, total)
+            cancel_event: Optional threading.Event that aborts the backup
+
+        Returns:
+            str: Path of the finished ``.db.gz`` backup
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        final_path = os.path.join(self.backup_dir, f"weighbridge_backup_{timestamp}.db.gz")
+        raw_path = final_path[:-len('.gz')] + '.partial'
+
+        try:
+            self._copy_online(raw_path, progress, cancel_event)
+            self._notify(progress, 'verify', 0, 1)
+            self.verify(raw_path)
+            self._notify(progress, 'verify', 1, 1)
+            self._compress(raw_path, final_path, progress, cancel_event)
+        finally:
+            for leftover in (raw_path, final_path + '.partial'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        return final_path
+
+    def restore(self, db, backup_path, progress=None):
+        """
+        Replace the live database with a backup without restarting the app.
+
+        The backup is decompressed, verified and migrated to the current
+        schema next to the live file first, so a backup the app cannot use is
+        rejected before anything is touched; the swap itself happens with all writers blocked and the connection
+        pool closed, and is a single atomic rename.
+
+        Args:
+            db: The application's Database instance
+            backup_path: A ``.db`` or ``.db.gz`` backup file
+            progress: Optional callable(stage, done, total)
+        """
+        staged_path = self.db_path + '.restore'
+        try:
+            self._stage(backup_path, staged_path, progress)
+            self._notify(progress, 'verify', 0, 1)
+            self.verify(staged_path)
+            self.upgrade(staged_path)
+            self._notify(progress, 'verify', 1, 1)
+
+            self._notify(progress, 'swap', 0, 1)
+            with db.quiesce():
+                # Closing the last connection checkpoints and removes the
+                # WAL, so no stale frames get replayed onto the new file.
+                conn = sqlite3.connect(self.db_path)
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                conn.close()
+                for suffix in ('-wal', '-shm'):
+                    if os.path.exists(self.db_path + suffix):
+                        os.remove(self.db_path + suffix)
+                os.replace(staged_path, self.db_path)
+            self._notify(progress, 'swap', 1, 1)
+        finally:
+            for leftover in (staged_path, staged_path + '-wal', staged_path + '-shm'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    @staticmethod
+    def verify(path):
+        """Run an integrity check on a database file, raising BackupError on failure."""
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute('PRAGMA integrity_check').fetchall()
+        except sqlite3.DatabaseError as e:
+            raise BackupError(f"{os.path.basename(path)} is not a valid database: {e}") from e
+        finally:
+            conn.close()
+        if rows != [('ok',)]:
+            problems = '; '.join(row[0] for row in rows[:5])
+            raise BackupError(f"Integrity check failed for {os.path.basename(path)}: {problems}")
+
+    @staticmethod
+    def upgrade(path):
+        """Migrate a database file to the current schema, raising BackupError if it cannot be used."""
+        name = os.path.basename(path)
+        try:
+            staged = Database(f"sqlite:///{path}")
+        except SQLAlchemyError as e:
+            raise BackupError(f"{name} cannot be upgraded to the current schema: {e}") from e
+        try:
+            missing = {table: staged.missing_columns(table) for table in ('readings', 'logs')}
+        finally:
+            staged.engine.dispose()
+        problems = '; '.join(f"{table} lacks {', '.join(columns)}" for table, columns in missing.items() if columns)
+        if problems:
+            raise BackupError(f"{name} does not match the current schema: {problems}")
+
+    def list_backups(self):
+        """Return backup file paths, newest first."""
+        if not os.path.exists(self.backup_dir):
+            return []
+        backups = [
+            os.path.join(self.backup_dir, f) for f in os.listdir(self.backup_dir)
+            if f.endswith('.db') or f.endswith('.db.gz')
+        ]
+        return sorted(backups, key=os.path.getmtime, reverse=True)
+
+    def _copy_online(self, dest_path, progress, cancel_event):
+        src = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        dst = sqlite3.connect(dest_path)
+        try:
+            # Pin one read snapshot for the whole copy. In WAL mode this does
+            # not block the writer, and it stops the backup from restarting
+            # every time a new reading is committed.
+            src.execute('BEGIN')
+            src.execute('SELECT count(*) FROM sqlite_master').fetchone()
+
+            def on_step(status, remaining, total):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise BackupError("Backup cancelled")
+                self._notify(progress, 'copy', total - remaining, total)
+                if self.step_pause:
+                    time.sleep(self.step_pause)
+
+            src.backup(dst, pages=self.pages_per_step, progress=on_step)
+            src.execute('COMMIT')
+            # Make the copy a self-contained single file
+            dst.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            dst.close()
+            src.close()
+
+    def _compress(self, raw_path, final_path, progress, cancel_event):
+        total = os.path.getsize(raw_path)
+        done = 0
+        partial_path = final_path + '.partial'
+        with open(raw_path, 'rb') as src, gzip.open(partial_path, 'wb', compresslevel=6) as dst:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise BackupError("Backup cancelled")
+                chunk = src.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                done += len(chunk)
+                self._notify(progress, 'compress', done, total)
+        os.replace(partial_path, final_path)
+
+    def _stage(self, backup_path, staged_path, progress):
+        opener = gzip.open if backup_path.endswith('.gz') else open
+        total = os.path.getsize(backup_path)
+        with opener(backup_path, 'rb') as src, open(staged_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+            dst.flush()
+            os.fsync(dst.fileno())
+        self._notify(progress, 'stage', total, total)
+
+    @staticmethod
+    def _notify(progress, stage, done, total):
+        if progress:
+            progress(stage, done, total)
@@ -0,0 +1,183 @@
+"""
+Compact columnar encoding for bulk reading transfers.
+
+A stream is an 8-byte header followed by blocks, and ends with an empty
+block::
+
+    header  '<4sHH'  magic b'WBRD', version, reserved
+    block   '<II'    row count n, reserved
+            int64[n]    id
+            int64[n]    timestamp, epoch microseconds (UTC)
+            float64[n]  weight_kg
+            int32[n]    device_id, -1 for none
+            int32[n]    session_id, -1 for none
+            uint8[n]    flags, bit 0 = stable
+            zero padding to a multiple of 8 bytes
+
+All values are little-endian and every column is naturally aligned, so on
+little-endian hosts the decoder returns ``memoryview`` casts straight over
+the received bytes without copying.
+
+Client example::
+
+    from urllib.request import Request, urlopen
+    from core.binary_format import MIME_TYPE, read_readings
+
+    request = Request('http://scale:5000/api/readings/export?device=1',
+                      headers={'Accept': MIME_TYPE})
+    with urlopen(request) as response:
+        for block in read_readings(response):
+            print(block.rows, max(block.weight_kg))
+"""
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+MIME_TYPE = 'application/x-weighbridge-readings'
+MAGIC = b'WBRD'
+VERSION = 1
+FLAG_STABLE = 1
+
+_HEADER = struct.Struct('<4sHH')
+_BLOCK = struct.Struct('<II')
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+# (field, array typecode, item size), in stream order
+_COLUMNS = (
+    ('id', 'q', 8),
+    ('timestamp_us', 'q', 8),
+    ('weight_kg', 'd', 8),
+    ('device_id', 'i', 4),
+    ('session_id', 'i', 4),
+    ('flags', 'B', 1),
+)
+
+
+class ReadingBlock(namedtuple('ReadingBlock', [name for name, _, _ in _COLUMNS])):
+    """One decoded block; every field is a column of ``rows`` values."""
+    __slots__ = ()
+
+    @property
+    def rows(self):
+        return len(self.id)
+
+
+def encode_header():
+    return _HEADER.pack(MAGIC, VERSION, 0)
+
+
+def encode_end():
+    return _BLOCK.pack(0, 0)
+
+
+def encode_block(rows):
+    """
+    Encode raw reading rows as one block.
+
+    Args:
+        rows: Tuples as returned by ``Database.search_readings(raw=True)``:
+              (id, timestamp, timestamp_us, weight_kg, device_id, is_stable, session_id)
+
+    Returns:
+        bytes
+    """
+    ids, _, timestamps, weights, devices, stable, sessions = zip(*rows)
+    columns = (
+        array('q', ids),
+        array('q', timestamps),
+        array('d', weights),
+        array('i', [-1 if d is None else d for d in devices]),
+        array('i', [-1 if s is None else s for s in sessions]),
+        array('B', [FLAG_STABLE if s else 0 for s in stable]),
+    )
+    parts = [_BLOCK.pack(len(rows), 0)]
+    for column in columns:
+        if not _LITTLE_ENDIAN:
+            column.byteswap()
+        parts.append(column.tobytes())
+    parts.append(b'\0' * (-len(rows) % 8))
+    return b''.join(parts)
+
+
+def _block_size(count):
+    return sum(size for _, _, size in _COLUMNS) * count + (-count % 8)
+
+
+def _decode_columns(view, count):
+    columns = []
+    offset = 0
+    for _, typecode, size in _COLUMNS:
+        end = offset + size * count
+        if _LITTLE_ENDIAN:
+            columns.append(view[offset:end].cast(typecode))
+        else:
+            column = array(typecode)
+            column.frombytes(view[offset:end])
+            column.byteswap()
+            columns.append(column)
+        offset = end
+    return ReadingBlock(*columns)
+
+
+def _check_header(header):
+    if len(header) < _HEADER.size:
+        raise ValueError('Truncated readings stream')
+    magic, version, _ = _HEADER.unpack_from(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Not a readings stream (magic {magic!r}, version {version})')
+
+
+def decode_readings(data):
+    """
+    Decode a complete buffer into blocks.
+
+    Args:
+        data: bytes, bytearray or anything supporting the buffer protocol
+
+    Returns:
+        list of ReadingBlock whose columns are memoryviews into ``data``
+        (arrays on big-endian hosts)
+    """
+    view = memoryview(data)
+    _check_header(view)
+    offset = _HEADER.size
+    blocks = []
+    while True:
+        if offset + _BLOCK.size > len(view):
+            raise ValueError('Truncated readings stream')
+        count, _ = _BLOCK.unpack_from(view, offset)
+        offset += _BLOCK.size
+        if count == 0:
+            return blocks
+        size = _block_size(count)
+        if offset + size > len(view):
+            raise ValueError('Truncated readings stream')
+        blocks.append(_decode_columns(view[offset:offset + size], count))
+        offset += size
+
+
+def read_readings(stream):
+    """
+    Decode blocks incrementally from a file-like object (e.g. an HTTP
+    response), reading each block into its own buffer.
+
+    Yields:
+        ReadingBlock per block
+    """
+    _check_header(stream.read(_HEADER.size))
+    while True:
+        head = stream.read(_BLOCK.size)
+        if len(head) < _BLOCK.size:
+            raise ValueError('Truncated readings stream')
+        count, _ = _BLOCK.unpack(head)
+        if count == 0:
+            return
+        buffer = bytearray(_block_size(count))
+        view = memoryview(buffer)
+        filled = 0
+        while filled < len(buffer):
+            n = stream.readinto(view[filled:])
+            if not n:
+                raise ValueError('Truncated readings stream')
+            filled += n
+        yield _decode_columns(view, count)
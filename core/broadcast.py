@@ -0,0 +1,287 @@
+import selectors
+import socket
+import threading
+import time
+
+
+class QueueSubscriber:
+    """
+    Subscriber for callers that pull frames from their own thread (e.g. a
+    streaming WSGI generator). Holds only the newest frame, so a slow reader
+    skips intermediate values instead of building a backlog.
+    """
+
+    def __init__(self, key=None, heartbeat_interval=15.0, heartbeat=b''):
+        self.key = key
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat = heartbeat
+        self.closed = False
+        self._frame = None
+        self._cond = threading.Condition()
+
+    def offer(self, frame):
+        with self._cond:
+            self._frame = frame
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def __iter__(self):
+        while True:
+            with self._cond:
+                if self._frame is None and not self.closed:
+                    self._cond.wait(self.heartbeat_interval)
+                if self.closed:
+                    return
+                frame, self._frame = self._frame, None
+            yield frame if frame is not None else self.heartbeat
+
+
+class _SocketSubscriber:
+    __slots__ = ('sock', 'key', 'pending', 'latest', 'stalled_since', 'last_sent')
+
+    def __init__(self, sock, key):
+        self.sock = sock
+        self.key = key
+        self.pending = b''
+        self.latest = None
+        self.stalled_since = None
+        self.last_sent = time.monotonic()
+
+
+class Broadcaster:
+    """
+    Fans frames out to many subscribers from a single thread.
+
+    ``publish`` only records the newest payload per key and wakes the
+    thread, so it is cheap enough for the acquisition hot path. The thread
+    encodes each payload once and sends the same bytes to every interested
+    subscriber: those registered for that key, plus those registered with
+    key ``None``. Sockets are written non-blocking. A client that cannot
+    keep up keeps only the newest frame queued behind its partial write.
+    It is dropped if it makes no progress for ``stall_timeout`` seconds.
+    """
+
+    def __init__(self, name, encode, max_subscribers=1000, heartbeat=b'',
+                 heartbeat_interval=15.0, stall_timeout=30.0, logger=None):
+        """
+        Args:
+            name: Thread name
+            encode: callable(payload) -> bytes, called once per frame
+            max_subscribers: Subscribers accepted before ``add_*`` refuses
+            heartbeat: Bytes sent to idle subscribers to detect dead peers
+            heartbeat_interval: Seconds of silence before a heartbeat
+            stall_timeout: Seconds a socket may block before it is dropped
+        """
+        self.name = name
+        self.encode = encode
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.heartbeat_interval = heartbeat_interval
+        self.stall_timeout = stall_timeout
+        self.logger = logger
+        self.frames_encoded = 0
+        self.subscribers_dropped = 0
+        self._latest_frames = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._new_sockets = []
+        self._sockets = {}
+        self._queues = set()
+        self._wake_pending = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def subscriber_count(self):
+        return len(self._sockets) + len(self._new_sockets) + len(self._queues)
+
+    def latest_frame(self, key=None):
+        """The most recently encoded frame for a key, or None."""
+        return self._latest_frames.get(key)
+
+    def start(self):
+        self._stop_event.clear()
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+        for queue_sub in list(self._queues):
+            queue_sub.close()
+        self._queues.clear()
+
+    def publish(self, payload, key=None):
+        """Queue a payload for broadcast; only the newest per key is kept."""
+        with self._lock:
+            self._pending[key] = payload
+            if self._wake_pending:
+                return
+            self._wake_pending = True
+        self._wake()
+
+    def add_socket(self, sock, key=None):
+        """Take ownership of a connected socket; returns False when full."""
+        if self.subscriber_count >= self.max_subscribers:
+            return False
+        sock.setblocking(False)
+        with self._lock:
+            self._new_sockets.append(_SocketSubscriber(sock, key))
+        self._wake()
+        return True
+
+    def subscribe_queue(self, key=None):
+        """Create a pull-style subscriber, or return None when full."""
+        if self.subscriber_count >= self.max_subscribers:
+            return None
+        subscriber = QueueSubscriber(key, self.heartbeat_interval, self.heartbeat)
+        with self._lock:
+            self._queues = self._queues | {subscriber}
+        return subscriber
+
+    def unsubscribe_queue(self, subscriber):
+        with self._lock:
+            self._queues = self._queues - {subscriber}
+        subscriber.close()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
+        try:
+            while not self._stop_event.is_set():
+                timeout = max(0.0, min(next_heartbeat - time.monotonic(), 1.0))
+                for key, events in self._selector.select(timeout):
+                    if key.fileobj is self._wake_r:
+                        self._drain_wake()
+                    else:
+                        self._on_socket_event(key.data, events)
+                self._adopt_new_sockets()
+                self._broadcast_pending()
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    self._send_heartbeats(now)
+                    next_heartbeat = now + self.heartbeat_interval
+        finally:
+            for sub in list(self._sockets.values()):
+                self._drop(sub)
+            self._selector.close()
+            self._wake_r.close()
+            self._wake_w.close()
+
+    def _drain_wake(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _adopt_new_sockets(self):
+        with self._lock:
+            new, self._new_sockets = self._new_sockets, []
+        for sub in new:
+            self._sockets[sub.sock.fileno()] = sub
+            self._selector.register(sub.sock, selectors.EVENT_READ, sub)
+
+    def _broadcast_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._wake_pending = False
+        for key, payload in pending.items():
+            frame = self.encode(payload)
+            self.frames_encoded += 1
+            self._latest_frames[key] = frame
+            if key is not None:
+                self._latest_frames[None] = frame
+            for sub in list(self._sockets.values()):
+                if sub.key is None or sub.key == key:
+                    self._offer(sub, frame)
+            for queue_sub in self._queues:
+                if queue_sub.key is None or queue_sub.key == key:
+                    queue_sub.offer(frame)
+
+    def _send_heartbeats(self, now):
+        # Also the sweep for stalled sockets, so it runs without a heartbeat
+        for sub in list(self._sockets.values()):
+            if not sub.pending and now - sub.last_sent >= self.heartbeat_interval:
+                if self.heartbeat:
+                    self._offer(sub, self.heartbeat)
+            elif sub.stalled_since and now - sub.stalled_since > self.stall_timeout:
+                self._drop(sub)
+
+    def _offer(self, sub, frame):
+        if sub.pending:
+            # Still busy with an earlier frame: remember only the newest
+            sub.latest = frame
+            return
+        sub.pending = frame
+        self._flush(sub)
+
+    def _flush(self, sub):
+        while sub.pending:
+            try:
+                sent = sub.sock.send(sub.pending)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self._drop(sub)
+                return
+            sub.pending = sub.pending[sent:]
+            sub.last_sent = time.monotonic()
+            if not sub.pending and sub.latest is not None:
+                sub.pending, sub.latest = sub.latest, None
+
+        events = selectors.EVENT_READ
+        if sub.pending:
+            events |= selectors.EVENT_WRITE
+            if sub.stalled_since is None:
+                sub.stalled_since = time.monotonic()
+            elif time.monotonic() - sub.stalled_since > self.stall_timeout:
+                self._drop(sub)
+                return
+        else:
+            sub.stalled_since = None
+        self._selector.modify(sub.sock, events, sub)
+
+    def _on_socket_event(self, sub, events):
+        if events & selectors.EVENT_READ:
+            try:
+                data = sub.sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                data = None
+            except OSError:
+                data = b''
+            if data == b'':
+                # Peer closed the connection
+                self._drop(sub)
+                return
+        if events & selectors.EVENT_WRITE:
+            self._flush(sub)
+
+    def _drop(self, sub):
+        if self._sockets.pop(sub.sock.fileno(), None) is None:
+            return
+        self.subscribers_dropped += 1
+        try:
+            self._selector.unregister(sub.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            sub.sock.close()
+        except OSError:
+            pass
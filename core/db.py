@@ -1,22 +1,266 @@
-
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from models.reading import Reading, Base as ReadingBase
 from models.log import Log, Base as LogBase
+from models.journal import JournalCheckpoint, Base as JournalBase
+from models.replication import ReplicationState, Base as ReplicationBase
+from models.rollup import Base as RollupBase
+from models.outbox import OutboxEvent, Base as OutboxBase
+from models.webhook import WebhookSubscription, Base as WebhookBase
+from core.metrics import REGISTRY
+from array import array
+from contextlib import contextmanager
 import threading
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+
+# Bucket sizes, in seconds, kept pre-aggregated in reading_rollups
+ROLLUP_RESOLUTIONS = (60, 3600)
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+_MICROSECOND = timedelta(microseconds=1)
+# Whole epoch seconds of a stored timestamp; truncated, not rounded, to
+# match how insert_readings buckets rows
+_EPOCH_SECONDS_SQL = "CAST(strftime('%s', substr(timestamp, 1, 19)) AS INTEGER)"
+
+BATCH_ROWS = REGISTRY.histogram(
+    'db_batch_rows', 'Rows per batched insert', ['table'],
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 5000)
+)
+COMMIT_SECONDS = REGISTRY.histogram('db_commit_seconds', 'Batched insert latency, lock wait included', ['table'])
+
+_ROLLUP_UPSERT = text("""
+    INSERT INTO reading_rollups (resolution, device_key, bucket, count, min_kg, max_kg, sum_kg)
+    VALUES (:resolution, :device_key, :bucket, :count, :min_kg, :max_kg, :sum_kg)
+    ON CONFLICT (resolution, device_key, bucket) DO UPDATE SET
+        count = count + excluded.count,
+        min_kg = min(min_kg, excluded.min_kg),
+        max_kg = max(max_kg, excluded.max_kg),
+        sum_kg = sum_kg + excluded.sum_kg
+""")
 
 class Database:
     def __init__(self, path='sqlite:///weighbridge_local.db'):
         self.engine = create_engine(path, connect_args={"check_same_thread": False})
+        self.path = self.engine.url.database
         self.Session = sessionmaker(bind=self.engine)
         self.lock = threading.Lock()
+        event.listen(self.engine, 'connect', self._on_connect)
         self._setup()
 
-    def _setup(self):
+    @staticmethod
+    def _on_connect(dbapi_conn, connection_record):
+        # WAL lets backups and readers run alongside the writer without
+        # blocking it; NORMAL sync is durable enough in WAL mode.
+        cursor = dbapi_conn.cursor()
+        # Only takes effect on a brand-new file; lets the maintenance
+        # service reclaim free pages without a full VACUUM
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    def _setup(self, floors=None):
+        """
+        Bring the open file up to the current schema. Runs on construction
+        and again from ``quiesce`` after the file has been swapped; callers
+        must make sure nothing else is using the engine.
+
+        Args:
+            floors: Optional {table_name: id} row ids to keep reserved
+        """
+        self._migrate_legacy_readings()
         # Create tables for both logs and readings
         ReadingBase.metadata.create_all(self.engine)
         LogBase.metadata.create_all(self.engine)
+        JournalBase.metadata.create_all(self.engine)
+        ReplicationBase.metadata.create_all(self.engine)
+        OutboxBase.metadata.create_all(self.engine)
+        WebhookBase.metadata.create_all(self.engine)
+        self._setup_monotonic_ids(floors)
+        self.has_fts = self._setup_log_search()
+        self._setup_reading_indexes()
+        self._setup_reading_rollups()
+
+    def _migrate_legacy_readings(self):
+        """
+        Bring a ``readings`` table from the first releases, laid out as
+        (id, timestamp, raw, stable), up to the current model: ``raw``
+        becomes ``weight_kg``, ``stable`` becomes ``is_stable`` and
+        ``device_id``/``session_id`` are added. Ids are kept; rows without a
+        weight or timestamp cannot be represented and are dropped.
+        """
+        with self.engine.begin() as conn:
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(readings)')}
+            if 'raw' not in columns or 'weight_kg' in columns:
+                return
+            floor = conn.execute(
+                "SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'readings'), 0)"
+            ).scalar() if self._table_exists(conn, 'sqlite_sequence') else 0
+            conn.execute('ALTER TABLE readings RENAME TO _readings_legacy')
+            Reading.__table__.create(conn)
+            # Legacy timestamps lack the microseconds SQLAlchemy writes; pad
+            # them so string comparisons order old and new rows alike
+            conn.execute("""
+                INSERT INTO readings (id, timestamp, weight_kg, is_stable)
+                SELECT id,
+                       CASE WHEN length(timestamp) = 19 THEN timestamp || '.000000' ELSE timestamp END,
+                       raw, coalesce(stable, 0)
+                FROM _readings_legacy
+                WHERE raw IS NOT NULL AND timestamp IS NOT NULL
+            """)
+            conn.execute('DROP TABLE _readings_legacy')
+            self._raise_sequence(conn, 'readings', floor)
+
+    @staticmethod
+    def _table_exists(conn, name):
+        return conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': name}
+        ).first() is not None
+
+    def missing_columns(self, table_name):
+        """Columns of the model for a table that the database file lacks, e.g. after a bad restore."""
+        with self.engine.connect() as conn:
+            present = {row[1] for row in conn.execute(f'PRAGMA table_info({table_name})')}
+        return [column.name for column in self._tables()[table_name].columns if column.name not in present]
+
+    def _setup_monotonic_ids(self, floors=None):
+        """
+        Make the replicated tables hand out ids that only ever grow.
+
+        Tables created before they were declared AUTOINCREMENT are rebuilt
+        once, keeping every id; their indexes and triggers are recreated by
+        the setup steps that follow. ``floors`` maps table name to an id the
+        next row must exceed.
+        """
+        floors = floors or {}
+        with self.engine.begin() as conn:
+            for name, table in self._tables().items():
+                sql = conn.execute(
+                    text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': name}
+                ).scalar()
+                if 'AUTOINCREMENT' not in sql.upper():
+                    columns = ', '.join(column.name for column in table.columns)
+                    conn.execute(f'ALTER TABLE {name} RENAME TO _{name}_old')
+                    table.create(conn)
+                    conn.execute(f'INSERT INTO {name} ({columns}) SELECT {columns} FROM _{name}_old')
+                    conn.execute(f'DROP TABLE _{name}_old')
+                self._raise_sequence(conn, name, floors.get(name, 0))
+
+    @staticmethod
+    def _raise_sequence(conn, table_name, floor):
+        params = {'name': table_name, 'floor': floor}
+        conn.execute(text('UPDATE sqlite_sequence SET seq = max(seq, :floor) WHERE name = :name'), params)
+        conn.execute(text(
+            'INSERT INTO sqlite_sequence (name, seq) SELECT :name, :floor '
+            'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)'
+        ), params)
+
+    def _last_row_ids(self):
+        """Highest id ever handed out per replicated table"""
+        with self.engine.connect() as conn:
+            return {
+                name: conn.execute(text(
+                    'SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = :name), 0), '
+                    f'coalesce((SELECT max(id) FROM {name}), 0))'
+                ), {'name': name}).scalar()
+                for name in self._tables()
+            }
+
+    def reserve_row_ids(self, table_name, floor):
+        """Make sure new rows of a replicated table get ids above ``floor``."""
+        with self.lock, self.engine.begin() as conn:
+            self._raise_sequence(conn, table_name, floor)
+
+    def _setup_reading_indexes(self):
+        """
+        Indexes for keyset paging over readings in (timestamp, id) order.
+        SQLite appends the rowid to every index entry, so each one below
+        already ends in (..., timestamp, id).
+        """
+        with self.engine.begin() as conn:
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_readings_timestamp ON readings (timestamp)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_readings_device_timestamp ON readings (device_id, timestamp)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_readings_session_timestamp ON readings (session_id, timestamp)')
+
+    def _setup_reading_rollups(self):
+        """Create the rollup table, backfilling it from existing readings the first time."""
+        with self.engine.connect() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reading_rollups'"
+            ).first()
+        RollupBase.metadata.create_all(self.engine)
+        if exists:
+            return
+        with self.engine.begin() as conn:
+            for resolution in ROLLUP_RESOLUTIONS:
+                conn.execute(text(f"""
+                    INSERT INTO reading_rollups (resolution, device_key, bucket, count, min_kg, max_kg, sum_kg)
+                    SELECT :resolution, device_key, bucket, count(*), min(weight_kg), max(weight_kg), sum(weight_kg)
+                    FROM (
+                        SELECT coalesce(device_id, -1) AS device_key, weight_kg,
+                               {_EPOCH_SECONDS_SQL} / :resolution * :resolution AS bucket
+                        FROM readings
+                    )
+                    GROUP BY device_key, bucket
+                """), {'resolution': resolution})
+
+    def _setup_log_search(self):
+        """
+        Index the logs table for paged search: plain indexes for level/time
+        filters and an external-content FTS5 table kept in sync by triggers.
+        Returns False when this SQLite build lacks FTS5.
+        """
+        with self.engine.begin() as conn:
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_logs_level_id ON logs (level, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_logs_timestamp ON logs (timestamp)')
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs_fts'"
+            ).first()
+            if not exists:
+                try:
+                    conn.execute(
+                        "CREATE VIRTUAL TABLE logs_fts USING fts5(message, content='logs', content_rowid='id')"
+                    )
+                except Exception:
+                    return False
+                # Index whatever was logged before the FTS table existed
+                conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('rebuild')")
+            self._create_log_triggers(conn)
+        return True
+
+    @staticmethod
+    def _create_log_triggers(conn):
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS logs_fts_insert AFTER INSERT ON logs BEGIN
+                INSERT INTO logs_fts (rowid, message) VALUES (new.id, new.message);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS logs_fts_delete AFTER DELETE ON logs BEGIN
+                INSERT INTO logs_fts (logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+            END
+        """)
+
+    @contextmanager
+    def quiesce(self):
+        """Block all writers and close pooled connections for the duration.
+
+        Used to swap the database file underneath the engine; the pool
+        reconnects lazily on the next checkout after the block exits. The
+        new file gets the full schema setup before writers resume, and row
+        ids already handed out stay reserved in it, so rows written after a
+        restore never reuse the id of one that was replicated before it.
+        """
+        with self.lock:
+            floors = self._last_row_ids()
+            self.engine.dispose()
+            try:
+                yield
+            finally:
+                self.engine.dispose()
+            self._setup(floors)
 
     def insert_log(self, level, message):
         with self.lock:
@@ -26,14 +270,567 @@ class Database:
             session.commit()
             session.close()
 
+    def insert_logs(self, entries):
+        """Insert a batch of (timestamp, level, message) log entries in one transaction."""
+        mappings = [
+            {'timestamp': datetime.utcfromtimestamp(timestamp), 'level': level, 'message': message}
+            for timestamp, level, message in entries
+        ]
+        started = time.perf_counter()
+        with self.lock:
+            session = self.Session()
+            try:
+                session.bulk_insert_mappings(Log, mappings)
+                session.commit()
+            finally:
+                session.close()
+        BATCH_ROWS.labels('logs').observe(len(mappings))
+        COMMIT_SECONDS.labels('logs').observe(time.perf_counter() - started)
+
+    def search_logs(self, level=None, since=None, until=None, text_query=None,
+                    before_id=None, after_id=None, limit=100, ascending=False):
+        """
+        Keyset-paginated log search.
+
+        Args:
+            level: Only entries of this level
+            since, until: Optional datetime bounds (UTC, inclusive/exclusive)
+            text_query: Words that must all appear in the message (prefix match)
+            before_id, after_id: Keyset cursor; pass the last id of the previous page
+            limit: Page size
+            ascending: Oldest first instead of newest first
+
+        Returns:
+            list of dicts like Log.to_dict()
+        """
+        clauses, params = [], {'limit': limit}
+        if text_query and self.has_fts:
+            source = 'logs_fts f JOIN logs l ON l.id = f.rowid'
+            key = 'f.rowid'
+            clauses.append('logs_fts MATCH :match')
+            params['match'] = self._fts_query(text_query)
+        else:
+            source = 'logs l'
+            key = 'l.id'
+            if text_query:
+                clauses.append("l.message LIKE :like ESCAPE '\\'")
+                params['like'] = '%' + text_query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        if level:
+            clauses.append('l.level = :level')
+            params['level'] = level
+        if since:
+            clauses.append('l.timestamp >= :since')
+            params['since'] = self._db_timestamp(since)
+        if until:
+            clauses.append('l.timestamp < :until')
+            params['until'] = self._db_timestamp(until)
+        if before_id is not None:
+            clauses.append(f'{key} < :before_id')
+            params['before_id'] = before_id
+        if after_id is not None:
+            clauses.append(f'{key} > :after_id')
+            params['after_id'] = after_id
+
+        where = ' AND '.join(clauses) or '1'
+        order = 'ASC' if ascending else 'DESC'
+        query = text(
+            f'SELECT l.id, l.timestamp, l.level, l.message FROM {source} '
+            f'WHERE {where} ORDER BY {key} {order} LIMIT :limit'
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {'id': row[0], 'timestamp': row[1].replace(' ', 'T'), 'level': row[2], 'message': row[3]}
+            for row in rows
+        ]
+
+    def iter_logs(self, chunk_size=5000, **filters):
+        """Yield pages of matching logs, oldest first, one keyset query per page."""
+        after_id = None
+        while True:
+            page = self.search_logs(after_id=after_id, limit=chunk_size, ascending=True, **filters)
+            if not page:
+                return
+            yield page
+            after_id = page[-1]['id']
+
+    def clear_logs(self):
+        """Delete all log entries and their search index."""
+        with self.lock, self.engine.begin() as conn:
+            if self.has_fts:
+                # Dropping the per-row delete trigger turns this into one
+                # index wipe instead of one FTS delete per log row
+                conn.execute('DROP TRIGGER IF EXISTS logs_fts_delete')
+                conn.execute('DELETE FROM logs')
+                conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('delete-all')")
+                self._create_log_triggers(conn)
+            else:
+                conn.execute('DELETE FROM logs')
+
+    @staticmethod
+    def _fts_query(text_query):
+        # Quote every word so user input can't form FTS syntax errors
+        words = [w.replace('"', '""') for w in text_query.split()]
+        return ' '.join(f'"{w}"*' for w in words)
+
+    @staticmethod
+    def _db_timestamp(value):
+        # Matches how SQLAlchemy stores DateTime columns in SQLite
+        return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
     def insert_reading(self, raw, stable):
+        self.insert_readings([(time.time(), raw, stable, None)])
+
+    def insert_readings(self, rows, journal_seq=None):
+        """
+        Insert a batch of readings in a single transaction.
+
+        Args:
+            rows: Iterable of (timestamp, weight_kg, is_stable, device_id)
+            journal_seq: If given, the journal checkpoint is advanced to this
+                         sequence number in the same transaction
+        """
+        mappings = [
+            {
+                'timestamp': datetime.utcfromtimestamp(timestamp),
+                'weight_kg': weight_kg,
+                'is_stable': 1 if is_stable else 0,
+                'device_id': device_id
+            }
+            for timestamp, weight_kg, is_stable, device_id in rows
+        ]
+        rollups = self._rollup_deltas(mappings)
+        started = time.perf_counter()
+        with self.lock:
+            session = self.Session()
+            try:
+                session.bulk_insert_mappings(Reading, mappings)
+                if rollups:
+                    session.execute(_ROLLUP_UPSERT, rollups)
+                if journal_seq is not None:
+                    session.merge(JournalCheckpoint(applied_seq=journal_seq))
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+        BATCH_ROWS.labels('readings').observe(len(mappings))
+        COMMIT_SECONDS.labels('readings').observe(time.perf_counter() - started)
+
+    def search_readings(self, device_id=None, since=None, until=None, stable_only=False,
+                        session_id=None, after=None, limit=100, descending=False, raw=False):
+        """
+        Keyset-paginated reading history in (timestamp, id) order.
+
+        Args:
+            device_id: Only readings from this device
+            since, until: Optional datetime bounds (UTC, inclusive/exclusive)
+            stable_only: Only readings flagged stable
+            session_id: Only readings of this session
+            after: Keyset cursor, ``(timestamp, id)`` of the last row of the
+                   previous page as returned in its dict
+            limit: Page size
+            descending: Newest first instead of oldest first
+            raw: Return plain tuples ``(id, timestamp, timestamp_us,
+                 weight_kg, device_id, is_stable, session_id)`` for bulk
+                 encoders; ``timestamp_us`` is integer epoch microseconds
+
+        Returns:
+            list of dicts like Reading.to_dict(), or tuples when ``raw``
+        """
+        clauses, params = [], {'limit': limit}
+        if device_id is not None:
+            clauses.append('device_id = :device_id')
+            params['device_id'] = device_id
+        if session_id is not None:
+            clauses.append('session_id = :session_id')
+            params['session_id'] = session_id
+        if stable_only:
+            clauses.append('is_stable = 1')
+        if since:
+            clauses.append('timestamp >= :since')
+            params['since'] = self._db_timestamp(since)
+        if until:
+            clauses.append('timestamp < :until')
+            params['until'] = self._db_timestamp(until)
+        if after is not None:
+            clauses.append(f"(timestamp, id) {'<' if descending else '>'} (:after_ts, :after_id)")
+            params['after_ts'] = after[0].replace('T', ' ')
+            params['after_id'] = after[1]
+
+        where = ' AND '.join(clauses) or '1'
+        order = 'DESC' if descending else 'ASC'
+        query = text(
+            'SELECT id, timestamp, weight_kg, device_id, is_stable, session_id FROM readings '
+            f'WHERE {where} ORDER BY timestamp {order}, id {order} LIMIT :limit'
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        if raw:
+            # Parsing in Python is cheaper than strftime() per row in SQL
+            parse = datetime.fromisoformat
+            return [
+                (row[0], row[1], (parse(row[1]) - _EPOCH) // _MICROSECOND, row[2], row[3], row[4], row[5])
+                for row in rows
+            ]
+        return [
+            {
+                'id': row[0],
+                'timestamp': row[1].replace(' ', 'T'),
+                'weight_kg': row[2],
+                'device_id': row[3],
+                'is_stable': bool(row[4]),
+                'session_id': row[5]
+            }
+            for row in rows
+        ]
+
+    def iter_readings(self, chunk_size=5000, raw=False, **filters):
+        """
+        Yield pages of matching readings, one short keyset query per page.
+
+        No read transaction spans pages, so a slow consumer never pins a WAL
+        snapshot, and memory stays bounded by ``chunk_size``.
+        """
+        after = None
+        while True:
+            page = self.search_readings(after=after, limit=chunk_size, raw=raw, **filters)
+            if not page:
+                return
+            yield page
+            last = page[-1]
+            after = (last[1], last[0]) if raw else (last['timestamp'], last['id'])
+
+    @staticmethod
+    def _rollup_deltas(mappings):
+        """Aggregate a batch of reading mappings into rollup upsert parameters."""
+        deltas = {}
+        for mapping in mappings:
+            second = (mapping['timestamp'] - _EPOCH) // _SECOND
+            device_key = -1 if mapping['device_id'] is None else mapping['device_id']
+            weight = mapping['weight_kg']
+            for resolution in ROLLUP_RESOLUTIONS:
+                key = (resolution, device_key, second - second % resolution)
+                delta = deltas.get(key)
+                if delta is None:
+                    deltas[key] = [1, weight, weight, weight]
+                else:
+                    delta[0] += 1
+                    if weight < delta[1]:
+                        delta[1] = weight
+                    if weight > delta[2]:
+                        delta[2] = weight
+                    delta[3] += weight
+        return [
+            {
+                'resolution': resolution, 'device_key': device_key, 'bucket': bucket,
+                'count': count, 'min_kg': min_kg, 'max_kg': max_kg, 'sum_kg': sum_kg
+            }
+            for (resolution, device_key, bucket), (count, min_kg, max_kg, sum_kg) in deltas.items()
+        ]
+
+    def aggregate_readings(self, device_id, since, until, bucket):
+        """
+        Min/max/avg/count of readings per time bucket.
+
+        Buckets are aligned to multiples of ``bucket`` seconds since the
+        epoch (UTC). When ``bucket`` is a multiple of a rollup resolution,
+        the whole rollup buckets inside the range come from
+        ``reading_rollups``; only the partial edges are aggregated from raw
+        readings. Otherwise SQLite aggregates the raw rows in one pass.
+
+        Args:
+            device_id: Only this device, or None for all devices
+            since, until: datetime bounds (UTC, inclusive/exclusive)
+            bucket: Bucket size in whole seconds
+
+        Returns:
+            list of (bucket_start, count, min_kg, max_kg, avg_kg) tuples,
+            bucket_start in epoch seconds, ascending
+        """
+        start = (since - _EPOCH) / _SECOND
+        end = (until - _EPOCH) / _SECOND
+        resolution = next((r for r in sorted(ROLLUP_RESOLUTIONS, reverse=True) if bucket % r == 0), None)
+        merged = {}
+        with self.engine.connect() as conn:
+            if resolution:
+                # Whole rollup buckets strictly inside [start, end)
+                lo = -(-int(start) // resolution) * resolution
+                hi = int(end) // resolution * resolution
+            if resolution and lo < hi:
+                self._merge_buckets(merged, self._aggregate_rollups(conn, device_id, resolution, lo, hi, bucket))
+                edges = [(start, lo), (hi, end)]
+            else:
+                edges = [(start, end)]
+            for edge_start, edge_end in edges:
+                if edge_start < edge_end:
+                    self._merge_buckets(merged, self._aggregate_raw(conn, device_id, edge_start, edge_end, bucket))
+        return [
+            (key, count, min_kg, max_kg, sum_kg / count)
+            for key, (count, min_kg, max_kg, sum_kg) in sorted(merged.items())
+        ]
+
+    @staticmethod
+    def _aggregate_rollups(conn, device_id, resolution, lo, hi, bucket):
+        clauses = ['resolution = :resolution', 'bucket >= :lo', 'bucket < :hi']
+        params = {'resolution': resolution, 'lo': lo, 'hi': hi, 'bucket_size': bucket}
+        if device_id is not None:
+            clauses.append('device_key = :device_key')
+            params['device_key'] = device_id
+        return conn.execute(text(
+            'SELECT bucket / :bucket_size * :bucket_size AS k, sum(count), min(min_kg), max(max_kg), sum(sum_kg) '
+            f'FROM reading_rollups WHERE {" AND ".join(clauses)} GROUP BY k'
+        ), params)
+
+    def _aggregate_raw(self, conn, device_id, start, end, bucket):
+        clauses = ['timestamp >= :since', 'timestamp < :until']
+        params = {
+            'since': self._db_timestamp(datetime.utcfromtimestamp(start)),
+            'until': self._db_timestamp(datetime.utcfromtimestamp(end)),
+            'bucket_size': bucket
+        }
+        if device_id is not None:
+            clauses.append('device_id = :device_id')
+            params['device_id'] = device_id
+        return conn.execute(text(
+            f'SELECT {_EPOCH_SECONDS_SQL} / :bucket_size * :bucket_size AS k, '
+            'count(*), min(weight_kg), max(weight_kg), sum(weight_kg) '
+            f'FROM readings WHERE {" AND ".join(clauses)} GROUP BY k'
+        ), params)
+
+    @staticmethod
+    def _merge_buckets(merged, rows):
+        for key, count, min_kg, max_kg, sum_kg in rows:
+            current = merged.get(key)
+            if current is None:
+                merged[key] = [count, min_kg, max_kg, sum_kg]
+            else:
+                current[0] += count
+                current[1] = min(current[1], min_kg)
+                current[2] = max(current[2], max_kg)
+                current[3] += sum_kg
+
+    def reading_series(self, device_id, since, until, max_points):
+        """
+        A (timestamps, weights) series over a time range, for charting.
+
+        Returns the raw readings when there are at most ``max_points`` of
+        them. Otherwise it returns bucket averages from the finest rollup
+        resolution that fits, timestamped at the bucket centre.
+
+        Returns:
+            (array('d'), array('d')): epoch seconds and weights, ascending
+        """
+        xs, ys = array('d'), array('d')
+        start = (since - _EPOCH) / _SECOND
+        end = (until - _EPOCH) / _SECOND
+        finest = min(ROLLUP_RESOLUTIONS)
+        with self.engine.connect() as conn:
+            clauses = ['resolution = :resolution', 'bucket >= :lo', 'bucket < :hi']
+            params = {'resolution': finest, 'lo': int(start) // finest * finest, 'hi': end}
+            if device_id is not None:
+                clauses.append('device_key = :device_key')
+                params['device_key'] = device_id
+            estimate = conn.execute(text(
+                f'SELECT coalesce(sum(count), 0) FROM reading_rollups WHERE {" AND ".join(clauses)}'
+            ), params).scalar()
+
+            if estimate <= max_points:
+                clauses = ['timestamp >= :since', 'timestamp < :until']
+                params = {'since': self._db_timestamp(since), 'until': self._db_timestamp(until)}
+                if device_id is not None:
+                    clauses.append('device_id = :device_id')
+                    params['device_id'] = device_id
+                rows = conn.execute(text(
+                    f'SELECT timestamp, weight_kg FROM readings WHERE {" AND ".join(clauses)} ORDER BY timestamp, id'
+                ), params)
+                for timestamp, weight_kg in rows:
+                    xs.append((datetime.fromisoformat(timestamp) - _EPOCH) / _SECOND)
+                    ys.append(weight_kg)
+                return xs, ys
+
+            resolution = next(
+                (r for r in sorted(ROLLUP_RESOLUTIONS) if (end - start) / r <= max_points),
+                max(ROLLUP_RESOLUTIONS)
+            )
+            params.update(resolution=resolution, lo=int(start) // resolution * resolution)
+            rows = conn.execute(text(
+                'SELECT bucket, sum(sum_kg) / sum(count) FROM reading_rollups '
+                f'WHERE {" AND ".join(clauses)} GROUP BY bucket ORDER BY bucket'
+            ), params)
+            for bucket_start, avg_kg in rows:
+                xs.append(bucket_start + resolution / 2)
+                ys.append(avg_kg)
+        return xs, ys
+
+    def journal_applied_seq(self):
+        """Return the highest journal sequence number applied so far."""
+        with self.lock:
+            session = self.Session()
+            checkpoint = session.query(JournalCheckpoint).get(1)
+            session.close()
+            return checkpoint.applied_seq if checkpoint else 0
+
+    def fetch_rows_after(self, table_name, after_id, limit):
+        """
+        Return ``(columns, rows)`` for rows of a table with id above ``after_id``,
+        in id order. Runs without the write lock; WAL gives readers a
+        consistent snapshot alongside the writer.
+        """
+        table = self._tables()[table_name]
+        query = table.select().where(table.c.id > after_id).order_by(table.c.id).limit(limit)
+        with self.engine.connect() as conn:
+            result = conn.execute(query)
+            return list(result.keys()), [tuple(row) for row in result]
+
+    def get_replication_hwm(self, table_name):
+        with self.lock:
+            session = self.Session()
+            state = session.query(ReplicationState).get(table_name)
+            session.close()
+            return state.acked_id if state else 0
+
+    def set_replication_hwm(self, table_name, acked_id):
         with self.lock:
             session = self.Session()
-            reading = Reading(weight_kg=raw, is_stable=stable)
-            session.add(reading)
+            session.merge(ReplicationState(table_name, acked_id))
             session.commit()
             session.close()
 
+    def enqueue_outbox(self, events):
+        """
+        Append events to the forwarding outbox in one transaction.
+
+        Args:
+            events: Iterable of (event_id, event_type, created, payload_json)
+        """
+        mappings = [
+            {'event_id': event_id, 'event_type': event_type, 'created': created, 'payload': payload}
+            for event_id, event_type, created, payload in events
+        ]
+        if not mappings:
+            return
+        with self.lock:
+            session = self.Session()
+            try:
+                session.bulk_insert_mappings(OutboxEvent, mappings)
+                session.commit()
+            finally:
+                session.close()
+
+    def fetch_outbox(self, limit):
+        """
+        Oldest live outbox events as (id, payload_json) tuples, in id order.
+        Runs without the write lock, like ``fetch_rows_after``.
+        """
+        table = OutboxEvent.__table__
+        query = (
+            table.select().with_only_columns([table.c.id, table.c.payload])
+            .where(table.c.dead == 0).order_by(table.c.id).limit(limit)
+        )
+        with self.engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(query)]
+
+    def ack_outbox(self, first_id, last_id):
+        """Delete live outbox events with ids in [first_id, last_id]; returns the count"""
+        table = OutboxEvent.__table__
+        with self.lock, self.engine.begin() as conn:
+            return conn.execute(
+                table.delete().where(table.c.id.between(first_id, last_id)).where(table.c.dead == 0)
+            ).rowcount
+
+    def fail_outbox(self, first_id, last_id, error, dead=False):
+        """Record a failed delivery of outbox events [first_id, last_id], optionally giving up on them"""
+        table = OutboxEvent.__table__
+        with self.lock, self.engine.begin() as conn:
+            conn.execute(
+                table.update().where(table.c.id.between(first_id, last_id)).where(table.c.dead == 0)
+                .values(attempts=table.c.attempts + 1, last_error=error[:500], dead=1 if dead else 0)
+            )
+
+    def outbox_counts(self):
+        """Return (pending, dead) outbox event counts"""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                'SELECT count(*) - coalesce(sum(dead), 0), coalesce(sum(dead), 0) FROM forward_outbox'
+            ).first()
+            return row[0], row[1]
+
+    def list_webhooks(self, enabled_only=False, include_secret=False):
+        """Webhook subscriptions as dicts, in id order"""
+        session = self.Session()
+        try:
+            query = session.query(WebhookSubscription).order_by(WebhookSubscription.id)
+            if enabled_only:
+                query = query.filter_by(enabled=1)
+            return [sub.to_dict(include_secret) for sub in query]
+        finally:
+            session.close()
+
+    def get_webhook(self, webhook_id, include_secret=False):
+        session = self.Session()
+        try:
+            sub = session.query(WebhookSubscription).get(webhook_id)
+            return sub.to_dict(include_secret) if sub else None
+        finally:
+            session.close()
+
+    def add_webhook(self, name, url, event_types=(), device_id=None, secret=None, max_concurrency=2):
+        """Create a subscription; returns it as a dict"""
+        with self.lock:
+            session = self.Session()
+            try:
+                sub = WebhookSubscription(
+                    name=name, url=url, event_types=','.join(event_types), device_id=device_id,
+                    secret=secret, max_concurrency=max_concurrency, enabled=1, created=time.time()
+                )
+                session.add(sub)
+                session.commit()
+                return sub.to_dict()
+            finally:
+                session.close()
+
+    def update_webhook(self, webhook_id, **fields):
+        """
+        Change fields of a subscription; returns it as a dict, or None if
+        it does not exist. Re-enabling clears ``disabled_reason``.
+        """
+        if 'event_types' in fields:
+            fields['event_types'] = ','.join(fields['event_types'])
+        if fields.get('enabled'):
+            fields['disabled_reason'] = None
+        with self.lock:
+            session = self.Session()
+            try:
+                sub = session.query(WebhookSubscription).get(webhook_id)
+                if sub is None:
+                    return None
+                for key, value in fields.items():
+                    setattr(sub, key, value)
+                session.commit()
+                return sub.to_dict()
+            finally:
+                session.close()
+
+    def delete_webhook(self, webhook_id):
+        """Returns True if the subscription existed"""
+        with self.lock:
+            session = self.Session()
+            try:
+                deleted = session.query(WebhookSubscription).filter_by(id=webhook_id).delete()
+                session.commit()
+                return bool(deleted)
+            finally:
+                session.close()
+
+    @staticmethod
+    def _tables():
+        return {
+            Reading.__tablename__: Reading.__table__,
+            Log.__tablename__: Log.__table__
+        }
+
     def last_stable_reading(self):
         with self.lock:
             session = self.Session()
@@ -41,4 +838,4 @@ class Database:
             session.close()
             if reading:
                 return (reading.timestamp.isoformat(), reading.weight_kg)
-            return None
\ No newline at end of file
+            return None
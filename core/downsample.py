@@ -0,0 +1,47 @@
+def lttb(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of ``threshold - 2``
+    equal-count buckets in between, the point forming the largest triangle
+    with the previously kept point and the average of the next bucket. The
+    result keeps peaks and troughs that plain averaging would flatten.
+
+    Args:
+        xs: Sequence of x values (e.g. epoch seconds), ascending
+        ys: Sequence of y values, same length as ``xs``
+        threshold: Number of points to return
+
+    Returns:
+        list of (x, y) tuples
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(zip(xs, ys))
+
+    sampled = [(xs[0], ys[0])]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append((xs[best], ys[best]))
+        a = best
+
+    sampled.append((xs[n - 1], ys[n - 1]))
+    return sampled
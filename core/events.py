@@ -0,0 +1,36 @@
+import threading
+
+
+class EventBus:
+    """
+    In-process publish/subscribe hub shared by all services.
+
+    Subscriber lists are copy-on-write tuples, so ``publish`` runs without
+    taking a lock and is safe to call from the acquisition hot path.
+    Callbacks run synchronously on the publishing thread and must not block.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, topic, callback):
+        """Register ``callback(payload)`` for a topic."""
+        with self._lock:
+            self._subscribers[topic] = self._subscribers.get(topic, ()) + (callback,)
+
+    def unsubscribe(self, topic, callback):
+        """Remove a previously registered callback; unknown callbacks are ignored."""
+        with self._lock:
+            callbacks = self._subscribers.get(topic, ())
+            self._subscribers[topic] = tuple(cb for cb in callbacks if cb != callback)
+
+    def publish(self, topic, payload=None):
+        """Deliver ``payload`` to every subscriber of ``topic``."""
+        for callback in self._subscribers.get(topic, ()):
+            try:
+                callback(payload)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Event handler for '{topic}' failed: {str(e)}")
@@ -0,0 +1,200 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+# Writes back the mapping's dirty pages like mmap.flush(), but releases the
+# GIL while it waits for the disk; mmap.flush() does not (POSIX only)
+_fdatasync = getattr(os, 'fdatasync', None)
+
+
+class SampleJournal:
+    """
+    Append-only, memory-mapped journal of raw weight samples.
+
+    Samples are written into fixed-size, preallocated segment files through
+    mmap, so an append is a memcpy. A background thread flushes dirty pages
+    every ``sync_interval`` seconds, without holding up appends, which
+    bounds how much can be lost on power failure without paying for one
+    fsync per sample.
+
+    Every record carries a monotonically increasing sequence number and a
+    CRC32; on open the journal is scanned up to the first torn or empty
+    record, and appending continues from there.
+    """
+
+    # seq, timestamp, weight_kg, device_id, flags, crc32
+    RECORD = struct.Struct('<QddiB3xI')
+    FLAG_STABLE = 0x01
+    NO_DEVICE = -1
+
+    def __init__(self, directory, segment_size=4 * 1024 * 1024, sync_interval=0.1, min_seq=0):
+        """
+        Args:
+            directory: Directory holding the segment files
+            segment_size: Size of each segment file in bytes
+            sync_interval: Seconds between msync calls (the durability window)
+            min_seq: Lowest sequence number already used elsewhere; new
+                     records are numbered above it even if segments are gone
+        """
+        self.directory = directory
+        self.record_size = self.RECORD.size
+        self.segment_size = max(segment_size - segment_size % self.record_size, self.record_size)
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        # Held while a map is flushed outside _lock; closing a map waits for it
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._dirty = False
+        self._file = None
+        self._map = None
+        self._segment_path = None
+        self._offset = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        last_seq, last_path, last_offset = self._scan()
+        self.last_seq = max(last_seq, min_seq)
+        if last_path and last_offset < self.segment_size:
+            self._open_segment(last_path, last_offset)
+
+        self._sync_thread = threading.Thread(target=self._sync_loop, name='journal-sync', daemon=True)
+        self._sync_thread.start()
+
+    def append(self, weight_kg, is_stable, timestamp, device_id=None):
+        """Append one sample and return its sequence number."""
+        with self._lock:
+            if self._stop_event.is_set():
+                raise ValueError("Journal is closed")
+            if self._map is None or self._offset + self.record_size > self.segment_size:
+                self._rotate()
+            self.last_seq += 1
+            record = self._pack(self.last_seq, timestamp, weight_kg, device_id, is_stable)
+            self._map[self._offset:self._offset + self.record_size] = record
+            self._offset += self.record_size
+            self._dirty = True
+            return self.last_seq
+
+    def replay(self, after_seq=0):
+        """
+        Yield ``(seq, timestamp, weight_kg, is_stable, device_id)`` for every
+        valid record with a sequence number above ``after_seq``, in order.
+        """
+        for path in self._segments():
+            with open(path, 'rb') as f:
+                data = f.read()
+            for record in self._iter_records(data):
+                if record[0] > after_seq:
+                    yield record
+
+    def release(self, upto_seq):
+        """Delete closed segments whose records are all at or below ``upto_seq``."""
+        with self._lock:
+            segments = self._segments()
+            for path, next_path in zip(segments, segments[1:]):
+                if path == self._segment_path:
+                    break
+                # A segment's records all precede the next segment's first seq
+                if self._first_seq(next_path) - 1 > upto_seq:
+                    break
+                os.remove(path)
+
+    def sync(self):
+        """Flush dirty pages to disk now."""
+        with self._lock:
+            segment, segment_file = self._map, self._file
+            if segment is None or not self._dirty:
+                return
+            self._dirty = False
+        # Flushing can take a while on slow storage; appends carry on meanwhile
+        with self._flush_lock:
+            if segment.closed:
+                # Rotated or closed since, which flushed it
+                return
+            try:
+                if _fdatasync:
+                    _fdatasync(segment_file.fileno())
+                else:
+                    segment.flush()
+            except OSError:
+                with self._lock:
+                    if self._map is segment:
+                        self._dirty = True
+                raise
+
+    def close(self):
+        """Stop the sync thread, flush and unmap the active segment."""
+        self._stop_event.set()
+        self._sync_thread.join(timeout=2.0)
+        with self._lock:
+            self._close_segment()
+
+    def _sync_loop(self):
+        while not self._stop_event.wait(self.sync_interval):
+            try:
+                self.sync()
+            except (OSError, ValueError):
+                # The segment was closed under us; the next tick retries
+                pass
+
+    def _rotate(self):
+        self._close_segment()
+        path = os.path.join(self.directory, f"journal-{self.last_seq + 1:020d}.seg")
+        with open(path, 'wb') as f:
+            f.truncate(self.segment_size)
+        self._open_segment(path, 0)
+
+    def _open_segment(self, path, offset):
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), self.segment_size)
+        self._segment_path = path
+        self._offset = offset
+
+    def _close_segment(self):
+        if self._map is not None:
+            with self._flush_lock:
+                self._map.flush()
+                self._map.close()
+            self._file.close()
+        self._map = None
+        self._file = None
+        self._segment_path = None
+        self._dirty = False
+
+    def _scan(self):
+        last_seq, last_path, last_offset = 0, None, 0
+        for path in self._segments():
+            with open(path, 'rb') as f:
+                data = f.read()
+            count = 0
+            for record in self._iter_records(data):
+                last_seq = record[0]
+                count += 1
+            last_path, last_offset = path, count * self.record_size
+        return last_seq, last_path, last_offset
+
+    def _segments(self):
+        names = sorted(f for f in os.listdir(self.directory)
+                       if f.startswith('journal-') and f.endswith('.seg'))
+        return [os.path.join(self.directory, name) for name in names]
+
+    @staticmethod
+    def _first_seq(path):
+        return int(os.path.basename(path)[len('journal-'):-len('.seg')])
+
+    def _pack(self, seq, timestamp, weight_kg, device_id, is_stable):
+        flags = self.FLAG_STABLE if is_stable else 0
+        device = self.NO_DEVICE if device_id is None else device_id
+        body = self.RECORD.pack(seq, timestamp, weight_kg, device, flags, 0)[:-4]
+        return body + struct.pack('<I', zlib.crc32(body))
+
+    def _iter_records(self, data):
+        size = self.record_size
+        previous = 0
+        for offset in range(0, len(data) - size + 1, size):
+            seq, timestamp, weight_kg, device, flags, crc = self.RECORD.unpack_from(data, offset)
+            if seq <= previous or zlib.crc32(data[offset:offset + size - 4]) != crc:
+                return
+            previous = seq
+            yield (seq, timestamp, weight_kg, bool(flags & self.FLAG_STABLE),
+                   None if device == self.NO_DEVICE else device)
@@ -1,22 +1,180 @@
+import re
+import threading
+import time
+import traceback
+from collections import deque
+
+from core.metrics import REGISTRY
+
+QUEUE_DEPTH = REGISTRY.gauge('log_queue_depth', 'Log entries waiting for the sink thread')
+DROPPED = REGISTRY.counter('log_entries_dropped_total', 'Log entries lost to queue overflow or rate limits')
+
+
 class AppLogger:
-    def __init__(self, db):
+    """
+    Non-blocking application logger.
+
+    Callers only filter by level and append to an in-memory queue; a
+    background sink thread does everything else. It collapses repeats,
+    applies per-source rate limits, writes batches to the ``logs`` table
+    and hands entries to the UI callback.
+
+    Repeats are detected on the message with its numbers masked, so a stream
+    of "Weight reading: 1012.4 kg" lines is stored once and then summarised
+    as "Weight reading: X kg ×240 in 60s" at the end of the window.
+    """
+
+    LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARN': 30, 'ERROR': 40}
+    NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+    def __init__(self, db, level='INFO', source_levels=None, coalesce_window=60.0,
+                 rate_limit=20.0, rate_burst=100, flush_interval=0.2, max_queue=50000):
+        """
+        Args:
+            db: Database used to persist log entries
+            level: Minimum level logged by default
+            source_levels: Optional {source: level} overrides
+            coalesce_window: Seconds over which repeated messages are collapsed
+            rate_limit: Sustained entries per second allowed per source
+            rate_burst: Entries a source may emit in a burst
+            flush_interval: Seconds between sink passes
+            max_queue: Entries buffered before the oldest are dropped
+        """
         self.db = db
         self.ui_callback = None
+        self.coalesce_window = coalesce_window
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.flush_interval = flush_interval
+        self._min_level = self.LEVELS[level]
+        self._source_levels = {s: self.LEVELS[l] for s, l in (source_levels or {}).items()}
+        self._queue = deque(maxlen=max_queue)
+        self._dropped = 0
+        self._rate_limited = {}
+        self._repeats = {}
+        self._buckets = {}
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        QUEUE_DEPTH.set_function(self._queue.__len__)
+        self._thread = threading.Thread(target=self._run, name='log-sink', daemon=True)
+        self._thread.start()
 
     def set_ui_callback(self, fn):
+        """Set ``fn(level, message)``; called from the sink thread, so it must be thread-safe."""
         self.ui_callback = fn
 
+    def set_level(self, level, source=None):
+        """Change the minimum level, globally or for one source."""
+        if source is None:
+            self._min_level = self.LEVELS[level]
+        else:
+            self._source_levels[source] = self.LEVELS[level]
+
+    def debug(self, message, **kwargs):
+        self._log('DEBUG', message, **kwargs)
+
     def info(self, message, **kwargs):
-        self.db.insert_log('INFO', message)
-        if self.ui_callback:
-            self.ui_callback('INFO', message)
+        self._log('INFO', message, **kwargs)
 
     def warn(self, message, **kwargs):
-        self.db.insert_log('WARN', message)
-        if self.ui_callback:
-            self.ui_callback('WARN', message)
+        self._log('WARN', message, **kwargs)
+
+    warning = warn
 
     def error(self, message, **kwargs):
-        self.db.insert_log('ERROR', message)
-        if self.ui_callback:
-            self.ui_callback('ERROR', message)
\ No newline at end of file
+        self._log('ERROR', message, **kwargs)
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been written."""
+        deadline = time.monotonic() + timeout
+        self._wake.set()
+        while (self._queue or self._wake.is_set()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        """Flush pending entries, emit open repeat summaries and stop the sink."""
+        self._stop_event.set()
+        self._wake.set()
+        self._thread.join(timeout=5.0)
+
+    def _log(self, level, message, source='app', exc_info=False, **kwargs):
+        if self.LEVELS[level] < self._source_levels.get(source, self._min_level):
+            return
+        if exc_info:
+            message = f"{message}\n{traceback.format_exc().rstrip()}"
+        queue = self._queue
+        if len(queue) == queue.maxlen:
+            self._dropped += 1
+        queue.append((time.time(), level, source, message))
+        if level == 'ERROR':
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.flush_interval)
+            self._drain()
+            self._wake.clear()
+        self._drain(final=True)
+
+    def _drain(self, final=False):
+        """One sink pass: coalesce, rate limit, persist, notify."""
+        now = time.time()
+        out = []
+        while self._queue:
+            timestamp, level, source, message = self._queue.popleft()
+            key = (level, source, self.NUMBER.sub('X', message))
+            repeat = self._repeats.get(key)
+            if repeat is not None:
+                repeat[1] += 1
+                continue
+            self._repeats[key] = [timestamp, 0]
+            if self._allow(source, timestamp):
+                out.append((timestamp, level, message))
+
+        # Close repeat windows that have expired
+        for key, (first, count) in list(self._repeats.items()):
+            if final or now - first >= self.coalesce_window:
+                del self._repeats[key]
+                if count:
+                    level, source, template = key
+                    out.append((now, level, f"{template} ×{count} in {now - first:.0f}s"))
+
+        if self._dropped:
+            DROPPED.inc(self._dropped)
+            out.append((now, 'WARN', f"Log queue overflow: {self._dropped} entries dropped"))
+            self._dropped = 0
+        for source, count in self._rate_limited.items():
+            DROPPED.inc(count)
+            out.append((now, 'WARN', f"Rate limit: {count} entries from {source} suppressed"))
+        self._rate_limited.clear()
+
+        if out:
+            self._emit(out)
+
+    def _allow(self, source, timestamp):
+        """Token bucket per source; over-limit entries are counted, not stored."""
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            bucket = self._buckets[source] = [float(self.rate_burst), timestamp]
+        tokens, last = bucket
+        tokens = min(self.rate_burst, tokens + (timestamp - last) * self.rate_limit)
+        bucket[1] = timestamp
+        if tokens < 1:
+            bucket[0] = tokens
+            self._rate_limited[source] = self._rate_limited.get(source, 0) + 1
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def _emit(self, entries):
+        try:
+            self.db.insert_logs(entries)
+        except Exception as e:
+            entries.append((time.time(), 'ERROR', f"Failed to persist {len(entries)} log entries: {str(e)}"))
+        callback = self.ui_callback
+        if callback:
+            for _, level, message in entries:
+                try:
+                    callback(level, message)
+                except Exception:
+                    pass
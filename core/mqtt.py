@@ -0,0 +1,249 @@
+"""
+Minimal MQTT 3.1.1 packet encoding and decoding.
+
+Covers what the publisher service and the stand-in broker need:
+CONNECT/CONNACK, PUBLISH with QoS 0 and 1, PUBACK, SUBSCRIBE/SUBACK,
+PINGREQ/PINGRESP and DISCONNECT. Every packet is a fixed header (type in
+the high nibble, flags in the low nibble, then the remaining length as a
+base-128 varint) followed by the variable header and payload::
+
+    from core import mqtt
+
+    sock.sendall(mqtt.encode_connect('scale-1', keepalive=30))
+    reader = mqtt.PacketReader()
+    for packet_type, flags, body in reader.feed(sock.recv(4096)):
+        if packet_type == mqtt.CONNACK:
+            ...
+"""
+import struct
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+# CONNACK return codes
+CONNACK_MESSAGES = {
+    0: 'accepted',
+    1: 'unacceptable protocol version',
+    2: 'identifier rejected',
+    3: 'server unavailable',
+    4: 'bad user name or password',
+    5: 'not authorized',
+}
+
+MAX_REMAINING_LENGTH = 268435455
+
+PINGREQ_PACKET = bytes((PINGREQ << 4, 0))
+PINGRESP_PACKET = bytes((PINGRESP << 4, 0))
+DISCONNECT_PACKET = bytes((DISCONNECT << 4, 0))
+
+_U16 = struct.Struct('>H')
+
+
+class MqttProtocolError(Exception):
+    """Raised on a malformed packet."""
+
+
+def _string(value):
+    data = value.encode('utf-8') if isinstance(value, str) else value
+    return _U16.pack(len(data)) + data
+
+
+def _packet(packet_type, flags, body):
+    length = len(body)
+    if length > MAX_REMAINING_LENGTH:
+        raise MqttProtocolError(f"Packet too large: {length} bytes")
+    header = bytearray(((packet_type << 4) | flags,))
+    while True:
+        byte = length % 128
+        length //= 128
+        header.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes(header) + body
+
+
+def encode_connect(client_id, keepalive=60, clean_session=True, username=None, password=None):
+    flags = 0x02 if clean_session else 0
+    payload = _string(client_id)
+    if username is not None:
+        flags |= 0x80
+        payload += _string(username)
+        if password is not None:
+            flags |= 0x40
+            payload += _string(password)
+    body = _string('MQTT') + bytes((4, flags)) + _U16.pack(keepalive) + payload
+    return _packet(CONNECT, 0, body)
+
+
+def encode_connack(return_code, session_present=False):
+    return _packet(CONNACK, 0, bytes((1 if session_present else 0, return_code)))
+
+
+def encode_publish(topic, payload, qos=0, retain=False, packet_id=None, dup=False):
+    flags = (qos << 1) | (0x01 if retain else 0) | (0x08 if dup else 0)
+    body = _string(topic)
+    if qos:
+        body += _U16.pack(packet_id)
+    return _packet(PUBLISH, flags, body + payload)
+
+
+def encode_puback(packet_id):
+    return _packet(PUBACK, 0, _U16.pack(packet_id))
+
+
+def encode_subscribe(packet_id, topics):
+    """topics: iterable of (topic filter, requested QoS)"""
+    body = _U16.pack(packet_id) + b''.join(_string(topic) + bytes((qos,)) for topic, qos in topics)
+    return _packet(SUBSCRIBE, 0x02, body)
+
+
+def encode_suback(packet_id, granted):
+    return _packet(SUBACK, 0, _U16.pack(packet_id) + bytes(granted))
+
+
+def decode_connect(body):
+    """
+    Returns:
+        dict with client_id, keepalive, clean_session, username, password
+    """
+    try:
+        offset = 0
+        (length,) = _U16.unpack_from(body, offset)
+        protocol = body[2:2 + length]
+        offset = 2 + length
+        level, flags = body[offset], body[offset + 1]
+        (keepalive,) = _U16.unpack_from(body, offset + 2)
+        offset += 4
+        fields = []
+        for present in (True, flags & 0x04, flags & 0x04, flags & 0x80, flags & 0x40):
+            if not present:
+                fields.append(None)
+                continue
+            (length,) = _U16.unpack_from(body, offset)
+            fields.append(body[offset + 2:offset + 2 + length])
+            offset += 2 + length
+    except (struct.error, IndexError) as e:
+        raise MqttProtocolError(f"Malformed CONNECT: {str(e)}") from e
+    if protocol != b'MQTT' or level != 4:
+        raise MqttProtocolError(f"Unsupported protocol {protocol!r} level {level}")
+    client_id, _, _, username, password = fields
+    return {
+        'client_id': client_id.decode('utf-8', errors='replace'),
+        'keepalive': keepalive,
+        'clean_session': bool(flags & 0x02),
+        'username': username.decode('utf-8', errors='replace') if username is not None else None,
+        'password': password
+    }
+
+
+def decode_publish(flags, body):
+    """
+    Returns:
+        (topic, payload, qos, retain, packet_id or None)
+    """
+    qos = (flags >> 1) & 0x03
+    try:
+        (length,) = _U16.unpack_from(body, 0)
+        topic = body[2:2 + length].decode('utf-8')
+        offset = 2 + length
+        packet_id = None
+        if qos:
+            (packet_id,) = _U16.unpack_from(body, offset)
+            offset += 2
+    except (struct.error, UnicodeDecodeError) as e:
+        raise MqttProtocolError(f"Malformed PUBLISH: {str(e)}") from e
+    return topic, body[offset:], qos, bool(flags & 0x01), packet_id
+
+
+def decode_packet_id(body):
+    try:
+        return _U16.unpack_from(body, 0)[0]
+    except struct.error as e:
+        raise MqttProtocolError(f"Missing packet id: {str(e)}") from e
+
+
+def decode_subscribe(body):
+    """
+    Returns:
+        (packet_id, list of (topic filter, requested QoS))
+    """
+    packet_id = decode_packet_id(body)
+    topics = []
+    offset = 2
+    try:
+        while offset < len(body):
+            (length,) = _U16.unpack_from(body, offset)
+            topic = body[offset + 2:offset + 2 + length].decode('utf-8')
+            topics.append((topic, body[offset + 2 + length]))
+            offset += 3 + length
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise MqttProtocolError(f"Malformed SUBSCRIBE: {str(e)}") from e
+    return packet_id, topics
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT filter matching with the '+' and '#' wildcards"""
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def _remaining_length(buffer, pos):
+    """(length, offset of the body), or None while the varint is incomplete"""
+    length = 0
+    for i in range(4):
+        if pos + i >= len(buffer):
+            return None
+        byte = buffer[pos + i]
+        length += (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return length, pos + i + 1
+    raise MqttProtocolError("Malformed remaining length")
+
+
+class PacketReader:
+    """Splits a byte stream into packets; keeps partial data between feeds."""
+
+    def __init__(self, max_packet_size=MAX_REMAINING_LENGTH):
+        self.max_packet_size = max_packet_size
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Args:
+            data: Bytes received from the socket
+
+        Returns:
+            list of (packet type, flags, body bytes) for every complete packet
+        """
+        self._buffer += data
+        packets = []
+        buffer = self._buffer
+        offset = 0
+        while True:
+            header = _remaining_length(buffer, offset + 1)
+            if header is None:
+                break
+            length, body_start = header
+            if length > self.max_packet_size:
+                raise MqttProtocolError(f"Packet of {length} bytes exceeds the limit")
+            if len(buffer) - body_start < length:
+                break
+            first = buffer[offset]
+            packets.append((first >> 4, first & 0x0F, bytes(buffer[body_start:body_start + length])))
+            offset = body_start + length
+        if offset:
+            del buffer[:offset]
+        return packets
@@ -0,0 +1,230 @@
+"""
+On-demand CPU and allocation profiling of the running process.
+
+Both captures are time-boxed and run on a background thread, so they can
+be started from the admin API or AdminDialog without restarting the app:
+
+- ``cpu``: samples the stacks of every thread via ``sys._current_frames``
+  at a fixed interval. The report is in the collapsed-stack format read
+  by flamegraph.pl and speedscope. Unlike cProfile this sees all threads
+  (serial, API workers, writer, Qt) and its overhead is set by the
+  sampling interval rather than by how many calls the code makes.
+- ``memory``: takes ``tracemalloc`` snapshots at the start and end and
+  reports the allocation sites that grew the most. Allocations are
+  slower while tracing, so tracing is stopped again afterwards if this
+  module started it.
+
+Usage::
+
+    from core.profiling import PROFILER
+
+    PROFILER.start('cpu', seconds=10)
+    PROFILER.status('cpu')   # {'state': 'running', ...}
+    PROFILER.report('cpu')   # text once finished
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+KINDS = ('cpu', 'memory')
+MAX_SECONDS = 300
+
+
+class SamplingProfiler:
+    """Periodic stack sampler over all threads."""
+
+    def __init__(self, interval=0.01, max_stacks=20000, max_depth=64):
+        """
+        Args:
+            interval: Seconds between samples; clamped to at least 1 ms
+            max_stacks: Distinct stacks kept; later new stacks are counted as '[other]'
+            max_depth: Frames kept per stack, innermost first
+        """
+        self.interval = max(0.001, interval)
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+
+    def run(self, seconds, cancel_event):
+        """
+        Sample until ``seconds`` have passed or ``cancel_event`` is set.
+
+        Returns:
+            (Counter of collapsed stack -> samples, number of sampling passes)
+        """
+        stacks = Counter()
+        own = threading.get_ident()
+        passes = 0
+        deadline = time.monotonic() + seconds
+        while not cancel_event.wait(self.interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._collapse(names.get(ident, f'thread-{ident}'), frame)
+                if stack in stacks or len(stacks) < self.max_stacks:
+                    stacks[stack] += 1
+                else:
+                    stacks['[other]'] += 1
+            passes += 1
+        return stacks, passes
+
+    def _collapse(self, thread_name, frame):
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        frames.append(thread_name.replace(';', ':'))
+        return ';'.join(reversed(frames))
+
+
+class _Job:
+    __slots__ = ('kind', 'state', 'started', 'seconds', 'finished', 'summary', 'report', 'error', 'cancel_event')
+
+    def __init__(self, kind, seconds):
+        self.kind = kind
+        self.state = 'running'
+        self.started = time.time()
+        self.seconds = seconds
+        self.finished = None
+        self.summary = {}
+        self.report = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'state': self.state,
+            'started': self.started,
+            'seconds': self.seconds,
+            'finished': self.finished,
+            'summary': self.summary,
+            'error': self.error
+        }
+
+
+class Profiler:
+    """Runs at most one capture per kind and keeps the last report of each."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, kind, seconds=10.0, interval_ms=10, top=50):
+        """
+        Start a capture in the background.
+
+        Args:
+            kind: 'cpu' or 'memory'
+            seconds: Capture length, at most MAX_SECONDS
+            interval_ms: Sampling interval for 'cpu'
+            top: Allocation sites reported for 'memory'
+
+        Returns:
+            Job status dict
+
+        Raises:
+            ValueError: Unknown kind or bad duration
+            RuntimeError: A capture of this kind is already running
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown profile kind '{kind}', expected one of {', '.join(KINDS)}")
+        if not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {MAX_SECONDS}")
+        with self._lock:
+            current = self._jobs.get(kind)
+            if current and current.state == 'running':
+                raise RuntimeError(f"A {kind} profile is already running")
+            job = self._jobs[kind] = _Job(kind, seconds)
+        if kind == 'cpu':
+            target, args = self._run_cpu, (job, interval_ms / 1000.0)
+        else:
+            target, args = self._run_memory, (job, top)
+        threading.Thread(target=target, args=args, name=f'profile-{kind}', daemon=True).start()
+        return job.to_dict()
+
+    def cancel(self, kind):
+        """Stop a running capture early; what was gathered so far is reported"""
+        job = self._jobs.get(kind)
+        if job and job.state == 'running':
+            job.cancel_event.set()
+            return True
+        return False
+
+    def status(self, kind):
+        """Status dict of the latest capture of this kind, or None"""
+        job = self._jobs.get(kind)
+        return job.to_dict() if job else None
+
+    def report(self, kind):
+        """Text report of the latest finished capture of this kind, or None"""
+        job = self._jobs.get(kind)
+        return job.report if job and job.state != 'running' else None
+
+    def _run_cpu(self, job, interval):
+        try:
+            stacks, passes = SamplingProfiler(interval).run(job.seconds, job.cancel_event)
+            job.report = ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+            job.summary = {'passes': passes, 'stacks': len(stacks), 'interval_ms': interval * 1000}
+            self._finish(job)
+        except Exception as e:
+            self._fail(job, e)
+
+    def _run_memory(self, job, top):
+        started_here = not tracemalloc.is_tracing()
+        try:
+            if started_here:
+                tracemalloc.start(25)
+            before = tracemalloc.take_snapshot()
+            job.cancel_event.wait(job.seconds)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            job.report = self._allocation_report(before, after, top, current, peak)
+            job.summary = {'traced_bytes': current, 'peak_bytes': peak}
+            self._finish(job)
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+    @staticmethod
+    def _allocation_report(before, after, top, current, peak):
+        ignore = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        )
+        before = before.filter_traces(ignore)
+        after = after.filter_traces(ignore)
+        lines = [f'Traced memory: {current / 1024:.1f} KiB now, {peak / 1024:.1f} KiB peak', '']
+        lines.append(f'Top {top} allocation sites by growth during the capture:')
+        for stat in after.compare_to(before, 'lineno')[:top]:
+            lines.append(f'  {stat}')
+        lines.append('')
+        lines.append(f'Top {top} allocation sites by size at the end:')
+        for stat in after.statistics('lineno')[:top]:
+            lines.append(f'  {stat}')
+        lines.append('')
+        lines.append('Largest growing allocation stacks:')
+        for stat in after.compare_to(before, 'traceback')[:min(top, 10)]:
+            lines.append(f'  {stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks')
+            lines.extend(f'    {line}' for line in stat.traceback.format())
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _finish(job):
+        job.state = 'cancelled' if job.cancel_event.is_set() else 'done'
+        job.finished = time.time()
+
+    @staticmethod
+    def _fail(job, error):
+        job.error = str(error)
+        job.state = 'failed'
+        job.finished = time.time()
+
+
+PROFILER = Profiler()
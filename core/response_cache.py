@@ -0,0 +1,75 @@
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """An encoded response body with the validator it was served under."""
+    body: bytes
+    etag: str
+    built_at: float
+
+
+class ResponseCache:
+    """
+    Encoded API responses keyed by endpoint.
+
+    Entries are invalidated by events (a service state change) or checked
+    against the ETag they were built for (the stable weight) rather than
+    expiring on a timer, so a hot endpoint serves the same bytes object until
+    its data actually changes. Lookups take no lock.
+
+    Every key has a generation that ``invalidate`` bumps. A response is
+    built outside the cache and stored with the generation read before the
+    build started. ``put`` drops it if an invalidation happened meanwhile,
+    so a slow builder cannot overwrite fresher state with stale bytes.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, max_age=None):
+        """
+        Args:
+            key: Cache key, e.g. ('status', None)
+            max_age: Optional seconds after which the entry is ignored, for
+                bodies that embed a clock (uptime, generation time)
+
+        Returns:
+            CachedResponse or None
+        """
+        entry = self._entries.get(key)
+        if entry is None or (max_age is not None and time.monotonic() - entry.built_at > max_age):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def generation(self, key):
+        """Read before building a response; pass the value to ``put``."""
+        return self._generations.get(key, 0)
+
+    def put(self, key, generation, body, etag=''):
+        """Store a freshly built body unless ``key`` was invalidated meanwhile."""
+        entry = CachedResponse(body, etag, time.monotonic())
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
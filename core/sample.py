@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class WeightSample:
+    """
+    One parsed weight sample as published by the serial service.
+
+    ``seq`` increases by one per sample for the lifetime of the process;
+    ``timestamp`` is wall-clock epoch seconds.
+    """
+    seq: int
+    weight_kg: float
+    is_stable: bool
+    timestamp: float
+    device_id: Optional[int] = None
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'weight_kg': self.weight_kg,
+            'is_stable': self.is_stable,
+            'timestamp': self.timestamp,
+            'device_id': self.device_id
+        }
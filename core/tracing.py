@@ -0,0 +1,118 @@
+"""
+Per-sample latency tracing through the acquisition pipeline.
+
+Each sample gets a row of ``time.perf_counter_ns()`` stamps, one per
+stage, in a fixed-size ring indexed by the sample's sequence number. The
+serial thread writes the first stages in one call; later stages are
+stamped by whichever thread reaches them. Stamping is a list lookup and
+an item assignment, with no lock: the GIL makes each assignment atomic,
+and a row overwritten by a newer sample is recognised by its sequence
+number and ignored.
+
+Usage::
+
+    from core.tracing import TRACER, SERVED
+
+    TRACER.mark(sample.seq, SERVED)
+    TRACER.summary()  # per-stage percentiles in milliseconds
+"""
+import time
+
+# Stage indexes, in pipeline order
+READ, PARSED, FILTERED, STABILITY, PUBLISHED, COMMITTED, SERVED = range(7)
+STAGES = ('read', 'parsed', 'filtered', 'stability', 'published', 'committed', 'served')
+# The stage each one follows; the pipeline forks after publishing, so
+# committing and serving both follow PUBLISHED and may happen in either order
+_FOLLOWS = (None, READ, PARSED, FILTERED, STABILITY, PUBLISHED, PUBLISHED)
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyTracer:
+    """Ring buffer of the stage stamps of the most recent samples."""
+
+    def __init__(self, capacity=2048, enabled=True):
+        """
+        Args:
+            capacity: Number of recent samples kept
+            enabled: When False every call returns immediately
+        """
+        self.configure(capacity=capacity, enabled=enabled)
+
+    def configure(self, capacity=None, enabled=None):
+        """Resize and/or toggle tracing; resizing discards recorded traces"""
+        if capacity is not None:
+            self.capacity = max(1, int(capacity))
+            # Row layout: [seq, stamp per stage...]; 0 means not reached
+            self._rows = [None] * self.capacity
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    def begin(self, seq, read_ns, parsed_ns, filtered_ns, stability_ns):
+        """Start the trace of sample ``seq`` with its serial-thread stamps"""
+        if self.enabled:
+            self._rows[seq % self.capacity] = [seq, read_ns, parsed_ns, filtered_ns, stability_ns, 0, 0, 0]
+
+    def mark(self, seq, stage, now_ns=None):
+        """Stamp ``stage`` for sample ``seq``; only the first stamp counts"""
+        if not self.enabled:
+            return
+        row = self._rows[seq % self.capacity]
+        if row is not None and row[0] == seq and not row[stage + 1]:
+            row[stage + 1] = now_ns or time.perf_counter_ns()
+
+    def mark_many(self, seqs, stage):
+        """Stamp ``stage`` for several samples with one clock read"""
+        if self.enabled:
+            now_ns = time.perf_counter_ns()
+            for seq in seqs:
+                self.mark(seq, stage, now_ns)
+
+    def traces(self):
+        """Recorded rows, oldest first, as (seq, stamps) with None for missing stages"""
+        rows = [row for row in list(self._rows) if row is not None]
+        rows.sort(key=lambda row: row[0])
+        return [(row[0], [stamp or None for stamp in row[1:]]) for row in rows]
+
+    def summary(self):
+        """
+        Latency percentiles per stage.
+
+        Returns:
+            dict with ``samples`` and ``stages``, a list of dicts with the
+            stage name, ``count`` of samples that reached it, and
+            percentiles in milliseconds of both the time since the stage it
+            follows (``step_ms``) and the time since the bytes were read
+            (``total_ms``)
+        """
+        traces = self.traces()
+        stages = []
+        for stage in range(PARSED, len(STAGES)):
+            steps, totals = [], []
+            for _, stamps in traces:
+                stamp = stamps[stage]
+                if stamp is None:
+                    continue
+                follows = stamps[_FOLLOWS[stage]]
+                if follows is not None:
+                    steps.append(stamp - follows)
+                totals.append(stamp - stamps[READ])
+            stages.append({
+                'stage': STAGES[stage],
+                'count': len(totals),
+                'step_ms': _percentiles(steps),
+                'total_ms': _percentiles(totals)
+            })
+        return {'enabled': self.enabled, 'samples': len(traces), 'stages': stages}
+
+
+def _percentiles(values_ns):
+    if not values_ns:
+        return None
+    values_ns.sort()
+    last = len(values_ns) - 1
+    result = {f'p{p}': round(values_ns[round(last * p / 100)] / 1e6, 3) for p in PERCENTILES}
+    result['max'] = round(values_ns[-1] / 1e6, 3)
+    return result
+
+
+TRACER = LatencyTracer()
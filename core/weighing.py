@@ -0,0 +1,61 @@
+WEIGHT_STABLE = 'weight.stable'
+WEIGHING_COMPLETED = 'weighing.completed'
+EVENT_TYPES = (WEIGHT_STABLE, WEIGHING_COMPLETED)
+
+
+class WeighingDetector:
+    """
+    Turns the sample stream into weighing events, per device.
+
+    A weighing is a run of stable samples at or above ``min_weight_kg``.
+    Its first sample raises ``weight.stable``; the first sample after it
+    (unstable, or below the minimum) raises ``weighing.completed`` with a
+    summary of the run. Only keeps a few numbers per device, so it is
+    cheap enough to feed from the acquisition thread.
+    """
+
+    def __init__(self, min_weight_kg=0.0):
+        self.min_weight_kg = min_weight_kg
+        self._runs = {}
+
+    def feed(self, sample):
+        """
+        Args:
+            sample: WeightSample
+
+        Returns:
+            list of (event_type, data dict), usually empty
+        """
+        run = self._runs.get(sample.device_id)
+        if sample.is_stable and abs(sample.weight_kg) >= self.min_weight_kg:
+            if run is None:
+                self._runs[sample.device_id] = {
+                    'started': sample.timestamp, 'ended': sample.timestamp, 'samples': 1,
+                    'sum': sample.weight_kg, 'min': sample.weight_kg, 'max': sample.weight_kg
+                }
+                return [(WEIGHT_STABLE, {
+                    'device_id': sample.device_id,
+                    'weight_kg': sample.weight_kg,
+                    'timestamp': sample.timestamp,
+                    'seq': sample.seq
+                })]
+            run['ended'] = sample.timestamp
+            run['samples'] += 1
+            run['sum'] += sample.weight_kg
+            run['min'] = min(run['min'], sample.weight_kg)
+            run['max'] = max(run['max'], sample.weight_kg)
+            return []
+        if run is None:
+            return []
+        # The stable period is over: the load moved or left the scale
+        del self._runs[sample.device_id]
+        return [(WEIGHING_COMPLETED, {
+            'device_id': sample.device_id,
+            'started': run['started'],
+            'ended': run['ended'],
+            'duration_s': round(run['ended'] - run['started'], 3),
+            'samples': run['samples'],
+            'weight_kg': round(run['sum'] / run['samples'], 3),
+            'min_kg': run['min'],
+            'max_kg': run['max']
+        })]
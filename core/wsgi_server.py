@@ -0,0 +1,272 @@
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+class _ConnectionHandler(WSGIRequestHandler):
+    """
+    Werkzeug's request handler, driven one request at a time.
+
+    The stock handler loops over keep-alive requests inside one thread. Here
+    the server calls ``handle_one_request`` per dispatch instead, so an idle
+    keep-alive connection holds no thread between requests.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Buffer writes so the status line, headers and body leave in one
+    # segment when werkzeug flushes; unbuffered, they go out as separate
+    # small sends and stall on Nagle plus delayed ACK
+    wbufsize = -1
+
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.timeout = server.request_timeout
+        self.detached = False
+        self.setup()
+
+    def make_environ(self):
+        environ = super().make_environ()
+        environ['weighbridge.detach'] = self.detach
+        return environ
+
+    def detach(self):
+        """
+        Hand the raw socket to the application, e.g. for a long-lived
+        stream. Call it only after the response headers have been written;
+        the server then forgets the connection without closing it.
+        """
+        self.wfile.flush()
+        self.detached = True
+        self.close_connection = True
+        return self.connection
+
+    def log_request(self, code='-', size='-'):
+        # Access logging per request is too expensive for polling clients
+        pass
+
+
+class _Connection:
+    __slots__ = ('sock', 'address', 'handler', 'last_active')
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.handler = None
+        self.last_active = time.monotonic()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server with a fixed worker pool and HTTP/1.1 keep-alive.
+
+    One selector thread accepts connections and watches idle keep-alive
+    sockets; only a connection with a request waiting is handed to one of
+    ``workers`` threads. Thread count stays fixed no matter how many clients
+    are connected. Connections beyond ``max_connections`` get an immediate
+    503. ``shutdown`` stops accepting, lets in-flight requests finish and
+    closes idle connections.
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, workers=8, max_connections=256,
+                 request_timeout=10.0, keepalive_timeout=15.0):
+        super().__init__(host, port, app, handler=_ConnectionHandler)
+        self.workers = workers
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.socket.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._tasks = queue.Queue()
+        self._parked = queue.SimpleQueue()
+        self._idle = set()
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._threads = []
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+
+    @property
+    def connection_count(self):
+        return len(self._connections)
+
+    def serve_forever(self, poll_interval=1.0):
+        self._stopping.clear()
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'http-worker-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._selector.register(self.socket, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        try:
+            while not self._stopping.is_set():
+                for key, _ in self._selector.select(poll_interval):
+                    if key.fileobj is self.socket:
+                        self._accept()
+                    elif key.fileobj is self._wake_r:
+                        self._drain_wakeups()
+                    else:
+                        self._dispatch(key.data)
+                self._reap_idle()
+        finally:
+            self._finish()
+
+    def shutdown(self, timeout=10.0):
+        """Stop serving; waits up to ``timeout`` seconds for in-flight requests."""
+        self._stopping.set()
+        self._wake()
+        self._stopped.wait(timeout)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, address = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if len(self._connections) >= self.max_connections:
+                self._reject(sock)
+                continue
+            sock.setblocking(True)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = _Connection(sock, address)
+            with self._lock:
+                self._connections.add(conn)
+            self._park(conn)
+
+    @staticmethod
+    def _reject(sock):
+        try:
+            sock.sendall(b"HTTP/1.1 503 Service Unavailable\r\n"
+                         b"Retry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        except OSError:
+            pass
+        sock.close()
+
+    def _park(self, conn):
+        conn.last_active = time.monotonic()
+        self._idle.add(conn)
+        self._selector.register(conn.sock, selectors.EVENT_READ, conn)
+
+    def _dispatch(self, conn):
+        self._selector.unregister(conn.sock)
+        self._idle.discard(conn)
+        self._tasks.put(conn)
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while True:
+            try:
+                conn = self._parked.get_nowait()
+            except queue.Empty:
+                return
+            if self._stopping.is_set():
+                self._close(conn)
+            else:
+                self._park(conn)
+
+    def _reap_idle(self):
+        cutoff = time.monotonic() - self.keepalive_timeout
+        for conn in [c for c in self._idle if c.last_active < cutoff]:
+            self._selector.unregister(conn.sock)
+            self._idle.discard(conn)
+            self._close(conn)
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            # Buffer full means a wakeup is already pending
+            pass
+
+    def _worker(self):
+        while True:
+            conn = self._tasks.get()
+            if conn is None:
+                return
+            self._serve(conn)
+
+    def _serve(self, conn):
+        try:
+            if conn.handler is None:
+                conn.handler = _ConnectionHandler(conn.sock, conn.address, self)
+            handler = conn.handler
+            handler.close_connection = True
+            handler.handle_one_request()
+            if handler.detached:
+                with self._lock:
+                    self._connections.discard(conn)
+                return
+            handler.wfile.flush()
+            keep_alive = not handler.close_connection and not self._stopping.is_set()
+        except (OSError, ValueError):
+            keep_alive = False
+
+        if not keep_alive:
+            self._close(conn)
+        elif self._has_buffered_request(conn):
+            # A pipelined request is already in the read buffer
+            self._tasks.put(conn)
+        else:
+            self._parked.put(conn)
+            self._wake()
+
+    def _has_buffered_request(self, conn):
+        # peek() on a non-blocking socket returns only what is buffered
+        # (or immediately readable) and never waits
+        conn.sock.setblocking(False)
+        try:
+            return bool(conn.handler.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            conn.sock.settimeout(self.request_timeout)
+
+    def _close(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+        try:
+            if conn.handler is not None:
+                conn.handler.finish()
+        except OSError:
+            pass
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+
+    def _finish(self):
+        self._selector.unregister(self.socket)
+        self.socket.close()
+        for conn in list(self._idle):
+            self._selector.unregister(conn.sock)
+            self._close(conn)
+        self._idle.clear()
+        # Let in-flight requests complete, then stop the workers
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join(timeout=self.request_timeout)
+        self._drain_wakeups()
+        for conn in list(self._connections):
+            self._close(conn)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        self._stopped.set()
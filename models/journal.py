@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class JournalCheckpoint(Base):
+    """
+    Highest sample journal sequence number already applied to the database.
+    Updated in the same transaction as the readings it covers.
+    """
+    __tablename__ = 'journal_checkpoint'
+
+    id = Column(Integer, primary_key=True)
+    applied_seq = Column(Integer, nullable=False, default=0)
+
+    def __init__(self, applied_seq=0, id=1):
+        self.id = id
+        self.applied_seq = applied_seq
@@ -10,6 +10,8 @@ class Log(Base):
     Database model for logs.
     """
     __tablename__ = 'logs'
+    # Ids are never reused, even after clear_logs; replication ships rows by id
+    __table_args__ = {'sqlite_autoincrement': True}
 
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, Float, String, Text
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class OutboxEvent(Base):
+    """
+    Event waiting to be forwarded to the upstream ``api_endpoint``.
+
+    ``payload`` is the event's JSON document, sent verbatim. Rows are
+    deleted once the endpoint acknowledges them; a row the endpoint
+    rejected outright is kept with ``dead`` set for inspection.
+    ``event_id`` is a random UUID and deliberately not indexed, so an
+    acknowledgement is a range delete on the primary key alone.
+    """
+    __tablename__ = 'forward_outbox'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    event_id = Column(String, nullable=False)
+    event_type = Column(String, nullable=False)
+    created = Column(Float, nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String)
+    dead = Column(Integer, nullable=False, default=0)
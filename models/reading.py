@@ -10,6 +10,9 @@ class Reading(Base):
     Database model for weight readings.
     """
     __tablename__ = 'readings'
+    # Ids are never reused, even after the newest rows are deleted;
+    # replication ships rows by id
+    __table_args__ = {'sqlite_autoincrement': True}
 
     id = Column(Integer, primary_key=True)
     weight_kg = Column(Float, nullable=False)
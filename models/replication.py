@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class ReplicationState(Base):
+    """
+    Replication high-water mark per table: the highest row id the central
+    receiver has acknowledged.
+    """
+    __tablename__ = 'replication_state'
+
+    table_name = Column(String, primary_key=True)
+    acked_id = Column(Integer, nullable=False, default=0)
+
+    def __init__(self, table_name, acked_id=0):
+        self.table_name = table_name
+        self.acked_id = acked_id
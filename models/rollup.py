@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Float
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class ReadingRollup(Base):
+    """
+    Pre-aggregated readings per device and time bucket.
+
+    ``bucket`` is the bucket start in epoch seconds (UTC), aligned to
+    ``resolution`` seconds. ``device_key`` is the device id, or -1 for
+    readings without one, so the primary key never contains NULL.
+    Maintained in the same transaction as the readings it summarises.
+    """
+    __tablename__ = 'reading_rollups'
+
+    resolution = Column(Integer, primary_key=True)
+    device_key = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False)
+    min_kg = Column(Float, nullable=False)
+    max_kg = Column(Float, nullable=False)
+    sum_kg = Column(Float, nullable=False)
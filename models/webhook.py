@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, Float, String
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class WebhookSubscription(Base):
+    """
+    An endpoint that receives weighing events as HTTP POSTs.
+
+    ``event_types`` is a comma-separated list, empty for all types;
+    ``device_id`` limits delivery to one device when set. A subscription
+    the dispatcher gave up on has ``enabled`` cleared and the reason in
+    ``disabled_reason``.
+    """
+    __tablename__ = 'webhook_subscriptions'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    url = Column(String, nullable=False)
+    event_types = Column(String, nullable=False, default='')
+    device_id = Column(Integer)
+    secret = Column(String)
+    max_concurrency = Column(Integer, nullable=False, default=2)
+    enabled = Column(Integer, nullable=False, default=1)
+    disabled_reason = Column(String)
+    created = Column(Float, nullable=False)
+
+    def to_dict(self, include_secret=False):
+        result = {
+            'id': self.id,
+            'name': self.name,
+            'url': self.url,
+            'event_types': [t for t in self.event_types.split(',') if t],
+            'device_id': self.device_id,
+            'max_concurrency': self.max_concurrency,
+            'enabled': bool(self.enabled),
+            'disabled_reason': self.disabled_reason,
+            'created': self.created,
+            'has_secret': bool(self.secret)
+        }
+        if include_secret:
+            result['secret'] = self.secret
+        return result
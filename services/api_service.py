@@ -1,83 +1,745 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from werkzeug.http import parse_etags
+from werkzeug.serving import make_server
 import threading
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import base64
+import csv
+import io
 import json
+import math
+import time
+import uuid
+import zlib
 from functools import wraps
+from urllib.parse import urlsplit
 
-from core.config import Config
+from core import binary_format
+from core.admission import AdmissionControl
+from core.broadcast import Broadcaster
+from core.downsample import lttb
+from core.metrics import REGISTRY
+from core.profiling import PROFILER
+from core.response_cache import ResponseCache
+from core.tracing import TRACER, SERVED
+from core.weighing import EVENT_TYPES
+from core.wsgi_server import PooledWSGIServer
+
+# Stable reading versions restart with the process; the boot id keeps ETags
+# from one run from matching readings of the next
+_BOOT_ID = uuid.uuid4().hex[:8]
+_LOOPBACK = ('127.0.0.1', '::1')
+
+METRICS_MIME_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+REQUESTS = REGISTRY.counter('api_requests_total', 'Requests answered, by route and status', ['route', 'status'])
+REQUEST_SECONDS = REGISTRY.histogram('api_request_seconds', 'Time to response headers, by route', ['route'])
+SSE_SUBSCRIBERS = REGISTRY.gauge('api_sse_subscribers', 'Open /api/weight/stream subscriptions')
+HTTP_CONNECTIONS = REGISTRY.gauge('api_http_connections', 'Open HTTP connections')
 
 class ApiService(threading.Thread):
-    def __init__(self, logger, service_manager, host=None, port=None):
+    def __init__(self, logger, db=None, config=None, service_manager=None, host=None, port=None):
         super().__init__(daemon=True)
         self.logger = logger
+        self.db = db
+        self.config = config or {}
         self.service_manager = service_manager
-        self.host = host or Config.FLASK_HOST
-        self.port = port or Config.FLASK_PORT
+        self.host = host or self.config.get('flask_host', '127.0.0.1')
+        self.port = port or self.config.get('flask_port', 5000)
+        self.backend = self.config.get('api_server', 'pooled')
         self.app = Flask('weighbridge_api')
+        self.server = None
+        # One thread encodes each sample once and fans it out to all
+        # /api/weight/stream subscribers
+        self.broadcaster = Broadcaster(
+            'sse-broadcast',
+            encode=self._encode_sse,
+            max_subscribers=self.config.get('sse_max_subscribers', 1000),
+            heartbeat=b': keepalive\n\n',
+            heartbeat_interval=self.config.get('sse_heartbeat_s', 15.0),
+            logger=self.logger
+        )
+        # Long-polls hold a worker, so only some may wait at once
+        self.longpoll_max_s = self.config.get('api_longpoll_max_s', 30.0)
+        self._longpoll_slots = threading.BoundedSemaphore(
+            self.config.get('api_longpoll_max', max(1, self.config.get('api_workers', 8) // 2))
+        )
+        self._stable_changed = threading.Condition()
+        self._stopping = False
+        # Encoded bodies of the hot endpoints, invalidated by bus events
+        self.cache = ResponseCache()
+        self.status_max_age_s = self.config.get('api_status_max_age_s', 1.0)
+        # Per-client token buckets and a global in-flight cap, applied
+        # before Flask routing. The pooled server never runs more than
+        # api_workers requests at once and answers 503 itself beyond
+        # api_max_connections, so there the cap defaults to the worker
+        # count; it only sheds load for werkzeug's thread per connection
+        default_inflight = self.config.get('api_workers', 8) if self.backend == 'pooled' else 64
+        self.admission = AdmissionControl(
+            self.app.wsgi_app,
+            rate=self.config.get('api_rate_limit', 20.0),
+            burst=self.config.get('api_rate_burst', 40),
+            max_inflight=self.config.get('api_max_inflight', default_inflight),
+            api_keys=self.config.get('api_keys'),
+            exempt_prefixes=('/api/weight/stream',),
+            logger=self.logger
+        )
+        self.app.wsgi_app = self.admission
+        SSE_SUBSCRIBERS.set_function(lambda: self.broadcaster.subscriber_count)
+        self._setup_instrumentation()
         self._setup_routes()
 
+    def _setup_instrumentation(self):
+        """Count requests and time them per route rule, not per URL"""
+        @self.app.before_request
+        def start_timer():
+            request.environ['weighbridge.started'] = time.perf_counter()
+
+        @self.app.after_request
+        def record_request(response):
+            started = request.environ.get('weighbridge.started')
+            rule = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUESTS.labels(rule, response.status_code).inc()
+            if started is not None:
+                REQUEST_SECONDS.labels(rule).observe(time.perf_counter() - started)
+            return response
+
     def _setup_routes(self):
         @self.app.route('/api/weight', methods=['GET'])
         def get_weight():
-            """Get the current stable weight reading"""
+            """
+            Get the current stable weight reading.
+
+            The ETag is the stable reading's version, which only advances
+            when the scale settles again or on a different weight, so pollers
+            can send If-None-Match and get a bodiless 304 while nothing
+            changed. With ``?wait=<seconds>`` the request is held until a
+            version newer than ``since`` (or the If-None-Match tag) arrives.
+            """
             reader = self.service_manager.get_service('serial')
             if not reader or not reader.is_alive():
                 return jsonify({
                     'status': 'error',
                     'message': 'Serial service not running'
                 }), 503
-                
-            weight = reader.get_last_stable()
-            if weight is None:
+
+            # Plain polls carry neither a query string nor a validator; skip
+            # Werkzeug's parsing for them
+            environ = request.environ
+            if_none_match = parse_etags(environ.get('HTTP_IF_NONE_MATCH')) if 'HTTP_IF_NONE_MATCH' in environ else None
+            since, wait = None, 0.0
+            if environ.get('QUERY_STRING'):
+                since = request.args.get('since', type=int)
+                wait = min(max(request.args.get('wait', default=0.0, type=float), 0.0), self.longpoll_max_s)
+            if since is None and if_none_match:
+                since = self._version_from_etags(if_none_match)
+
+            version, sample = reader.stable_reading
+            if wait and since is not None and (sample is None or version == since):
+                if not self._longpoll_slots.acquire(blocking=False):
+                    response = jsonify({'status': 'error', 'message': 'Too many waiting clients'})
+                    response.status_code = 503
+                    response.headers['Retry-After'] = '1'
+                    return response
+                try:
+                    version, sample = self._wait_for_stable(reader, since, wait)
+                finally:
+                    self._longpoll_slots.release()
+
+            if sample is None:
                 return jsonify({
                     'status': 'no_reading',
                     'message': 'No stable reading available'
                 }), 200
-                
-            self.logger.info(f'API: Weight requested - {weight} kg')
+
+            etag = self._weight_etag(version)
+            headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'no-cache')]
+            if if_none_match and etag in if_none_match:
+                return Response(status=304, headers=headers)
+            headers.append(('Content-Type', 'application/json'))
+            TRACER.mark(sample.seq, SERVED)
+            return Response(self._weight_body(version, sample, etag), headers=headers)
+
+        @self.app.route('/api/weight/stream', methods=['GET'])
+        def stream_weight():
+            """Server-Sent Events stream of every new weight sample"""
+            return self._sse_response(None)
+
+        @self.app.route('/api/weight/stream/<int:device_id>', methods=['GET'])
+        def stream_device_weight(device_id):
+            """Server-Sent Events stream of one device's weight samples"""
+            return self._sse_response(device_id)
+
+        @self.app.route('/api/readings', methods=['GET'])
+        def get_readings():
+            """Page through persisted readings, newest first unless ?order=asc"""
+            try:
+                filters = self._reading_filters()
+                after = self._decode_cursor(request.args.get('cursor'))
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            binary = self._wants_binary()
+            limit = min(max(request.args.get('limit', default=100, type=int), 1), 50000 if binary else 1000)
+            readings = self.db.search_readings(
+                after=after,
+                limit=limit,
+                descending=request.args.get('order', 'desc') != 'asc',
+                raw=binary,
+                **filters
+            )
+            next_cursor = None
+            if len(readings) == limit:
+                last = readings[-1]
+                if binary:
+                    next_cursor = self._encode_cursor(last[1].replace(' ', 'T'), last[0])
+                else:
+                    next_cursor = self._encode_cursor(last['timestamp'], last['id'])
+            if binary:
+                # Columnar body; the cursor travels in a header
+                body = binary_format.encode_header()
+                if readings:
+                    body += binary_format.encode_block(readings)
+                body += binary_format.encode_end()
+                headers = {'Vary': 'Accept'}
+                if next_cursor:
+                    headers['X-Next-Cursor'] = next_cursor
+                return Response(body, mimetype=binary_format.MIME_TYPE, headers=headers)
             return jsonify({
                 'status': 'success',
-                'timestamp': datetime.utcnow().isoformat(),
-                'weight_kg': weight
+                'count': len(readings),
+                'readings': readings,
+                'next_cursor': next_cursor
             })
 
-        @self.app.route('/api/readings', methods=['GET'])
-        def get_readings():
-            """Get recent weight readings"""
-            reader = self.service_manager.get_service('serial')
-            if not reader or not reader.is_alive():
+        @self.app.route('/api/readings/export', methods=['GET'])
+        def export_readings():
+            """Stream matching readings, oldest first, as NDJSON or CSV"""
+            try:
+                filters = self._reading_filters()
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            export_format = request.args.get('format') or ('binary' if self._wants_binary() else 'ndjson')
+            if export_format not in self.EXPORT_FORMATS:
+                return jsonify({'status': 'error', 'message': f'Unknown format: {export_format}'}), 400
+
+            mimetype, encode = self.EXPORT_FORMATS[export_format]
+            pages = self.db.iter_readings(
+                chunk_size=self.config.get('export_chunk_rows', 5000),
+                raw=export_format == 'binary',
+                **filters
+            )
+            body = encode(pages)
+            headers = {
+                'Content-Disposition': f'attachment; filename=readings.{export_format}',
+                'Vary': 'Accept, Accept-Encoding'
+            }
+            if 'gzip' in request.accept_encodings:
+                body = self._gzip_stream(body)
+                headers['Content-Encoding'] = 'gzip'
+            return Response(body, mimetype=mimetype, headers=headers)
+
+        @self.app.route('/api/readings/aggregate', methods=['GET'])
+        def aggregate_readings():
+            """Min/max/avg/count per bucket, or an LTTB-downsampled series with ?points=N"""
+            args = request.args
+            try:
+                until = self._parse_time(args.get('to')) or datetime.utcnow()
+                since = self._parse_time(args.get('from')) or until - timedelta(days=1)
+                bucket = self._parse_bucket(args.get('bucket', '1h'))
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            if since >= until:
+                return jsonify({'status': 'error', 'message': "'from' must be before 'to'"}), 400
+            device_id = args.get('device', type=int)
+
+            points = args.get('points', type=int)
+            if points:
+                xs, ys = self.db.reading_series(
+                    device_id, since, until,
+                    max_points=self.config.get('aggregate_max_source_points', 200000)
+                )
+                sampled = lttb(xs, ys, min(max(points, 3), 10000))
                 return jsonify({
-                    'status': 'error',
-                    'message': 'Serial service not running'
-                }), 503
-                
-            limit = request.args.get('limit', default=10, type=int)
-            readings = getattr(reader, '_readings', [])[-limit:]
+                    'status': 'success',
+                    'count': len(sampled),
+                    'source_points': len(xs),
+                    'points': [
+                        {'timestamp': datetime.utcfromtimestamp(x).isoformat(), 'weight_kg': y}
+                        for x, y in sampled
+                    ]
+                })
+
+            if (until - since).total_seconds() / bucket > self.config.get('aggregate_max_buckets', 100000):
+                return jsonify({'status': 'error', 'message': 'Too many buckets; use a larger bucket'}), 400
+            rows = self.db.aggregate_readings(device_id, since, until, bucket)
             return jsonify({
                 'status': 'success',
-                'count': len(readings),
-                'readings': readings
+                'bucket': bucket,
+                'count': len(rows),
+                'buckets': [
+                    {
+                        'start': datetime.utcfromtimestamp(start).isoformat(),
+                        'count': count,
+                        'min_kg': min_kg,
+                        'max_kg': max_kg,
+                        'avg_kg': avg_kg
+                    }
+                    for start, count, min_kg, max_kg, avg_kg in rows
+                ]
             })
 
         @self.app.route('/api/status', methods=['GET'])
         def get_status():
             """Get service status"""
-            services = self.service_manager.list_services()
+            # Rebuilt on service state changes; uptimes, client counters and
+            # the timestamp are refreshed at most every status_max_age_s
+            entry = self.cache.get(('status', None), max_age=self.status_max_age_s)
+            if entry is None:
+                generation = self.cache.generation(('status', None))
+                body = self._encode_json({
+                    'status': 'success',
+                    'services': self.service_manager.list_services(),
+                    'api': self.admission.snapshot(),
+                    'timestamp': datetime.utcnow().isoformat()
+                })
+                entry = self.cache.put(('status', None), generation, body)
+            return Response(entry.body, mimetype='application/json')
+
+        @self.app.route('/api/debug/latency', methods=['GET'])
+        def get_latency():
+            """Per-stage latency percentiles of recent samples"""
+            return jsonify({'status': 'success', **TRACER.summary()})
+
+        @self.app.route('/api/admin/profile/<kind>', methods=['POST'])
+        @self._admin_only
+        def start_profile(kind):
+            """Start a time-boxed 'cpu' or 'memory' capture"""
+            try:
+                job = PROFILER.start(
+                    kind,
+                    seconds=request.args.get('seconds', default=10.0, type=float),
+                    interval_ms=request.args.get('interval_ms', default=10.0, type=float),
+                    top=request.args.get('top', default=50, type=int)
+                )
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            except RuntimeError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 409
+            self.logger.info(f"Started {kind} profile for {job['seconds']}s", source='api')
+            return jsonify({'status': 'success', 'job': job}), 202
+
+        @self.app.route('/api/admin/profile/<kind>', methods=['GET'])
+        @self._admin_only
+        def get_profile(kind):
+            """Status of the latest capture of this kind"""
+            job = PROFILER.status(kind)
+            if job is None:
+                return jsonify({'status': 'error', 'message': f'No {kind} profile taken'}), 404
+            return jsonify({'status': 'success', 'job': job})
+
+        @self.app.route('/api/admin/profile/<kind>', methods=['DELETE'])
+        @self._admin_only
+        def cancel_profile(kind):
+            """Stop a running capture early"""
+            return jsonify({'status': 'success', 'cancelled': PROFILER.cancel(kind)})
+
+        @self.app.route('/api/admin/profile/<kind>/report', methods=['GET'])
+        @self._admin_only
+        def get_profile_report(kind):
+            """Download the report: collapsed stacks for cpu, top allocators for memory"""
+            report = PROFILER.report(kind)
+            if report is None:
+                return jsonify({'status': 'error', 'message': f'No finished {kind} profile'}), 404
+            filename = f"weighbridge-{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+            return Response(report, mimetype='text/plain', headers={
+                'Content-Disposition': f'attachment; filename="{filename}"'
+            })
+
+        @self.app.route('/api/webhooks', methods=['GET'])
+        @self._admin_only
+        def list_webhooks():
+            """Webhook subscriptions with their delivery counters"""
+            stats = self._webhook_stats()
+            webhooks = self.db.list_webhooks()
+            for webhook in webhooks:
+                webhook['delivery'] = stats.get(webhook['id'])
+            return jsonify({'status': 'success', 'webhooks': webhooks})
+
+        @self.app.route('/api/webhooks', methods=['POST'])
+        @self._admin_only
+        def add_webhook():
+            """Subscribe a URL to weighing events"""
+            try:
+                fields = self._webhook_fields(request.get_json(silent=True), partial=False)
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            webhook = self.db.add_webhook(**fields)
+            self._webhooks_changed()
+            self.logger.info(f"Added webhook {webhook['id']} -> {webhook['url']}", source='api')
+            return jsonify({'status': 'success', 'webhook': webhook}), 201
+
+        @self.app.route('/api/webhooks/<int:webhook_id>', methods=['GET'])
+        @self._admin_only
+        def get_webhook(webhook_id):
+            webhook = self.db.get_webhook(webhook_id)
+            if webhook is None:
+                return jsonify({'status': 'error', 'message': 'No such webhook'}), 404
+            webhook['delivery'] = self._webhook_stats().get(webhook_id)
+            return jsonify({'status': 'success', 'webhook': webhook})
+
+        @self.app.route('/api/webhooks/<int:webhook_id>', methods=['PATCH'])
+        @self._admin_only
+        def update_webhook(webhook_id):
+            """Change a subscription; ``{"enabled": true}`` revives a disabled one"""
+            try:
+                fields = self._webhook_fields(request.get_json(silent=True), partial=True)
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            webhook = self.db.update_webhook(webhook_id, **fields)
+            if webhook is None:
+                return jsonify({'status': 'error', 'message': 'No such webhook'}), 404
+            self._webhooks_changed()
+            return jsonify({'status': 'success', 'webhook': webhook})
+
+        @self.app.route('/api/webhooks/<int:webhook_id>', methods=['DELETE'])
+        @self._admin_only
+        def delete_webhook(webhook_id):
+            if not self.db.delete_webhook(webhook_id):
+                return jsonify({'status': 'error', 'message': 'No such webhook'}), 404
+            self._webhooks_changed()
+            self.logger.info(f"Deleted webhook {webhook_id}", source='api')
+            return jsonify({'status': 'success'})
+
+        @self.app.route('/metrics', methods=['GET'])
+        def get_metrics():
+            """Pipeline metrics in the Prometheus text format"""
+            return Response(REGISTRY.render(), content_type=METRICS_MIME_TYPE)
+
+        @self.app.route('/api/logs', methods=['GET'])
+        def get_logs():
+            """Search persisted logs, newest first, one keyset page at a time"""
+            try:
+                since = self._parse_time(request.args.get('since'))
+                until = self._parse_time(request.args.get('until'))
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            limit = min(max(request.args.get('limit', default=100, type=int), 1), 1000)
+            logs = self.db.search_logs(
+                level=request.args.get('level'),
+                since=since,
+                until=until,
+                text_query=request.args.get('q'),
+                before_id=request.args.get('before', type=int),
+                limit=limit
+            )
             return jsonify({
                 'status': 'success',
-                'services': services,
-                'timestamp': datetime.utcnow().isoformat()
+                'count': len(logs),
+                'logs': logs,
+                'next_before': logs[-1]['id'] if len(logs) == limit else None
+            })
+
+    @staticmethod
+    def _webhook_fields(data, partial):
+        """Validated subscription fields from a request body; raises ValueError"""
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        fields = {}
+        if 'name' in data or not partial:
+            if not isinstance(data.get('name'), str) or not data['name'].strip():
+                raise ValueError('name is required')
+            fields['name'] = data['name'].strip()
+        if 'url' in data or not partial:
+            url = urlsplit(data.get('url') or '')
+            if url.scheme not in ('http', 'https') or not url.netloc:
+                raise ValueError('url must be an http(s) URL')
+            fields['url'] = data['url']
+        if 'event_types' in data:
+            event_types = data['event_types'] or []
+            if not isinstance(event_types, list) or set(event_types) - set(EVENT_TYPES):
+                raise ValueError(f"event_types must be a list of {', '.join(EVENT_TYPES)}")
+            fields['event_types'] = event_types
+        if 'device_id' in data:
+            if data['device_id'] is not None and not isinstance(data['device_id'], int):
+                raise ValueError('device_id must be an integer or null')
+            fields['device_id'] = data['device_id']
+        if 'secret' in data:
+            fields['secret'] = data['secret'] or None
+        if 'max_concurrency' in data:
+            if not isinstance(data['max_concurrency'], int) or not 1 <= data['max_concurrency'] <= 16:
+                raise ValueError('max_concurrency must be between 1 and 16')
+            fields['max_concurrency'] = data['max_concurrency']
+        if 'enabled' in data and partial:
+            fields['enabled'] = bool(data['enabled'])
+        return fields
+
+    def _webhook_stats(self):
+        service = self.service_manager.get_service('webhooks') if self.service_manager else None
+        return service.stats() if service else {}
+
+    def _webhooks_changed(self):
+        if self.service_manager:
+            self.service_manager.events.publish('webhooks_changed')
+
+    def _admin_only(self, view):
+        """
+        Restrict a route to local callers and to API keys configured with
+        ``'admin': True``
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('X-API-Key')
+            limits = self.config.get('api_keys') or {}
+            if request.remote_addr not in _LOOPBACK and not (key in limits and limits[key].get('admin')):
+                return jsonify({'status': 'error', 'message': 'Admin access required'}), 403
+            return view(*args, **kwargs)
+        return wrapper
+
+    def _sse_response(self, device_id):
+        """Build a streaming response subscribed to the broadcaster"""
+        broadcaster = self.broadcaster
+        if broadcaster.subscriber_count >= broadcaster.max_subscribers:
+            return jsonify({'status': 'error', 'message': 'Too many stream subscribers'}), 503
+
+        initial = b'retry: 2000\n\n' + (broadcaster.latest_frame(device_id) or b'')
+        detach = request.environ.get('weighbridge.detach')
+        if detach:
+            # Pooled server: once the headers and first frame are out, the
+            # socket moves to the broadcaster thread and frees this worker
+            def stream():
+                yield initial
+                sock = detach()
+                if not broadcaster.add_socket(sock, device_id):
+                    sock.close()
+        else:
+            subscriber = broadcaster.subscribe_queue(device_id)
+            if subscriber is None:
+                return jsonify({'status': 'error', 'message': 'Too many stream subscribers'}), 503
+
+            def stream():
+                try:
+                    yield initial
+                    yield from subscriber
+                finally:
+                    broadcaster.unsubscribe_queue(subscriber)
+
+        return Response(stream(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    def _encode_sse(self, sample):
+        if self.broadcaster.subscriber_count:
+            # The frame goes out to subscribers as soon as it is encoded
+            TRACER.mark(sample.seq, SERVED)
+        data = json.dumps(sample.to_dict(), separators=(',', ':'))
+        return f'id: {sample.seq}\nevent: weight\ndata: {data}\n\n'.encode('utf-8')
+
+    def _on_sample(self, sample):
+        self.broadcaster.publish(sample, key=sample.device_id)
+        if sample.is_stable:
+            # The cached /api/weight body is checked against the stable
+            # reading's ETag on every hit, so it needs no invalidation here
+            with self._stable_changed:
+                self._stable_changed.notify_all()
+
+    def _on_service_state(self, change):
+        self.cache.invalidate(('status', None))
+
+    def _weight_body(self, version, sample, etag):
+        """Encoded /api/weight body for a sample, from the cache when current"""
+        key = ('weight', None)
+        entry = self.cache.get(key)
+        if entry is None or entry.etag != etag:
+            generation = self.cache.generation(key)
+            body = self._encode_json({
+                'status': 'success',
+                'timestamp': datetime.utcfromtimestamp(sample.timestamp).isoformat(),
+                'weight_kg': sample.weight_kg,
+                'seq': sample.seq,
+                'version': version
             })
+            entry = self.cache.put(key, generation, body, etag)
+        return entry.body
+
+    @staticmethod
+    def _encode_json(payload):
+        return json.dumps(payload, separators=(',', ':')).encode('utf-8') + b'\n'
+
+    def _wait_for_stable(self, reader, since, timeout):
+        """Wait until the stable reading's version is not ``since``; returns (version, sample)"""
+        deadline = time.monotonic() + timeout
+        with self._stable_changed:
+            while True:
+                version, sample = reader.stable_reading
+                remaining = deadline - time.monotonic()
+                if (sample is not None and version != since) or remaining <= 0 or self._stopping:
+                    return version, sample
+                self._stable_changed.wait(remaining)
+
+    @staticmethod
+    def _weight_etag(version):
+        return f'{_BOOT_ID}-{version}'
+
+    @staticmethod
+    def _version_from_etags(etags):
+        """The stable reading version in an If-None-Match tag from this process, or None"""
+        for etag in etags.as_set():
+            boot_id, _, version = etag.partition('-')
+            if boot_id == _BOOT_ID and version.isdigit():
+                return int(version)
+        return None
+
+    @staticmethod
+    def _reading_filters():
+        """Reading query filters from the request arguments"""
+        args = request.args
+        return {
+            'device_id': args.get('device', type=int),
+            'session_id': args.get('session', type=int),
+            'stable_only': args.get('stable', '').lower() in ('1', 'true', 'yes'),
+            'since': ApiService._parse_time(args.get('from')),
+            'until': ApiService._parse_time(args.get('to'))
+        }
+
+    @staticmethod
+    def _wants_binary():
+        """True when the client prefers the columnar readings format over JSON"""
+        accept = request.accept_mimetypes
+        return accept[binary_format.MIME_TYPE] > accept['application/json']
+
+    @staticmethod
+    def _encode_cursor(timestamp, reading_id):
+        token = json.dumps([timestamp, reading_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(token.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        """Opaque keyset cursor -> (timestamp, id), or None"""
+        if not cursor:
+            return None
+        try:
+            timestamp, reading_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            datetime.fromisoformat(timestamp)
+            return timestamp, int(reading_id)
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+
+    @staticmethod
+    def _ndjson_stream(pages):
+        for page in pages:
+            yield ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in page).encode('utf-8')
+
+    @staticmethod
+    def _csv_stream(pages):
+        columns = ['id', 'timestamp', 'weight_kg', 'device_id', 'is_stable', 'session_id']
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for page in pages:
+            writer.writerows([row[c] for c in columns] for row in page)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            # Header only: nothing matched
+            yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _binary_stream(pages):
+        yield binary_format.encode_header()
+        for page in pages:
+            yield binary_format.encode_block(page)
+        yield binary_format.encode_end()
+
+    EXPORT_FORMATS = {
+        'ndjson': ('application/x-ndjson', _ndjson_stream.__func__),
+        'csv': ('text/csv', _csv_stream.__func__),
+        'binary': (binary_format.MIME_TYPE, _binary_stream.__func__)
+    }
+
+    @staticmethod
+    def _gzip_stream(chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    BUCKET_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    @staticmethod
+    def _parse_bucket(value):
+        """Parse a bucket size such as '300', '5m', '1h' or '1d' into seconds"""
+        unit = ApiService.BUCKET_UNITS.get(value[-1:], None)
+        number = value[:-1] if unit else value
+        if not number.isdigit() or int(number) == 0:
+            raise ValueError(f"Invalid bucket: {value}")
+        return int(number) * (unit or 1)
+
+    @staticmethod
+    def _parse_time(value):
+        """Parse an ISO-8601 query parameter into naive UTC, or return None"""
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Invalid timestamp: {value}")
+        if parsed.tzinfo is not None:
+            # Stored timestamps are naive UTC; an offset is applied, not dropped
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    def _create_server(self):
+        """Create the HTTP server for the configured backend"""
+        if self.backend == 'werkzeug':
+            # Flask's development server: one thread per connection
+            return make_server(self.host, self.port, self.app, threaded=True)
+        if self.backend != 'pooled':
+            raise ValueError(f"Unknown API server backend: {self.backend}")
+        return PooledWSGIServer(
+            self.host, self.port, self.app,
+            workers=self.config.get('api_workers', 8),
+            max_connections=self.config.get('api_max_connections', 256),
+            request_timeout=self.config.get('api_request_timeout_s', 10.0),
+            keepalive_timeout=self.config.get('api_keepalive_s', 15.0)
+        )
+
+    def start(self):
+        """Bind the server socket, then start serving on this thread"""
+        # Binding here rather than in run() lets a busy port fail start()
+        self.server = self._create_server()
+        server = self.server
+        HTTP_CONNECTIONS.set_function(lambda: getattr(server, 'connection_count', math.nan))
+        self._stopping = False
+        self.broadcaster.start()
+        if self.service_manager:
+            self.service_manager.events.subscribe('sample', self._on_sample)
+            self.service_manager.events.subscribe('service_state', self._on_service_state)
+        super().start()
+
+    def stop(self):
+        """Stop accepting connections and let in-flight requests finish"""
+        if self.service_manager:
+            self.service_manager.events.unsubscribe('sample', self._on_sample)
+            self.service_manager.events.unsubscribe('service_state', self._on_service_state)
+        # Release held long-polls so shutdown does not wait out their timeout
+        with self._stable_changed:
+            self._stopping = True
+            self._stable_changed.notify_all()
+        if self.server:
+            self.server.shutdown()
+        self.broadcaster.stop()
+        if self.is_alive():
+            self.join(timeout=5.0)
 
     def run(self):
-        self.logger.info(f'Starting API service on {self.host}:{self.port}')
+        self.logger.info(f'Starting API service on {self.host}:{self.port} ({self.backend} server)', source='api')
         try:
-            self.app.run(
-                host=self.host,
-                port=self.port,
-                threaded=True,
-                use_reloader=False
-            )
+            self.server.serve_forever()
         except Exception as e:
-            self.logger.error(f'API service error: {str(e)}')
-            raise
\ No newline at end of file
+            self.logger.error(f'API service error: {str(e)}', source='api')
+            raise
+        finally:
+            self.logger.info('API service stopped', source='api')
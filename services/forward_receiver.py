@@ -0,0 +1,114 @@
+"""
+Stand-in for the upstream endpoint the forwarder posts to.
+
+Accepts forwarder batches, deduplicates them by ``Idempotency-Key`` and
+``event_id`` the way a well-behaved ERP endpoint should, and keeps
+counts in memory. ``--fail-rate`` answers that fraction of batches with
+503 to exercise retries. ``GET /stats`` returns the counts.
+
+Run standalone and point ``api_endpoint`` at it::
+
+    python -m services.forward_receiver --port 5200 --fail-rate 0.1
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler
+
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    # HTTP/1.1 so the forwarder's connection is kept alive between batches;
+    # buffered writes so headers and body leave in one segment instead of
+    # stalling on Nagle and the client's delayed ACK
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+
+class ForwardStore:
+    """In-memory record of the batches and events received."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batch_keys = set()
+        self.event_ids = set()
+        self.events_by_type = {}
+        self.batches = 0
+        self.duplicate_batches = 0
+        self.duplicate_events = 0
+
+    def apply(self, idempotency_key, events):
+        """Record a batch; returns the number of events not seen before"""
+        with self.lock:
+            if idempotency_key and idempotency_key in self.batch_keys:
+                self.duplicate_batches += 1
+                return 0
+            if idempotency_key:
+                self.batch_keys.add(idempotency_key)
+            self.batches += 1
+            accepted = 0
+            for event in events:
+                if event['event_id'] in self.event_ids:
+                    self.duplicate_events += 1
+                    continue
+                self.event_ids.add(event['event_id'])
+                self.events_by_type[event['type']] = self.events_by_type.get(event['type'], 0) + 1
+                accepted += 1
+            return accepted
+
+    def stats(self):
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'events': len(self.event_ids),
+                'events_by_type': dict(self.events_by_type),
+                'duplicate_batches': self.duplicate_batches,
+                'duplicate_events': self.duplicate_events
+            }
+
+
+def create_forward_receiver_app(fail_rate=0.0, path='/events'):
+    """Create the Flask app that accepts forwarded event batches."""
+    app = Flask('weighbridge_forward_receiver')
+    store = ForwardStore()
+    app.config['store'] = store
+
+    @app.route(path, methods=['POST'])
+    def post_events():
+        if fail_rate and random.random() < fail_rate:
+            return jsonify({'status': 'error', 'message': 'Simulated outage'}), 503, {'Retry-After': '1'}
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        try:
+            batch = json.loads(body)
+            accepted = store.apply(request.headers.get('Idempotency-Key'), batch['events'])
+        except (ValueError, KeyError, TypeError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        return jsonify({'status': 'success', 'accepted': accepted})
+
+    @app.route('/stats', methods=['GET'])
+    def get_stats():
+        return jsonify(store.stats())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in endpoint for the weighbridge forwarder')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--path', default='/events', help='Path to accept batches on')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of batches answered with 503')
+    args = parser.parse_args()
+    create_forward_receiver_app(args.fail_rate, args.path).run(
+        host=args.host, port=args.port, threaded=True, use_reloader=False,
+        request_handler=_KeepAliveHandler
+    )
+
+
+if __name__ == '__main__':
+    main()
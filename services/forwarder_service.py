@@ -0,0 +1,248 @@
+import gzip
+import http.client
+import json
+import socket
+import time
+import uuid
+from collections import deque
+from threading import Thread, Event
+from urllib.parse import urlsplit
+
+from core.metrics import REGISTRY
+from core.weighing import WeighingDetector
+
+EVENTS = REGISTRY.counter('forward_events_total', 'Outbox events by delivery outcome', ['result'])
+BATCH_SECONDS = REGISTRY.histogram('forward_batch_seconds', 'Round trip of one forwarded batch')
+BACKLOG = REGISTRY.gauge('forward_backlog_events', 'Events in the outbox waiting to be forwarded')
+
+# Statuses worth retrying; any other 4xx means the endpoint will never
+# accept the batch as sent
+_RETRY_STATUSES = {408, 425, 429}
+
+
+class ForwardError(Exception):
+    """Raised when the endpoint is unreachable or answers with a retryable error."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ForwardRejected(Exception):
+    """Raised when the endpoint permanently rejects a batch."""
+
+
+class ForwarderService:
+    """
+    Pushes stable weights and weighing summaries to ``api_endpoint``.
+
+    Events come from a WeighingDetector on the 'sample' stream and are
+    first written to the ``forward_outbox`` table, so nothing is lost
+    while the endpoint is down or the app restarts. A background thread posts the oldest events in
+    batches over one keep-alive connection and deletes them once the
+    endpoint acknowledges with a 2xx. Every event carries a unique
+    ``event_id`` and every batch an ``Idempotency-Key``, so a batch resent
+    after a lost response can be deduplicated upstream. Failures back off
+    exponentially, while events detected meanwhile still reach the
+    outbox; a backlog is drained back to back without waiting.
+
+    Request body::
+
+        {"site_id": "...", "events": [
+            {"event_id": "...", "type": "weight.stable", "created": 1700000000.0,
+             "device_id": null, "weight_kg": 1234.5, "timestamp": ..., "seq": 42},
+            {"event_id": "...", "type": "weighing.completed", "created": ...,
+             "device_id": null, "started": ..., "ended": ..., "duration_s": 12.5,
+             "samples": 120, "weight_kg": 1234.6, "min_kg": 1234.3, "max_kg": 1234.9}
+        ]}
+    """
+
+    def __init__(self, logger, db, config, service_manager=None):
+        self.logger = logger
+        self.db = db
+        self.config = config
+        self.service_manager = service_manager
+        self.endpoint = self.config.get('api_endpoint', '')
+        self.url = urlsplit(self.endpoint)
+        self.site_id = self.config.get('site_id') or socket.gethostname()
+        self.batch_size = self.config.get('forward_batch_size', 1000)
+        self.interval = self.config.get('forward_interval_s', 2.0)
+        self.timeout = self.config.get('forward_timeout_s', 30)
+        self.max_backoff = self.config.get('forward_max_backoff_s', 300)
+        self.compress = self.config.get('forward_gzip', False)
+        self.api_key = self.config.get('forward_api_key')
+        self.backlog = 0
+        self._conn = None
+        self._pending = deque()
+        self._detector = WeighingDetector(self.config.get('forward_min_weight_kg', 0.0))
+        self._wake = Event()
+        self._stop_event = Event()
+        self._thread = None
+
+    def start(self):
+        """Start forwarding; events are collected from now on"""
+        if self._thread and self._thread.is_alive():
+            self.logger.warning("Forwarder service is already running")
+            return
+        if self.url.scheme not in ('http', 'https') or not self.url.netloc:
+            raise ValueError(f"api_endpoint must be an http(s) URL, got '{self.endpoint}'")
+
+        self.backlog, dead = self.db.outbox_counts()
+        BACKLOG.set_function(lambda: self.backlog)
+        if self.backlog or dead:
+            self.logger.info(f"Forwarder outbox holds {self.backlog} pending and {dead} rejected events")
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name='forwarder', daemon=True)
+        self._thread.start()
+        if self.service_manager:
+            self.service_manager.events.subscribe('sample', self._on_sample)
+        self.logger.info(f"Forwarder service started -> {self.url.netloc}")
+
+    def stop(self):
+        """Stop forwarding; unsent events stay in the outbox"""
+        if self.service_manager:
+            self.service_manager.events.unsubscribe('sample', self._on_sample)
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=self.timeout + 1)
+        self._persist_pending()
+        self._close()
+        self.logger.info("Forwarder service stopped")
+
+    def is_alive(self):
+        """Check if the service is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _on_sample(self, sample):
+        """
+        Runs on the serial thread, so it only queues events for the
+        forwarder thread to persist.
+        """
+        for event_type, data in self._detector.feed(sample):
+            self._queue_event(event_type, data)
+
+    def _queue_event(self, event_type, data):
+        event_id = uuid.uuid4().hex
+        created = time.time()
+        payload = json.dumps(
+            {'event_id': event_id, 'type': event_type, 'created': created, **data},
+            separators=(',', ':')
+        )
+        self._pending.append((event_id, event_type, created, payload))
+        self._wake.set()
+
+    def _persist_pending(self):
+        events = []
+        while self._pending:
+            events.append(self._pending.popleft())
+        if events:
+            self.db.enqueue_outbox(events)
+            self.backlog += len(events)
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            try:
+                self._persist_pending()
+                sent = self._send_batch()
+                backoff = 1.0
+                if sent:
+                    continue
+                self._wake.wait(self.interval)
+                self._wake.clear()
+            except (OSError, http.client.HTTPException, ForwardError) as e:
+                delay = min(max(backoff, getattr(e, 'retry_after', None) or 0), self.max_backoff)
+                self.logger.warning(
+                    f"Forwarding to {self.url.netloc} failed, {self.backlog} events waiting, "
+                    f"retrying in {delay:.0f}s: {str(e)}"
+                )
+                self._close()
+                self._backoff(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+            except Exception as e:
+                self.logger.error(f"Forwarder error: {str(e)}", exc_info=True)
+                self._stop_event.wait(self.interval)
+
+    def _backoff(self, delay):
+        """Wait out a failure, still moving new events to the outbox as they come"""
+        deadline = time.monotonic() + delay
+        while not self._stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self._wake.wait(remaining):
+                self._wake.clear()
+                try:
+                    self._persist_pending()
+                except Exception as e:
+                    self.logger.error(f"Forwarder error: {str(e)}", exc_info=True)
+
+    def _send_batch(self):
+        """Post the oldest outbox events; returns the number acknowledged"""
+        rows = self.db.fetch_outbox(self.batch_size)
+        if not rows:
+            return 0
+        first_id, last_id = rows[0][0], rows[-1][0]
+        # Payloads are stored as JSON already; splice them in unparsed
+        body = (
+            f'{{"site_id":{json.dumps(self.site_id)},"events":['
+            + ','.join(payload for _, payload in rows)
+            + ']}'
+        ).encode('utf-8')
+        started = time.perf_counter()
+        try:
+            self._post(body, f'{self.site_id}-{first_id}-{last_id}')
+        except ForwardRejected as e:
+            self.db.fail_outbox(first_id, last_id, str(e), dead=True)
+            self.backlog -= len(rows)
+            EVENTS.labels('rejected').inc(len(rows))
+            self.logger.error(f"Endpoint rejected {len(rows)} events, kept in the outbox as dead: {str(e)}")
+            return len(rows)
+        except (OSError, http.client.HTTPException, ForwardError) as e:
+            self.db.fail_outbox(first_id, last_id, str(e))
+            EVENTS.labels('retried').inc(len(rows))
+            raise
+        BATCH_SECONDS.observe(time.perf_counter() - started)
+        acked = self.db.ack_outbox(first_id, last_id)
+        self.backlog -= acked
+        EVENTS.labels('sent').inc(acked)
+        return acked
+
+    def _post(self, body, idempotency_key):
+        if self._conn is None:
+            conn_class = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+            self._conn = conn_class(self.url.netloc, timeout=self.timeout)
+            self._conn.connect()
+            # http.client writes headers and body separately; without this
+            # Nagle holds the body back until the server's delayed ACK
+            self._conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Idempotency-Key': idempotency_key,
+            'X-Site-Id': self.site_id
+        }
+        if self.api_key:
+            headers['X-API-Key'] = self.api_key
+        if self.compress:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        path = (self.url.path or '/') + (f'?{self.url.query}' if self.url.query else '')
+        self._conn.request('POST', path, body=body, headers=headers)
+        response = self._conn.getresponse()
+        payload = response.read()
+        if response.getheader('Connection', '').lower() == 'close':
+            self._close()
+        if 200 <= response.status < 300:
+            return
+        message = f"HTTP {response.status}: {payload[:200]!r}"
+        if 400 <= response.status < 500 and response.status not in _RETRY_STATUSES:
+            raise ForwardRejected(message)
+        retry_after = response.getheader('Retry-After')
+        raise ForwardError(message, float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,179 @@
+import os
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+from threading import Thread, Event
+
+class MaintenanceService:
+    """
+    Runs SQLite housekeeping while the weighbridge is idle.
+
+    The bridge counts as idle when every sample for ``maintenance_idle_s``
+    seconds has been within ``maintenance_zero_kg`` of zero, or when the
+    local time falls inside the configured night window. Tasks run on their
+    own connection in time slices of at most ``maintenance_slice_ms``; a
+    SQLite progress handler interrupts the running statement as soon as a
+    non-zero weight arrives, so ingestion never waits on maintenance.
+    """
+
+    # task name -> default interval in seconds
+    TASK_INTERVALS = {
+        'wal_checkpoint': 300,
+        'incremental_vacuum': 3600,
+        'optimize': 6 * 3600,
+        'analyze': 24 * 3600,
+    }
+
+    def __init__(self, logger, db, config, service_manager=None):
+        self.logger = logger
+        self.db = db
+        self.config = config
+        self.service_manager = service_manager
+        self.poll_interval = self.config.get('maintenance_poll_s', 10)
+        self.idle_seconds = self.config.get('maintenance_idle_s', 60)
+        self.zero_threshold = self.config.get('maintenance_zero_kg', 20.0)
+        self.slice_seconds = self.config.get('maintenance_slice_ms', 200) / 1000.0
+        self.night_hours = self.config.get('maintenance_night_hours', (22, 5))
+        self.intervals = dict(self.TASK_INTERVALS, **self.config.get('maintenance_intervals', {}))
+        self.history = deque(maxlen=200)
+        self._last_run = {}
+        self._last_load = time.monotonic()
+        self._busy = Event()
+        self._stop_event = Event()
+        self._thread = None
+
+    def start(self):
+        """Start the maintenance scheduler"""
+        if self._thread and self._thread.is_alive():
+            self.logger.warning("Maintenance service is already running")
+            return
+
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name='db-maintenance', daemon=True)
+        self._thread.start()
+        if self.service_manager:
+            self.service_manager.events.subscribe('sample', self._on_sample)
+        self.logger.info("Maintenance service started")
+
+    def stop(self):
+        """Stop the scheduler, interrupting any task in progress"""
+        if self.service_manager:
+            self.service_manager.events.unsubscribe('sample', self._on_sample)
+        self._stop_event.set()
+        self._busy.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self.logger.info("Maintenance service stopped")
+
+    def is_alive(self):
+        """Check if the service is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_history(self):
+        """Return recent task runs, newest last"""
+        return list(self.history)
+
+    def _on_sample(self, sample):
+        if abs(sample.weight_kg) > self.zero_threshold:
+            self._last_load = time.monotonic()
+            self._busy.set()
+
+    def _is_idle(self):
+        if self._stop_event.is_set():
+            return False
+        if time.monotonic() - self._last_load >= self.idle_seconds:
+            return True
+        start, end = self.night_hours
+        hour = datetime.now().hour
+        in_night = start <= hour < end if start < end else (hour >= start or hour < end)
+        return in_night and not self._busy.is_set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self._busy.clear()
+            if not self._is_idle():
+                continue
+            now = time.monotonic()
+            for task, interval in self.intervals.items():
+                if now - self._last_run.get(task, -interval) < interval:
+                    continue
+                if not self._is_idle():
+                    break
+                self._run_task(task)
+
+    def _run_task(self, task):
+        started = time.monotonic()
+        conn = sqlite3.connect(self.db.path, timeout=self.slice_seconds, isolation_level=None)
+        outcome, freed = 'done', 0
+        try:
+            deadline = [started + self.slice_seconds]
+
+            def should_abort():
+                return self._busy.is_set() or time.monotonic() > deadline[0]
+
+            conn.set_progress_handler(lambda: 1 if should_abort() else 0, 1000)
+            freed = getattr(self, f'_task_{task}')(conn, deadline, should_abort)
+            if self._busy.is_set():
+                outcome = 'yielded'
+        except sqlite3.OperationalError as e:
+            # "interrupted" when the progress handler stopped us, "locked"
+            # when the writer held the database for the whole slice
+            outcome = 'yielded' if self._busy.is_set() or 'interrupt' in str(e) else f'error: {e}'
+        finally:
+            conn.close()
+
+        duration = time.monotonic() - started
+        if outcome == 'done':
+            self._last_run[task] = time.monotonic()
+        self.history.append({
+            'task': task,
+            'started': time.time() - duration,
+            'duration_s': round(duration, 4),
+            'freed_bytes': freed,
+            'outcome': outcome
+        })
+        self.logger.info(f"Maintenance {task}: {outcome} in {duration * 1000:.0f} ms, freed {freed} bytes")
+
+    def _begin_slice(self, deadline):
+        deadline[0] = time.monotonic() + self.slice_seconds
+
+    def _task_wal_checkpoint(self, conn, deadline, should_abort):
+        wal_path = self.db.path + '-wal'
+        before = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        self._begin_slice(deadline)
+        busy, frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        if not busy and frames == checkpointed and not should_abort():
+            # Everything is in the main file; shrink the WAL back to zero
+            self._begin_slice(deadline)
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        after = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        return max(before - after, 0)
+
+    def _task_incremental_vacuum(self, conn, deadline, should_abort):
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # Only databases created with auto_vacuum=INCREMENTAL support it
+            return 0
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        initial = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        free = initial
+        while free and not self._busy.is_set():
+            self._begin_slice(deadline)
+            # The pragma frees one page per VM step; executescript steps it
+            # to completion where execute() would stop after the first page
+            conn.executescript(f'PRAGMA incremental_vacuum({min(free, 256)});')
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return (initial - free) * page_size
+
+    def _task_optimize(self, conn, deadline, should_abort):
+        self._begin_slice(deadline)
+        conn.execute('PRAGMA optimize')
+        return 0
+
+    def _task_analyze(self, conn, deadline, should_abort):
+        # analysis_limit makes ANALYZE sample each index instead of scanning
+        # whole tables, which keeps it inside one slice on large databases
+        conn.execute('PRAGMA analysis_limit=1000')
+        self._begin_slice(deadline)
+        conn.execute('ANALYZE')
+        return 0
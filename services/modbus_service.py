@@ -0,0 +1,302 @@
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from core.metrics import REGISTRY
+
+REQUESTS = REGISTRY.counter('modbus_requests_total', 'Modbus requests by function code and outcome', ['function', 'result'])
+CLIENTS = REGISTRY.gauge('modbus_clients', 'Connected Modbus TCP masters')
+
+# Function codes
+READ_COILS = 0x01
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+WRITE_SINGLE_COIL = 0x05
+WRITE_MULTIPLE_COILS = 0x0F
+
+# Exception codes
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+SERVER_DEVICE_FAILURE = 0x04
+GATEWAY_TARGET_FAILED = 0x0B
+
+# Register map, identical for holding and input registers. 32-bit values
+# are big-endian, high word at the lower address.
+REG_WEIGHT_FLOAT = 0    # 0-1  weight in kg, IEEE 754 float32
+REG_WEIGHT_INT = 2      # 2-3  weight * modbus_weight_scale, signed int32
+REG_STATUS = 4          # 4    status bits, see STATUS_*
+REG_STABLE = 5          # 5    1 when stable, else 0
+REG_SEQ = 6             # 6-7  sample sequence number, uint32 (wraps)
+REG_TIMESTAMP = 8       # 8-9  sample time, epoch seconds uint32
+REGISTER_COUNT = 10
+
+STATUS_VALID = 0x0001   # a sample has been received for this unit
+STATUS_STABLE = 0x0002
+STATUS_FRESH = 0x0004   # the sample is younger than modbus_stale_s
+STATUS_NEGATIVE = 0x0008
+
+# Coils: writing 1 sends the command to the scale; they always read 0
+COIL_COMMANDS = ('tare', 'zero')
+
+_MBAP = struct.Struct('>HHHB')
+_BLOCK = struct.Struct('>fiHHII')
+
+
+class ModbusError(Exception):
+    """Raised while handling a request; answered as a Modbus exception response."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class _ModbusHandler(socketserver.BaseRequestHandler):
+    """Serves one master connection until it closes or goes idle."""
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.request.settimeout(self.server.service.idle_timeout)
+
+    def handle(self):
+        service = self.server.service
+        with service._lock:
+            if len(service._connections) >= service.max_clients:
+                service.logger.warning(f"Modbus server full, refused {self.client_address[0]}")
+                return
+            service._connections.add(self.request)
+        try:
+            self._serve(service)
+        except OSError:
+            # Timed out, reset by the master, or shut down by stop()
+            pass
+        finally:
+            with service._lock:
+                service._connections.discard(self.request)
+
+    def _serve(self, service):
+        sock = self.request
+        while True:
+            header = self._recv_exactly(sock, _MBAP.size)
+            if header is None:
+                return
+            transaction, protocol, length, unit = _MBAP.unpack(header)
+            if protocol != 0 or not 2 <= length <= 254:
+                # Not Modbus, or framing lost: nothing sensible to answer
+                return
+            pdu = self._recv_exactly(sock, length - 1)
+            if pdu is None:
+                return
+            response = service.handle_pdu(unit, pdu)
+            sock.sendall(_MBAP.pack(transaction, 0, len(response) + 1, unit) + response)
+
+    @staticmethod
+    def _recv_exactly(sock, size):
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+
+class _ModbusServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, _ModbusHandler)
+
+
+class ModbusService:
+    """
+    Modbus TCP slave exposing the live weight of each device.
+
+    Every sample is packed into its register block once, on the
+    acquisition thread, and stored per unit id; reads copy a slice of that
+    block and never touch the DB, so many masters can poll at 10 Hz. Each
+    master gets its own thread.
+
+    The unit id selects the device: samples without a device id are served
+    on ``modbus_unit_id`` (also on 0 and 255, the usual Modbus TCP
+    wildcards), others on their device id. Unknown units answer with
+    exception 0x0B. Registers are read with function 3 or 4 (same map, see
+    ``REG_*``); coils 0 (tare) and 1 (zero) are written with function 5 or
+    15 and forward the command to the serial service.
+    """
+
+    def __init__(self, logger, db, config, service_manager=None, host=None, port=None):
+        self.logger = logger
+        self.db = db
+        self.config = config
+        self.service_manager = service_manager
+        self.host = host or self.config.get('modbus_host', '0.0.0.0')
+        self.port = port or self.config.get('modbus_port', 5020)
+        self.unit_id = self.config.get('modbus_unit_id', 1)
+        self.weight_scale = self.config.get('modbus_weight_scale', 10)
+        self.stale_after = self.config.get('modbus_stale_s', 5.0)
+        self.max_clients = self.config.get('modbus_max_clients', 64)
+        self.idle_timeout = self.config.get('modbus_idle_timeout_s', 60.0)
+        # unit id -> (packed register block, monotonic receive time); the
+        # dict is replaced, never mutated, so readers need no lock
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Bind the port and start serving masters"""
+        if self._thread and self._thread.is_alive():
+            self.logger.warning("Modbus service is already running")
+            return
+        self._server = _ModbusServer((self.host, self.port), self)
+        CLIENTS.set_function(lambda: len(self._connections))
+        self._thread = threading.Thread(target=self._server.serve_forever, name='modbus', daemon=True)
+        self._thread.start()
+        if self.service_manager:
+            self.service_manager.events.subscribe('sample', self._on_sample)
+        self.logger.info(f"Modbus TCP server listening on {self.host}:{self.port}")
+
+    def stop(self):
+        """Stop serving and disconnect all masters"""
+        if self.service_manager:
+            self.service_manager.events.unsubscribe('sample', self._on_sample)
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            connections = list(self._connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self.logger.info("Modbus TCP server stopped")
+
+    def is_alive(self):
+        """Check if the service is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _on_sample(self, sample):
+        unit = self.unit_id if sample.device_id is None else sample.device_id
+        status = STATUS_VALID
+        if sample.is_stable:
+            status |= STATUS_STABLE
+        if sample.weight_kg < 0:
+            status |= STATUS_NEGATIVE
+        scaled = max(-2 ** 31, min(2 ** 31 - 1, round(sample.weight_kg * self.weight_scale)))
+        block = _BLOCK.pack(
+            sample.weight_kg, scaled, status, 1 if sample.is_stable else 0,
+            sample.seq & 0xFFFFFFFF, int(sample.timestamp) & 0xFFFFFFFF
+        )
+        blocks = dict(self._blocks)
+        blocks[unit] = (block, time.monotonic())
+        self._blocks = blocks
+
+    def handle_pdu(self, unit, pdu):
+        """
+        Answer one request PDU.
+
+        Args:
+            unit: Unit id from the MBAP header
+            pdu: Function code followed by its data
+
+        Returns:
+            Response PDU bytes, possibly an exception response
+        """
+        function = pdu[0]
+        try:
+            if function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+                response = self._read_registers(unit, function, pdu)
+            elif function == READ_COILS:
+                response = self._read_coils(unit, pdu)
+            elif function in (WRITE_SINGLE_COIL, WRITE_MULTIPLE_COILS):
+                response = self._write_coils(unit, function, pdu)
+            else:
+                raise ModbusError(ILLEGAL_FUNCTION)
+        except ModbusError as e:
+            REQUESTS.labels(str(function), 'exception').inc()
+            return bytes((function | 0x80, e.code))
+        REQUESTS.labels(str(function), 'ok').inc()
+        return response
+
+    def _entry(self, unit):
+        if unit in (0, 255):
+            unit = self.unit_id
+        blocks = self._blocks
+        if unit in blocks:
+            return blocks[unit]
+        if unit == self.unit_id:
+            # The default scale before its first sample: all zero, not valid
+            return None
+        raise ModbusError(GATEWAY_TARGET_FAILED)
+
+    @staticmethod
+    def _address_range(pdu, max_quantity, limit):
+        if len(pdu) < 5:
+            raise ModbusError(ILLEGAL_DATA_VALUE)
+        address, quantity = struct.unpack_from('>HH', pdu, 1)
+        if not 1 <= quantity <= max_quantity:
+            raise ModbusError(ILLEGAL_DATA_VALUE)
+        if address + quantity > limit:
+            raise ModbusError(ILLEGAL_DATA_ADDRESS)
+        return address, quantity
+
+    def _read_registers(self, unit, function, pdu):
+        address, quantity = self._address_range(pdu, 125, REGISTER_COUNT)
+        entry = self._entry(unit)
+        if entry is None:
+            block = bytes(REGISTER_COUNT * 2)
+        else:
+            block, received = entry
+            if time.monotonic() - received < self.stale_after:
+                status = struct.unpack_from('>H', block, REG_STATUS * 2)[0] | STATUS_FRESH
+                block = block[:REG_STATUS * 2] + struct.pack('>H', status) + block[REG_STATUS * 2 + 2:]
+        data = block[address * 2:(address + quantity) * 2]
+        return bytes((function, len(data))) + data
+
+    def _read_coils(self, unit, pdu):
+        _, quantity = self._address_range(pdu, 2000, len(COIL_COMMANDS))
+        self._entry(unit)
+        return bytes((READ_COILS, (quantity + 7) // 8)) + bytes((quantity + 7) // 8)
+
+    def _write_coils(self, unit, function, pdu):
+        self._entry(unit)
+        if function == WRITE_SINGLE_COIL:
+            if len(pdu) != 5:
+                raise ModbusError(ILLEGAL_DATA_VALUE)
+            address, value = struct.unpack_from('>HH', pdu, 1)
+            if value not in (0x0000, 0xFF00):
+                raise ModbusError(ILLEGAL_DATA_VALUE)
+            if address >= len(COIL_COMMANDS):
+                raise ModbusError(ILLEGAL_DATA_ADDRESS)
+            if value:
+                self._send_command(COIL_COMMANDS[address])
+            # The normal response echoes the request
+            return pdu
+        address, quantity = self._address_range(pdu, 1968, len(COIL_COMMANDS))
+        if len(pdu) < 6 or pdu[5] != (quantity + 7) // 8 or len(pdu) != 6 + pdu[5]:
+            raise ModbusError(ILLEGAL_DATA_VALUE)
+        values = int.from_bytes(pdu[6:], 'little')
+        for i in range(quantity):
+            if values >> i & 1:
+                self._send_command(COIL_COMMANDS[address + i])
+        return pdu[:5]
+
+    def _send_command(self, command):
+        serial_service = self.service_manager.get_service('serial') if self.service_manager else None
+        try:
+            if serial_service is None:
+                raise RuntimeError("serial service is not running")
+            serial_service.send_command(command)
+        except (RuntimeError, ValueError, OSError) as e:
+            self.logger.warning(f"Modbus {command} request failed: {str(e)}")
+            raise ModbusError(SERVER_DEVICE_FAILURE) from e
@@ -0,0 +1,160 @@
+"""
+Stand-in MQTT broker for trying the MQTT publisher without a real one.
+
+Speaks the subset of MQTT 3.1.1 in ``core.mqtt``: accepts connections,
+acknowledges QoS 1 publishes, keeps retained messages and forwards
+publishes to matching subscribers at QoS 0. ``--disconnect-rate`` drops
+that fraction of connections on a publish, before acknowledging it, to
+exercise reconnects and resends. Counts are printed on exit.
+
+Run standalone and point ``mqtt_host``/``mqtt_port`` at it::
+
+    python -m services.mqtt_broker --port 1883 --disconnect-rate 0.01
+
+and watch the traffic with any MQTT client subscribed to ``weighbridge/#``.
+"""
+import argparse
+import random
+import socket
+import socketserver
+import threading
+
+from core import mqtt
+
+
+class BrokerState:
+    """Retained messages, subscriptions and counters shared by all connections."""
+
+    def __init__(self, disconnect_rate=0.0):
+        self.disconnect_rate = disconnect_rate
+        self.lock = threading.Lock()
+        self.retained = {}
+        self.subscriptions = {}
+        self.publishes = 0
+        self.duplicates = 0
+        self.publishes_by_topic = {}
+
+    def publish(self, sender, topic, payload, retain, dup):
+        with self.lock:
+            self.publishes += 1
+            if dup:
+                self.duplicates += 1
+            self.publishes_by_topic[topic] = self.publishes_by_topic.get(topic, 0) + 1
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            targets = [
+                handler for handler, filters in self.subscriptions.items()
+                if handler is not sender and any(mqtt.topic_matches(f, topic) for f in filters)
+            ]
+        packet = mqtt.encode_publish(topic, payload)
+        for handler in targets:
+            handler.send(packet)
+
+    def subscribe(self, handler, filters):
+        with self.lock:
+            self.subscriptions.setdefault(handler, set()).update(filters)
+            return [
+                mqtt.encode_publish(topic, payload, retain=True)
+                for topic, payload in self.retained.items()
+                if any(mqtt.topic_matches(f, topic) for f in filters)
+            ]
+
+    def remove(self, handler):
+        with self.lock:
+            self.subscriptions.pop(handler, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'publishes': self.publishes,
+                'duplicates': self.duplicates,
+                'retained': len(self.retained),
+                'by_topic': dict(self.publishes_by_topic)
+            }
+
+
+class _BrokerHandler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send_lock = threading.Lock()
+
+    def send(self, data):
+        with self.send_lock:
+            try:
+                self.request.sendall(data)
+            except OSError:
+                pass
+
+    def handle(self):
+        state = self.server.state
+        reader = mqtt.PacketReader()
+        connected = False
+        try:
+            while True:
+                data = self.request.recv(65536)
+                if not data:
+                    return
+                replies = []
+                for packet_type, flags, body in reader.feed(data):
+                    if packet_type == mqtt.CONNECT:
+                        mqtt.decode_connect(body)
+                        connected = True
+                        replies.append(mqtt.encode_connack(0))
+                    elif not connected:
+                        return
+                    elif packet_type == mqtt.PUBLISH:
+                        topic, payload, qos, retain, packet_id = mqtt.decode_publish(flags, body)
+                        if state.disconnect_rate and random.random() < state.disconnect_rate:
+                            return
+                        state.publish(self, topic, payload, retain, bool(flags & 0x08))
+                        if qos:
+                            replies.append(mqtt.encode_puback(packet_id))
+                    elif packet_type == mqtt.SUBSCRIBE:
+                        packet_id, topics = mqtt.decode_subscribe(body)
+                        retained = state.subscribe(self, [topic for topic, _ in topics])
+                        replies.append(mqtt.encode_suback(packet_id, [0] * len(topics)))
+                        replies.extend(retained)
+                    elif packet_type == mqtt.PINGREQ:
+                        replies.append(mqtt.PINGRESP_PACKET)
+                    elif packet_type == mqtt.DISCONNECT:
+                        return
+                if replies:
+                    self.send(b''.join(replies))
+        except (OSError, mqtt.MqttProtocolError):
+            pass
+        finally:
+            state.remove(self)
+
+
+class MqttBroker(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, disconnect_rate=0.0):
+        self.state = BrokerState(disconnect_rate)
+        super().__init__(address, _BrokerHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in MQTT broker for the weighbridge publisher')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='Fraction of publishes that drop the connection instead of being acknowledged')
+    args = parser.parse_args()
+    broker = MqttBroker((args.host, args.port), args.disconnect_rate)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.server_close()
+        print(broker.state.stats())
+
+
+if __name__ == '__main__':
+    main()
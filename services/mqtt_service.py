@@ -0,0 +1,327 @@
+import json
+import select
+import socket
+import time
+from collections import OrderedDict, deque
+from threading import Thread, Event
+
+from core import mqtt
+from core.metrics import REGISTRY
+from core.weighing import WeighingDetector
+
+MESSAGES = REGISTRY.counter('mqtt_messages_total', 'MQTT messages by outcome', ['result'])
+CONNECTED = REGISTRY.gauge('mqtt_connected', '1 while connected to the MQTT broker')
+IN_FLIGHT = REGISTRY.gauge('mqtt_inflight_messages', 'QoS 1 messages sent and not yet acknowledged')
+BUFFERED = REGISTRY.gauge('mqtt_buffered_messages', 'MQTT messages waiting to be sent')
+
+
+class MqttConnectError(Exception):
+    """Raised when the broker refuses or does not answer the CONNECT."""
+
+
+class MqttService:
+    """
+    Publishes weights and weighing events to an MQTT broker.
+
+    Three kinds of message, with topics given as templates where
+    ``{device}`` is the device id (or 'default') and ``{event}`` the event
+    type:
+
+    - ``mqtt_topic_weight``: the latest sample per device as JSON,
+      retained, so a new subscriber sees the current weight at once.
+    - ``mqtt_topic_samples``: every sample of the last
+      ``mqtt_batch_interval_s`` in one message, as
+      ``{"device_id": ..., "samples": [[seq, timestamp, weight_kg, stable], ...]}``.
+    - ``mqtt_topic_events``: 'weight.stable' and 'weighing.completed'
+      events from a WeighingDetector, sent as soon as they happen.
+
+    The acquisition thread only appends the sample to a deque and runs the
+    detector; encoding and all network I/O happen on the publisher thread,
+    over one persistent connection. Messages are sent with ``mqtt_qos``
+    (0 or 1); at most ``mqtt_max_inflight`` QoS 1 messages are
+    unacknowledged at a time. While the broker is unreachable messages
+    wait in memory, up to ``mqtt_buffer_size`` (oldest dropped first; for
+    the retained weight only the newest is kept), and unacknowledged ones
+    are sent again after reconnecting.
+    """
+
+    def __init__(self, logger, db, config, service_manager=None):
+        self.logger = logger
+        self.db = db
+        self.config = config
+        self.service_manager = service_manager
+        self.host = self.config.get('mqtt_host', 'localhost')
+        self.port = self.config.get('mqtt_port', 1883)
+        self.client_id = self.config.get('mqtt_client_id') or f'weighbridge-{socket.gethostname()}'
+        self.username = self.config.get('mqtt_username')
+        self.password = self.config.get('mqtt_password')
+        self.keepalive = self.config.get('mqtt_keepalive_s', 30)
+        self.qos = self.config.get('mqtt_qos', 1)
+        self.max_inflight = self.config.get('mqtt_max_inflight', 20)
+        self.buffer_size = self.config.get('mqtt_buffer_size', 10000)
+        self.batch_interval = self.config.get('mqtt_batch_interval_s', 1.0)
+        self.max_backoff = self.config.get('mqtt_max_backoff_s', 60)
+        self.topic_weight = self.config.get('mqtt_topic_weight', 'weighbridge/{device}/weight')
+        self.topic_samples = self.config.get('mqtt_topic_samples', 'weighbridge/{device}/samples')
+        self.topic_events = self.config.get('mqtt_topic_events', 'weighbridge/{device}/events/{event}')
+        self.detector = WeighingDetector(self.config.get('mqtt_min_weight_kg', 0.0))
+        self.connected = False
+        self._samples = deque()
+        self._events = deque()
+        # Messages are (topic, payload, retain, dup). Retained weights wait in a
+        # dict by topic so only the newest per device is ever sent
+        self._retained = {}
+        self._outbox = deque()
+        self._inflight = OrderedDict()
+        self._next_packet_id = 0
+        self._sock = None
+        self._reader = None
+        self._last_sent = 0.0
+        self._last_received = 0.0
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._stop_event = Event()
+        self._thread = None
+
+    def start(self):
+        """Start publishing; connects in the background"""
+        if self._thread and self._thread.is_alive():
+            self.logger.warning("MQTT service is already running")
+            return
+        if self.qos not in (0, 1):
+            raise ValueError(f"mqtt_qos must be 0 or 1, got {self.qos}")
+        # Fail on a bad template now rather than on the first sample
+        for template in (self.topic_weight, self.topic_samples, self.topic_events):
+            template.format(device='default', event='weight.stable')
+
+        CONNECTED.set_function(lambda: 1 if self.connected else 0)
+        IN_FLIGHT.set_function(lambda: len(self._inflight))
+        BUFFERED.set_function(lambda: len(self._outbox) + len(self._retained))
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name='mqtt', daemon=True)
+        self._thread.start()
+        if self.service_manager:
+            self.service_manager.events.subscribe('sample', self._on_sample)
+        self.logger.info(f"MQTT service started -> {self.host}:{self.port}")
+
+    def stop(self):
+        """Disconnect cleanly; messages not yet sent are discarded"""
+        if self.service_manager:
+            self.service_manager.events.unsubscribe('sample', self._on_sample)
+        self._stop_event.set()
+        self._wake()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        if self._sock is not None:
+            try:
+                self._sock.sendall(mqtt.DISCONNECT_PACKET)
+            except OSError:
+                pass
+            self._close()
+        self._wake_r.close()
+        self._wake_w.close()
+        self.logger.info("MQTT service stopped")
+
+    def is_alive(self):
+        """Check if the service is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _on_sample(self, sample):
+        """Runs on the serial thread: queue only, no encoding or I/O"""
+        self._samples.append(sample)
+        events = self.detector.feed(sample)
+        if events:
+            self._events.extend(events)
+            self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        backoff = 1.0
+        retry_at = 0.0
+        next_batch = time.monotonic() + self.batch_interval
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            self._collect_events()
+            if now >= next_batch:
+                self._collect_samples()
+                next_batch = now + self.batch_interval
+            if self._sock is None and now >= retry_at:
+                try:
+                    self._connect()
+                    backoff = 1.0
+                except (OSError, mqtt.MqttProtocolError, MqttConnectError) as e:
+                    self.logger.warning(
+                        f"MQTT connect to {self.host}:{self.port} failed, "
+                        f"{len(self._outbox)} messages buffered, retrying in {backoff:.0f}s: {str(e)}"
+                    )
+                    retry_at = now + backoff
+                    backoff = min(backoff * 2, self.max_backoff)
+            timeout = max(0.0, next_batch - time.monotonic())
+            if self._sock is None:
+                timeout = min(timeout, max(0.0, retry_at - time.monotonic()))
+                self._wait([self._wake_r], timeout)
+                continue
+            try:
+                self._send_pending()
+                if self.keepalive:
+                    timeout = min(timeout, self.keepalive / 2)
+                readable = self._wait([self._sock, self._wake_r], timeout)
+                if self._sock in readable:
+                    self._receive()
+                self._check_keepalive()
+            except (OSError, mqtt.MqttProtocolError) as e:
+                self.logger.warning(f"MQTT connection to {self.host}:{self.port} lost: {str(e)}")
+                self._close()
+                retry_at = time.monotonic() + backoff
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _wait(self, sockets, timeout):
+        readable, _, _ = select.select(sockets, [], [], timeout)
+        if self._wake_r in readable:
+            try:
+                while self._wake_r.recv(4096):
+                    pass
+            except (BlockingIOError, InterruptedError):
+                pass
+        return readable
+
+    def _collect_events(self):
+        while self._events:
+            event_type, data = self._events.popleft()
+            topic = self.topic_events.format(device=self._device(data['device_id']), event=event_type)
+            payload = json.dumps({'type': event_type, **data}, separators=(',', ':')).encode('utf-8')
+            self._enqueue(topic, payload)
+
+    def _collect_samples(self):
+        batches = {}
+        latest = {}
+        while self._samples:
+            sample = self._samples.popleft()
+            batches.setdefault(sample.device_id, []).append(
+                [sample.seq, sample.timestamp, sample.weight_kg, sample.is_stable]
+            )
+            latest[sample.device_id] = sample
+        for device_id, sample in latest.items():
+            topic = self.topic_weight.format(device=self._device(device_id), event='')
+            self._retained[topic] = json.dumps(sample.to_dict(), separators=(',', ':')).encode('utf-8')
+        if not self.topic_samples:
+            return
+        for device_id, rows in batches.items():
+            topic = self.topic_samples.format(device=self._device(device_id), event='')
+            payload = json.dumps({'device_id': device_id, 'samples': rows}, separators=(',', ':'))
+            self._enqueue(topic, payload.encode('utf-8'))
+
+    @staticmethod
+    def _device(device_id):
+        return 'default' if device_id is None else str(device_id)
+
+    def _enqueue(self, topic, payload):
+        if len(self._outbox) >= self.buffer_size:
+            self._outbox.popleft()
+            MESSAGES.labels('dropped').inc()
+        self._outbox.append((topic, payload, False, False))
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=10)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall(mqtt.encode_connect(
+                self.client_id, self.keepalive, clean_session=True,
+                username=self.username, password=self.password
+            ))
+            reader = mqtt.PacketReader()
+            packets = []
+            while not packets:
+                data = sock.recv(4096)
+                if not data:
+                    raise MqttConnectError("Connection closed before CONNACK")
+                packets = reader.feed(data)
+            packet_type, _, body = packets[0]
+            if packet_type != mqtt.CONNACK or len(body) != 2:
+                raise MqttConnectError(f"Expected CONNACK, got packet type {packet_type}")
+            if body[1] != 0:
+                raise MqttConnectError(f"Refused: {mqtt.CONNACK_MESSAGES.get(body[1], body[1])}")
+        except BaseException:
+            sock.close()
+            raise
+        self._sock = sock
+        self._reader = reader
+        self._last_sent = self._last_received = time.monotonic()
+        self.connected = True
+        self.logger.info(f"Connected to MQTT broker {self.host}:{self.port}")
+
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self.connected = False
+        # Clean session: the broker forgets unacknowledged messages, so
+        # they go back to the front of the queue to be sent again
+        for topic, payload, retain, _ in reversed(list(self._inflight.values())):
+            if retain:
+                # A newer weight may have been collected meanwhile
+                self._retained.setdefault(topic, payload)
+            else:
+                self._outbox.appendleft((topic, payload, retain, True))
+        self._inflight.clear()
+
+    def _take_message(self):
+        if self._retained:
+            topic = next(iter(self._retained))
+            return topic, self._retained.pop(topic), True, False
+        if self._outbox:
+            return self._outbox.popleft()
+        return None
+
+    def _send_pending(self):
+        packets = []
+        while self.qos == 0 or len(self._inflight) < self.max_inflight:
+            message = self._take_message()
+            if message is None:
+                break
+            topic, payload, retain, dup = message
+            if self.qos:
+                packet_id = self._allocate_packet_id()
+                self._inflight[packet_id] = message
+                packets.append(mqtt.encode_publish(topic, payload, 1, retain, packet_id, dup))
+            else:
+                packets.append(mqtt.encode_publish(topic, payload, 0, retain))
+        if packets:
+            # One write for the whole window rather than a segment each
+            self._sock.sendall(b''.join(packets))
+            self._last_sent = time.monotonic()
+            MESSAGES.labels('sent').inc(len(packets))
+
+    def _allocate_packet_id(self):
+        while True:
+            self._next_packet_id = self._next_packet_id % 65535 + 1
+            if self._next_packet_id not in self._inflight:
+                return self._next_packet_id
+
+    def _receive(self):
+        data = self._sock.recv(65536)
+        if not data:
+            raise ConnectionError("Broker closed the connection")
+        self._last_received = time.monotonic()
+        for packet_type, _, body in self._reader.feed(data):
+            if packet_type == mqtt.PUBACK:
+                if self._inflight.pop(mqtt.decode_packet_id(body), None) is not None:
+                    MESSAGES.labels('acked').inc()
+            elif packet_type != mqtt.PINGRESP:
+                self.logger.debug(f"Ignoring MQTT packet type {packet_type}")
+
+    def _check_keepalive(self):
+        if not self.keepalive:
+            return
+        now = time.monotonic()
+        if now - self._last_received > self.keepalive * 1.5:
+            raise ConnectionError(f"No answer from the broker for {now - self._last_received:.0f}s")
+        if now - self._last_sent >= self.keepalive / 2:
+            self._sock.sendall(mqtt.PINGREQ_PACKET)
+            self._last_sent = now
@@ -0,0 +1,157 @@
+"""
+Central receiver for site replication.
+
+Merges change-sets from many sites into one SQLite database. Every site
+table is mirrored as ``site_<table>`` keyed by ``(site_id, id)``, so
+re-sent batches are ignored rather than duplicated. The receiver records
+the highest id it has applied per site and table, and hands it back as the
+acknowledgement that the sender uses as its new high-water mark.
+
+Run standalone with::
+
+    python -m services.replication_receiver --db central.db --port 5100
+"""
+import argparse
+import gzip
+import json
+import sqlite3
+import threading
+
+from flask import Flask, jsonify, request
+
+REPLICATED_TABLES = ('readings', 'logs')
+
+
+class ReplicationStore:
+    """SQLite storage for merged site data."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self._columns = {}
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS replication_sites (
+                site_id TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                acked_id INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (site_id, table_name)
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def acked_id(self, site_id, table):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT acked_id FROM replication_sites WHERE site_id = ? AND table_name = ?',
+                (site_id, table)
+            ).fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def apply(self, change_set):
+        """
+        Apply one change-set idempotently.
+
+        Returns:
+            tuple: (accepted, acked_id); not accepted when the batch starts
+            beyond what this store has, i.e. rows in between are missing
+        """
+        site_id = str(change_set['site_id'])
+        table = change_set['table']
+        columns = change_set['columns']
+        if table not in REPLICATED_TABLES:
+            raise ValueError(f"Table {table!r} is not replicated")
+        if not columns or columns[0] != 'id' or not all(c.isidentifier() for c in columns):
+            raise ValueError("Invalid column list")
+
+        with self.lock:
+            conn = self._connect()
+            try:
+                acked = self.acked_id(site_id, table)
+                if change_set['from_id'] > acked:
+                    return False, acked
+                self._ensure_table(conn, table, columns)
+                column_list = ', '.join(['site_id'] + columns)
+                placeholders = ', '.join('?' * (len(columns) + 1))
+                conn.executemany(
+                    f'INSERT OR IGNORE INTO site_{table} ({column_list}) VALUES ({placeholders})',
+                    ([site_id] + list(row) for row in change_set['rows'])
+                )
+                acked = max(acked, change_set['to_id'])
+                conn.execute(
+                    'INSERT OR REPLACE INTO replication_sites (site_id, table_name, acked_id) VALUES (?, ?, ?)',
+                    (site_id, table, acked)
+                )
+                conn.commit()
+                return True, acked
+            finally:
+                conn.close()
+
+    def _ensure_table(self, conn, table, columns):
+        known = self._columns.get(table)
+        if known is None:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS site_{table} (
+                    site_id TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    PRIMARY KEY (site_id, id)
+                )
+            """)
+            known = {row[1] for row in conn.execute(f'PRAGMA table_info(site_{table})')}
+            self._columns[table] = known
+        for column in columns:
+            if column not in known:
+                conn.execute(f'ALTER TABLE site_{table} ADD COLUMN {column}')
+                known.add(column)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+
+def create_receiver_app(db_path):
+    """Create the Flask app that accepts replication change-sets."""
+    app = Flask('weighbridge_replication')
+    store = ReplicationStore(db_path)
+
+    @app.route('/replicate/<table>/hwm', methods=['GET'])
+    def get_hwm(table):
+        site_id = request.args.get('site_id') or request.headers.get('X-Site-Id')
+        if not site_id:
+            return jsonify({'status': 'error', 'message': 'site_id is required'}), 400
+        return jsonify({'status': 'success', 'acked_id': store.acked_id(site_id, table)})
+
+    @app.route('/replicate/<table>', methods=['POST'])
+    def post_change_set(table):
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        try:
+            change_set = json.loads(body)
+            if change_set.get('table') != table:
+                raise ValueError("Table in URL and body differ")
+            accepted, acked_id = store.apply(change_set)
+        except (ValueError, KeyError, TypeError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        if not accepted:
+            return jsonify({'status': 'gap', 'acked_id': acked_id}), 409
+        return jsonify({'status': 'success', 'acked_id': acked_id})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weighbridge central replication receiver')
+    parser.add_argument('--db', default='central.db', help='Central SQLite database file')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5100)
+    args = parser.parse_args()
+    create_receiver_app(args.db).run(host=args.host, port=args.port, threaded=True, use_reloader=False)
+
+
+if __name__ == '__main__':
+    main()
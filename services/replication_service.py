@@ -0,0 +1,151 @@
+import gzip
+import http.client
+import json
+import socket
+import time
+from datetime import datetime
+from threading import Thread, Event
+from urllib.parse import quote, urlsplit
+
+class ReplicationError(Exception):
+    """Raised when the central receiver rejects or garbles a change-set."""
+
+
+class ReplicationService:
+    """
+    Ships new rows to a central receiver as compressed change-sets.
+
+    For every replicated table the service keeps a high-water mark: the
+    highest row id the receiver has acknowledged. Rows above it are sent in
+    id order, in batches of ``replication_batch_rows``, over one persistent
+    HTTP connection. The mark only moves on acknowledgement, so after any
+    outage the service resumes where the receiver left off and sends only
+    the rows it is missing.
+    """
+
+    def __init__(self, logger, db, config, service_manager=None):
+        self.logger = logger
+        self.db = db
+        self.config = config
+        self.service_manager = service_manager
+        self.url = urlsplit(self.config.get('replication_url', 'http://127.0.0.1:5100'))
+        self.site_id = self.config.get('site_id') or socket.gethostname()
+        self.tables = self.config.get('replication_tables', ['readings', 'logs'])
+        self.interval = self.config.get('replication_interval_s', 5)
+        self.batch_rows = self.config.get('replication_batch_rows', 2000)
+        self.max_bytes_per_s = self.config.get('replication_max_kbps', 0) * 1024
+        self.timeout = self.config.get('replication_timeout_s', 30)
+        self._conn = None
+        self._synced_tables = set()
+        self._stop_event = Event()
+        self._thread = None
+        self._next_send = 0.0
+
+    def start(self):
+        """Start the replication thread"""
+        if self._thread and self._thread.is_alive():
+            self.logger.warning("Replication service is already running")
+            return
+
+        self._stop_event.clear()
+        self._synced_tables.clear()
+        self._thread = Thread(target=self._run, name='replication', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Replication service started for site {self.site_id} -> {self.url.netloc}")
+
+    def stop(self):
+        """Stop the replication thread"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=self.timeout + 1)
+        self._close()
+        self.logger.info("Replication service stopped")
+
+    def is_alive(self):
+        """Check if the service is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            try:
+                # Keep sending back to back while any table has a backlog
+                shipped = sum(self._ship(table) for table in self.tables)
+                backoff = 1.0
+                if shipped:
+                    continue
+                self._stop_event.wait(self.interval)
+            except (OSError, http.client.HTTPException, ReplicationError, ValueError) as e:
+                self.logger.warning(f"Replication to {self.url.netloc} failed, retrying in {backoff:.0f}s: {str(e)}")
+                self._close()
+                self._synced_tables.clear()
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 300)
+
+    def _ship(self, table):
+        """Send the next batch for a table; returns the number of rows acknowledged"""
+        if table not in self._synced_tables:
+            # The receiver is authoritative: if it lost data (e.g. restored
+            # from backup) its mark is lower and we resend from there
+            remote = self._request('GET', f'/replicate/{table}/hwm?site_id={quote(self.site_id, safe="")}')
+            self.db.set_replication_hwm(table, remote['acked_id'])
+            # Ids the receiver already holds must never be handed out again
+            self.db.reserve_row_ids(table, remote['acked_id'])
+            self._synced_tables.add(table)
+
+        hwm = self.db.get_replication_hwm(table)
+        columns, rows = self.db.fetch_rows_after(table, hwm, self.batch_rows)
+        if not rows:
+            return 0
+
+        change_set = {
+            'site_id': self.site_id,
+            'table': table,
+            'from_id': hwm,
+            'to_id': rows[-1][0],
+            'columns': columns,
+            'rows': rows
+        }
+        body = gzip.compress(json.dumps(change_set, default=self._encode, separators=(',', ':')).encode('utf-8'))
+        self._throttle(len(body))
+        response = self._request('POST', f'/replicate/{table}', body)
+
+        acked_id = response.get('acked_id')
+        if acked_id is None or acked_id < hwm:
+            raise ReplicationError(f"Bad acknowledgement for {table}: {response}")
+        self.db.set_replication_hwm(table, acked_id)
+        return len(rows)
+
+    def _throttle(self, size):
+        """Token-bucket style pacing of outgoing bytes"""
+        if not self.max_bytes_per_s:
+            return
+        now = time.monotonic()
+        if self._next_send > now:
+            self._stop_event.wait(self._next_send - now)
+        self._next_send = max(now, self._next_send) + size / self.max_bytes_per_s
+
+    def _request(self, method, path, body=None):
+        if self._conn is None:
+            conn_class = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+            self._conn = conn_class(self.url.netloc, timeout=self.timeout)
+        headers = {'Accept': 'application/json', 'X-Site-Id': self.site_id}
+        if body is not None:
+            headers.update({'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+        self._conn.request(method, self.url.path.rstrip('/') + path, body=body, headers=headers)
+        response = self._conn.getresponse()
+        payload = response.read()
+        if response.status != 200:
+            raise ReplicationError(f"HTTP {response.status}: {payload[:200]!r}")
+        return json.loads(payload)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(f"Cannot encode {type(value).__name__}")
@@ -1,14 +1,36 @@
 import serial
 import serial.tools.list_ports
 import time
-from threading import Thread, Event
+import itertools
+from collections import deque
+from threading import Thread, Event, Lock
 from queue import Queue
 
+from core.metrics import REGISTRY
+from core.sample import WeightSample
+from core.tracing import TRACER, PUBLISHED
+
+# Shared by all instances so sequence numbers keep increasing across
+# service restarts; API clients use them as change tokens
+_SEQUENCE = itertools.count(1)
+
+BYTES_READ = REGISTRY.counter('serial_bytes_total', 'Bytes read from the serial port')
+FRAMES = REGISTRY.counter('serial_frames_total', 'Weight frames parsed')
+PARSE_ERRORS = REGISTRY.counter('serial_parse_errors_total', 'Frames that did not parse as a weight')
+RECONNECTS = REGISTRY.counter('serial_reconnects_total', 'Successful connections after the first')
+CONNECT_FAILURES = REGISTRY.counter('serial_connect_failures_total', 'Failed connection attempts')
+CONNECTED = REGISTRY.gauge('serial_connected', '1 while the serial port is open')
+COMMANDS = REGISTRY.counter('serial_commands_total', 'Commands written to the scale', ['command'])
+
+# Common indicator commands; override per scale with `scale_commands`
+DEFAULT_SCALE_COMMANDS = {'tare': 'T\r\n', 'zero': 'Z\r\n'}
+
 class SerialService:
-    def __init__(self, logger, db, config, port=None, baudrate=9600):
+    def __init__(self, logger, db, config, port=None, baudrate=9600, service_manager=None):
         self.logger = logger
         self.db = db
         self.config = config
+        self.service_manager = service_manager
         self.port = port or self.config.get('default_com_port')
         self.baudrate = baudrate or self.config.get('default_baudrate', 9600)
         self.serial_conn = None
@@ -16,17 +38,30 @@ class SerialService:
         self._thread = None
         self.data_queue = Queue()
         self.is_connected = False
+        self.stable_threshold = self.config.get('stable_threshold', 0.3)
+        self._window = deque(maxlen=self.config.get('stable_window', 5))
+        self.latest_sample = None
+        self.last_stable_sample = None
+        # (version, sample) of the current stable reading; see _process_reading
+        self.stable_reading = (0, None)
+        self._connected_before = False
+        # No frames for this long while connected counts as a stall
+        self.stall_timeout = self.config.get('serial_stall_s', 10.0)
+        self.frames_read = 0
+        self._heartbeat = time.monotonic()
+        self.scale_commands = dict(DEFAULT_SCALE_COMMANDS, **(self.config.get('scale_commands') or {}))
+        self._write_lock = Lock()
 
     def start(self):
         """Start the serial service"""
         if self._thread and self._thread.is_alive():
-            self.logger.warning("Serial service is already running")
+            self.logger.warning("Serial service is already running", source='serial')
             return
 
         self._stop_event.clear()
         self._thread = Thread(target=self._run, daemon=True)
         self._thread.start()
-        self.logger.info(f"Serial service started on {self.port}")
+        self.logger.info(f"Serial service started on {self.port}", source='serial')
 
     def stop(self):
         """Stop the serial service"""
@@ -36,11 +71,13 @@ class SerialService:
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.close()
         self.is_connected = False
-        self.logger.info("Serial service stopped")
+        CONNECTED.set(0)
+        self.logger.info("Serial service stopped", source='serial')
 
     def _run(self):
         """Main serial communication loop"""
         while not self._stop_event.is_set():
+            self._heartbeat = time.monotonic()
             try:
                 if not self.is_connected:
                     self._connect()
@@ -51,8 +88,9 @@ class SerialService:
                     time.sleep(1)  # Wait before trying to reconnect
                     
             except Exception as e:
-                self.logger.error(f"Serial error: {str(e)}", exc_info=True)
+                self.logger.error(f"Serial error: {str(e)}", source='serial', exc_info=True)
                 self.is_connected = False
+                CONNECTED.set(0)
                 if self.serial_conn:
                     self.serial_conn.close()
                 time.sleep(1)
@@ -67,9 +105,14 @@ class SerialService:
                 write_timeout=1.0
             )
             self.is_connected = True
-            self.logger.info(f"Connected to {self.port} at {self.baudrate} baud")
+            CONNECTED.set(1)
+            if self._connected_before:
+                RECONNECTS.inc()
+            self._connected_before = True
+            self.logger.info(f"Connected to {self.port} at {self.baudrate} baud", source='serial')
         except Exception as e:
-            self.logger.error(f"Failed to connect to {self.port}: {str(e)}")
+            CONNECT_FAILURES.inc()
+            self.logger.error(f"Failed to connect to {self.port}: {str(e)}", source='serial')
             self.is_connected = False
             raise
 
@@ -77,35 +120,102 @@ class SerialService:
         """Read data from serial port"""
         if not self.serial_conn or not self.serial_conn.is_open:
             self.is_connected = False
+            CONNECTED.set(0)
             return
 
         try:
             if self.serial_conn.in_waiting > 0:
-                line = self.serial_conn.readline().decode('ascii', errors='ignore').strip()
+                raw = self.serial_conn.readline()
+                read_ns = time.perf_counter_ns()
+                BYTES_READ.inc(len(raw))
+                line = raw.decode('ascii', errors='ignore').strip()
                 if line:
-                    self._process_reading(line)
+                    self._process_reading(line, read_ns)
         except Exception as e:
-            self.logger.error(f"Error reading from serial: {str(e)}")
+            self.logger.error(f"Error reading from serial: {str(e)}", source='serial')
             self.is_connected = False
+            CONNECTED.set(0)
             if self.serial_conn:
                 self.serial_conn.close()
 
-    def _process_reading(self, data):
+    def _process_reading(self, data, read_ns=None):
         """Process raw serial data"""
+        read_ns = read_ns or time.perf_counter_ns()
         try:
             # Parse the weight value from the scale
             # This is a simple example - adjust based on your scale's protocol
             weight = float(data)
-            self.data_queue.put(weight)
-            self.logger.info(f"Weight reading: {weight} kg")
-            
-            # Here you could add logic to determine if the reading is stable
-            # and call appropriate callbacks or update the database
-            # For example:
-            # self.db.insert_reading(weight, stable=True)
-            
         except ValueError:
-            self.logger.warning(f"Invalid data received: {data}")
+            PARSE_ERRORS.inc()
+            self.logger.warning(f"Invalid data received: {data}", source='serial')
+            return
+        FRAMES.inc()
+        self.frames_read += 1
+        parsed_ns = time.perf_counter_ns()
+
+        # A reading is stable once the last `stable_window` samples all lie
+        # within `stable_threshold` kg of each other
+        self._window.append(weight)
+        filtered_ns = time.perf_counter_ns()
+        is_stable = (len(self._window) == self._window.maxlen and
+                     max(self._window) - min(self._window) <= self.stable_threshold)
+        stability_ns = time.perf_counter_ns()
+
+        sample = WeightSample(
+            seq=next(_SEQUENCE),
+            weight_kg=weight,
+            is_stable=is_stable,
+            timestamp=time.time()
+        )
+        TRACER.begin(sample.seq, read_ns, parsed_ns, filtered_ns, stability_ns)
+        if is_stable:
+            # The stable reading only moves on when the scale settles again
+            # or settles on a different weight; identical stable frames keep
+            # its version, so pollers get 304s and long-polls keep waiting
+            version, current = self.stable_reading
+            if current is None or not self.latest_sample.is_stable or current.weight_kg != weight:
+                self.stable_reading = (version + 1, sample)
+            self.last_stable_sample = sample
+        self.latest_sample = sample
+        TRACER.mark(sample.seq, PUBLISHED)
+
+        self.data_queue.put(weight)
+        self.logger.info(f"Weight reading: {weight} kg", source='serial')
+
+        # Persistence and any other consumers hang off the event bus
+        if self.service_manager:
+            self.service_manager.events.publish('sample', sample)
+
+    def send_command(self, command):
+        """
+        Write a command such as 'tare' or 'zero' to the scale.
+
+        Safe to call from any thread; the reply, if any, arrives as a
+        normal reading.
+
+        Args:
+            command: Name of an entry in ``scale_commands``
+
+        Raises:
+            ValueError: If the command is not configured
+            RuntimeError: If the port is not connected
+        """
+        payload = self.scale_commands.get(command)
+        if payload is None:
+            raise ValueError(f"Unknown scale command: {command}")
+        conn = self.serial_conn
+        if not self.is_connected or not conn or not conn.is_open:
+            raise RuntimeError(f"Cannot send {command}: {self.port} is not connected")
+        with self._write_lock:
+            conn.write(payload.encode('ascii'))
+            conn.flush()
+        COMMANDS.labels(command).inc()
+        self.logger.info(f"Sent {command} command to the scale", source='serial')
+
+    def get_last_stable(self):
+        """Get the weight of the last stable sample, or None"""
+        sample = self.last_stable_sample
+        return sample.weight_kg if sample else None
 
     def get_latest_reading(self):
         """Get the latest weight reading if available"""
@@ -117,6 +227,14 @@ class SerialService:
         """Check if the service is running"""
         return self._thread and self._thread.is_alive()
 
+    def health(self):
+        """Heartbeat and progress for the supervisor"""
+        return {
+            'heartbeat': self._heartbeat,
+            'progress': self.frames_read,
+            'stall_after': self.stall_timeout if self.is_connected else None
+        }
+
     def list_ports(self):
         """List available serial ports"""
         return [port.device for port in serial.tools.list_ports.comports()]
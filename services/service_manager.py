@@ -1,9 +1,12 @@
 import importlib
 import threading
-from typing import Dict, Any, Optional, Type
-from dataclasses import dataclass
+from typing import Dict, Any, Optional, Type, List, Iterable, Callable, Mapping
+from dataclasses import dataclass, field
 from enum import Enum, auto
 import time
+from types import MappingProxyType
+
+from core.events import EventBus
 
 class ServiceStatus(Enum):
     STOPPED = auto()
@@ -20,11 +23,54 @@ class ServiceInfo:
     last_error: Optional[str] = None
     start_time: Optional[float] = None
     uptime: float = 0.0
+    # Whether the service should be running: set by start, cleared by an
+    # explicit stop; the supervisor only restarts wanted services
+    wanted: bool = False
+    restarts: int = 0
+    # Set whenever the service is not STARTING or STOPPING, so callers can
+    # wait for a transition in progress instead of polling
+    settled: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+@dataclass(frozen=True)
+class ServiceSnapshot:
+    """Immutable view of one service, as of its last state transition."""
+    name: str
+    service: Any
+    status: ServiceStatus
+    last_error: Optional[str]
+    start_time: Optional[float]
+    uptime: float
+    restarts: int
+
+    @property
+    def running(self) -> bool:
+        return self.status == ServiceStatus.RUNNING
+
+    def to_dict(self, now: float = None) -> dict:
+        now = now if now is not None else time.time()
+        return {
+            'status': self.status.name,
+            'running': self.running,
+            'uptime': self.uptime + (now - self.start_time if self.start_time else 0),
+            'error': self.last_error,
+            'restarts': self.restarts
+        }
 
 class ServiceManager:
     """
     Manages the lifecycle of all services in the application.
     Handles service registration, initialization, starting, and stopping.
+
+    Registry entries may list ``depends_on``: those services are started
+    before and, by ``stop_all``, stopped after the service. Services with
+    no dependency between them start and stop in parallel. The lock only
+    guards the registry and status fields; importing, constructing,
+    starting and stopping a service run outside it, so a slow service
+    never blocks operations on the others.
+
+    Every state transition publishes a new read-only mapping of
+    ServiceSnapshot objects. Status queries read the current mapping
+    without taking the lock, so they stay fast while services restart.
     """
     
     def __init__(self, logger, db, config):
@@ -40,23 +86,113 @@ class ServiceManager:
         self.db = db
         self.config = config
         self._services: Dict[str, ServiceInfo] = {}
-        self._lock = threading.RLock()
+        self._lock = threading.Lock()
+        # Replaced, never mutated; read without the lock
+        self._snapshot = MappingProxyType({})
+        # Shared by all services; acquisition publishes 'sample' events here
+        self.events = EventBus(logger)
         self._service_registry = {
+            'writer': {
+                'module': 'services.writer_service',
+                'class': 'WriterService',
+                'config_key': 'writer'
+            },
             'serial': {
                 'module': 'services.serial_service',
                 'class': 'SerialService',
-                'config_key': 'serial'
+                'config_key': 'serial',
+                # The writer replays the sample journal and must be taking
+                # samples before acquisition starts
+                'depends_on': ['writer']
             },
             'api': {
                 'module': 'services.api_service',
                 'class': 'ApiService',
-                'config_key': 'api'
+                'config_key': 'api',
+                'depends_on': ['serial']
+            },
+            'maintenance': {
+                'module': 'services.maintenance_service',
+                'class': 'MaintenanceService',
+                'config_key': 'maintenance'
+            },
+            'replication': {
+                'module': 'services.replication_service',
+                'class': 'ReplicationService',
+                'config_key': 'replication'
+            },
+            'forwarder': {
+                'module': 'services.forwarder_service',
+                'class': 'ForwarderService',
+                'config_key': 'forwarder'
+            },
+            'webhooks': {
+                'module': 'services.webhook_service',
+                'class': 'WebhookService',
+                'config_key': 'webhooks'
+            },
+            'tcp_broadcast': {
+                'module': 'services.tcp_broadcast_service',
+                'class': 'TcpBroadcastService',
+                'config_key': 'tcp_broadcast'
+            },
+            'modbus': {
+                'module': 'services.modbus_service',
+                'class': 'ModbusService',
+                'config_key': 'modbus'
+            },
+            'mqtt': {
+                'module': 'services.mqtt_service',
+                'class': 'MqttService',
+                'config_key': 'mqtt'
             }
         }
         self._running = False
         self._start_time = time.time()
+        # Imported here: the supervisor module needs ServiceStatus from this one
+        from services.supervisor import Supervisor
+        self.supervisor = Supervisor(self, logger, config)
+
+    def _set_status(self, service_info: ServiceInfo, status: ServiceStatus, error: str = None):
+        """Record a status transition and announce it as a 'service_state' event."""
+        with self._lock:
+            service_info.status = status
+            if error is not None:
+                service_info.last_error = error
+            if status in (ServiceStatus.STARTING, ServiceStatus.STOPPING):
+                service_info.settled.clear()
+            else:
+                service_info.settled.set()
+            self._publish_snapshot()
+        # Subscribers run synchronously; never call them under the lock
+        self.events.publish('service_state', (service_info.name, status))
+
+    def _publish_snapshot(self):
+        """Rebuild the status snapshot; call with the lock held."""
+        self._snapshot = MappingProxyType({
+            sid: ServiceSnapshot(
+                name=sid,
+                service=info.service,
+                status=info.status,
+                last_error=info.last_error,
+                start_time=info.start_time,
+                uptime=info.uptime,
+                restarts=info.restarts
+            )
+            for sid, info in self._services.items()
+        })
+
+    def snapshot(self) -> Mapping[str, ServiceSnapshot]:
+        """
+        Current status of all services, without locking.
+
+        Returns:
+            Read-only mapping of service IDs to ServiceSnapshot
+        """
+        return self._snapshot
 
-    def register_service(self, service_id: str, module_path: str, class_name: str, config_key: str = None):
+    def register_service(self, service_id: str, module_path: str, class_name: str, config_key: str = None,
+                         depends_on: Iterable[str] = ()):
         """
         Register a new service type.
         
@@ -65,17 +201,116 @@ class ServiceManager:
             module_path: Python module path (e.g., 'services.my_service')
             class_name: Name of the service class
             config_key: Key in config for service-specific settings
+            depends_on: IDs of services that must be running first
         """
         with self._lock:
             self._service_registry[service_id] = {
                 'module': module_path,
                 'class': class_name,
-                'config_key': config_key or service_id
+                'config_key': config_key or service_id,
+                'depends_on': list(depends_on)
             }
 
+    def _dependency_waves(self, service_ids: Iterable[str], include_dependencies: bool = True,
+                          dependents_first: bool = False) -> List[List[str]]:
+        """
+        Group services so that each group only depends on earlier ones.
+
+        Args:
+            service_ids: Services to order
+            include_dependencies: Also pull in their (transitive) dependencies;
+                otherwise dependencies outside ``service_ids`` are ignored
+            dependents_first: Reverse the order, for stopping: each group
+                only has dependents in earlier ones
+
+        Returns:
+            List of waves; the services within one wave are independent
+
+        Raises:
+            ValueError: On an unknown service or a dependency cycle
+        """
+        with self._lock:
+            registry = {sid: list(entry.get('depends_on', ())) for sid, entry in self._service_registry.items()}
+        wanted = list(dict.fromkeys(service_ids))
+        for service_id in wanted:
+            if service_id not in registry:
+                raise ValueError(f"Unknown service: {service_id}")
+        if include_dependencies:
+            pending = list(wanted)
+            while pending:
+                for dep in registry[pending.pop()]:
+                    if dep not in registry:
+                        raise ValueError(f"Unknown service: {dep}")
+                    if dep not in wanted:
+                        wanted.append(dep)
+                        pending.append(dep)
+        members = set(wanted)
+        edges = {sid: [dep for dep in registry[sid] if dep in members] for sid in wanted}
+        if dependents_first:
+            edges = {sid: [other for other in wanted if sid in edges[other]] for sid in wanted}
+
+        levels = {}
+        visiting = set()
+
+        def level(service_id):
+            if service_id in levels:
+                return levels[service_id]
+            if service_id in visiting:
+                raise ValueError(f"Dependency cycle involving service {service_id}")
+            visiting.add(service_id)
+            levels[service_id] = 1 + max((level(dep) for dep in edges[service_id]), default=-1)
+            visiting.discard(service_id)
+            return levels[service_id]
+
+        waves = []
+        for service_id in wanted:
+            n = level(service_id)
+            while len(waves) <= n:
+                waves.append([])
+            waves[n].append(service_id)
+        return waves
+
+    def _run_parallel(self, service_ids: List[str], action: Callable[[str], Any], timeout: float) -> Dict[str, Optional[str]]:
+        """
+        Run ``action`` for each service on its own thread and wait for all.
+
+        Returns:
+            Dictionary mapping service IDs to an error message, or None on success
+        """
+        if len(service_ids) == 1:
+            # Nothing to overlap with; skip the thread
+            service_id = service_ids[0]
+            try:
+                action(service_id)
+                return {service_id: None}
+            except Exception as e:
+                return {service_id: str(e)}
+
+        results = {}
+        done = {}
+
+        def run(service_id):
+            try:
+                action(service_id)
+                results[service_id] = None
+            except Exception as e:
+                results[service_id] = str(e)
+            finally:
+                done[service_id].set()
+
+        for service_id in service_ids:
+            done[service_id] = threading.Event()
+            threading.Thread(target=run, args=(service_id,), name=f'service-{service_id}', daemon=True).start()
+        deadline = time.monotonic() + timeout
+        for service_id in service_ids:
+            if not done[service_id].wait(max(0.0, deadline - time.monotonic())):
+                results[service_id] = f"Timed out after {timeout:.0f}s"
+        return {service_id: results.get(service_id) for service_id in service_ids}
+
     def start(self, service_id: str, **kwargs) -> Any:
         """
-        Start a service by ID.
+        Start a service by ID, after any of its dependencies that are not
+        running yet.
         
         Args:
             service_id: ID of the service to start
@@ -86,119 +321,176 @@ class ServiceManager:
             
         Raises:
             ValueError: If service_id is not registered
-            RuntimeError: If service fails to start
+            RuntimeError: If the service or one of its dependencies fails to start
+        """
+        waves = self._dependency_waves([service_id])
+        for wave in waves[:-1]:
+            wave = [sid for sid in wave if not self.is_service_running(sid)]
+            if not wave:
+                continue
+            errors = self._run_parallel(wave, self._start_one, timeout=60.0)
+            failed = {sid: error for sid, error in errors.items() if error}
+            if failed:
+                raise RuntimeError(
+                    f"Cannot start service {service_id}: dependency "
+                    + ', '.join(f"{sid} failed ({error})" for sid, error in failed.items())
+                )
+        return self._start_one(service_id, **kwargs)
+
+    def start_many(self, service_ids: Iterable[str], timeout: float = 60.0) -> Dict[str, Optional[str]]:
+        """
+        Start several services and their dependencies, independent ones in
+        parallel. Failures are logged and reported rather than raised.
+
+        Args:
+            service_ids: IDs of the services to start
+            timeout: Seconds to wait for each wave of services
+
+        Returns:
+            Dictionary mapping every service started to an error message, or None
         """
         with self._lock:
-            if service_id in self._services:
-                if self._services[service_id].status == ServiceStatus.RUNNING:
-                    self.logger.warning(f"Service {service_id} is already running")
-                    return self._services[service_id].service
-                elif self._services[service_id].status == ServiceStatus.STARTING:
-                    self.logger.warning(f"Service {service_id} is already starting")
-                    return self._services[service_id].service
-
-            if service_id not in self._service_registry:
-                raise ValueError(f"Unknown service: {service_id}")
+            registry = {sid: list(entry.get('depends_on', ())) for sid, entry in self._service_registry.items()}
+        results = {}
+        for wave in self._dependency_waves(service_ids):
+            ready = []
+            for service_id in wave:
+                failed = [dep for dep in registry[service_id] if results.get(dep)]
+                if failed:
+                    results[service_id] = f"Dependency {', '.join(failed)} failed to start"
+                    self.logger.error(f"Not starting service {service_id}: {results[service_id]}")
+                else:
+                    ready.append(service_id)
+            if ready:
+                results.update(self._run_parallel(ready, self._start_one, timeout))
+        return results
 
-            service_info = self._service_registry[service_id]
-            service_config = self.config.get(service_info['config_key'], {})
-            
-            try:
-                # Dynamically import the service module
-                module = importlib.import_module(service_info['module'])
-                service_class = getattr(module, service_info['class'])
-                
-                # Create service instance
-                service = service_class(
-                    logger=self.logger,
-                    db=self.db,
-                    config=service_config,
-                    **kwargs
-                )
-                
-                # Update service info
-                service_info = ServiceInfo(
-                    name=service_id,
-                    service=service,
-                    status=ServiceStatus.STARTING,
-                    start_time=time.time()
-                )
-                self._services[service_id] = service_info
-                
-                # Start the service
-                if hasattr(service, 'start'):
-                    if hasattr(service, 'is_alive') and not service.is_alive():
-                        service.start()
-                    elif not hasattr(service, 'is_alive'):
-                        service.start()
-                
-                service_info.status = ServiceStatus.RUNNING
-                self.logger.info(f"Service {service_id} started successfully")
-                return service
-                
-            except Exception as e:
-                error_msg = f"Failed to start service {service_id}: {str(e)}"
-                self.logger.error(error_msg, exc_info=True)
-                if service_id in self._services:
-                    self._services[service_id].status = ServiceStatus.ERROR
-                    self._services[service_id].last_error = error_msg
-                raise RuntimeError(error_msg) from e
+    def _start_one(self, service_id: str, **kwargs) -> Any:
+        """Start a single service; its dependencies must already be running."""
+        while True:
+            with self._lock:
+                service_info = self._services.get(service_id)
+                if service_info is None or service_info.settled.is_set():
+                    if service_info is not None and service_info.status == ServiceStatus.RUNNING:
+                        self.logger.warning(f"Service {service_id} is already running")
+                        return service_info.service
+                    if service_id not in self._service_registry:
+                        raise ValueError(f"Unknown service: {service_id}")
+                    registry_entry = self._service_registry[service_id]
+                    # Claim the slot so concurrent callers wait for this start
+                    service_info = ServiceInfo(
+                        name=service_id,
+                        service=None,
+                        status=ServiceStatus.STARTING,
+                        start_time=time.time(),
+                        wanted=True,
+                        restarts=service_info.restarts if service_info else 0
+                    )
+                    self._services[service_id] = service_info
+                    self._publish_snapshot()
+                    break
+            # Starting or stopping elsewhere: wait for that, then re-check
+            if not service_info.settled.wait(timeout=60.0):
+                raise RuntimeError(f"Service {service_id} is stuck in {service_info.status.name}")
+
+        self.events.publish('service_state', (service_id, ServiceStatus.STARTING))
+        # Services without a dedicated config section read the global config
+        service_config = self.config.get(registry_entry['config_key']) or self.config
+        try:
+            # Dynamically import the service module
+            module = importlib.import_module(registry_entry['module'])
+            service_class = getattr(module, registry_entry['class'])
+
+            # Create service instance
+            service = service_class(
+                logger=self.logger,
+                db=self.db,
+                config=service_config,
+                service_manager=self,
+                **kwargs
+            )
+            service_info.service = service
+
+            # Start the service
+            if hasattr(service, 'start'):
+                if hasattr(service, 'is_alive') and not service.is_alive():
+                    service.start()
+                elif not hasattr(service, 'is_alive'):
+                    service.start()
 
-    def stop(self, service_id: str, force: bool = False) -> bool:
+            self._set_status(service_info, ServiceStatus.RUNNING)
+            self.logger.info(f"Service {service_id} started successfully")
+            return service
+
+        except Exception as e:
+            error_msg = f"Failed to start service {service_id}: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            service_info.start_time = None
+            self._set_status(service_info, ServiceStatus.ERROR, error_msg)
+            raise RuntimeError(error_msg) from e
+
+    def stop(self, service_id: str, force: bool = False, timeout: float = 5.0) -> bool:
         """
-        Stop a running service.
+        Stop a running service. Services that depend on it are left running.
         
         Args:
             service_id: ID of the service to stop
             force: If True, force stop the service
+            timeout: Seconds to wait for the service's thread to finish
             
         Returns:
             bool: True if service was stopped, False otherwise
         """
-        with self._lock:
-            if service_id not in self._services:
-                self.logger.warning(f"Service {service_id} not found")
-                return False
-                
-            service_info = self._services[service_id]
-            
-            if service_info.status != ServiceStatus.RUNNING:
-                self.logger.warning(f"Service {service_id} is not running")
-                return False
-                
-            try:
-                service_info.status = ServiceStatus.STOPPING
-                service = service_info.service
-                
-                if hasattr(service, 'stop'):
-                    service.stop()
-                elif hasattr(service, 'shutdown'):
-                    service.shutdown()
-                    
-                if hasattr(service, 'is_alive'):
-                    # Wait for the service to stop
-                    timeout = 5.0  # 5 second timeout
-                    start_time = time.time()
-                    while service.is_alive() and (time.time() - start_time) < timeout:
-                        time.sleep(0.1)
-                        
-                    if service.is_alive() and force:
-                        if hasattr(service, 'terminate'):
-                            service.terminate()
-                            
-                service_info.status = ServiceStatus.STOPPED
-                service_info.uptime += (time.time() - (service_info.start_time or 0))
-                service_info.start_time = None
-                self.logger.info(f"Service {service_id} stopped")
-                return True
-                
-            except Exception as e:
-                error_msg = f"Error stopping service {service_id}: {str(e)}"
-                self.logger.error(error_msg, exc_info=True)
-                service_info.status = ServiceStatus.ERROR
-                service_info.last_error = error_msg
+        while True:
+            with self._lock:
+                service_info = self._services.get(service_id)
+                if service_info is None:
+                    self.logger.warning(f"Service {service_id} not found")
+                    return False
+                # Stopped on purpose, also when it already failed: the
+                # supervisor must not bring it back
+                service_info.wanted = False
+                if service_info.settled.is_set():
+                    if service_info.status != ServiceStatus.RUNNING:
+                        self.logger.warning(f"Service {service_id} is not running")
+                        return False
+                    break
+            # Let a start in progress finish before stopping it
+            if not service_info.settled.wait(timeout=60.0):
+                self.logger.warning(f"Service {service_id} is stuck in {service_info.status.name}")
                 return False
 
+        try:
+            self._set_status(service_info, ServiceStatus.STOPPING)
+            service = service_info.service
+            deadline = time.monotonic() + timeout
+
+            if hasattr(service, 'stop'):
+                service.stop()
+            elif hasattr(service, 'shutdown'):
+                service.shutdown()
+
+            if hasattr(service, 'is_alive') and service.is_alive():
+                # Thread-based services can be waited on directly
+                if callable(getattr(service, 'join', None)):
+                    service.join(max(0.0, deadline - time.monotonic()))
+                if service.is_alive():
+                    self.logger.warning(f"Service {service_id} is still running after stop")
+                    if force and hasattr(service, 'terminate'):
+                        service.terminate()
+
+            service_info.uptime += (time.time() - (service_info.start_time or 0))
+            service_info.start_time = None
+            self._set_status(service_info, ServiceStatus.STOPPED)
+            self.logger.info(f"Service {service_id} stopped")
+            return True
+
+        except Exception as e:
+            error_msg = f"Error stopping service {service_id}: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            self._set_status(service_info, ServiceStatus.ERROR, error_msg)
+            return False
+
     def get_service(self, service_id: str) -> Any:
         """
         Get a service instance by ID.
@@ -209,9 +501,8 @@ class ServiceManager:
         Returns:
             The service instance or None if not found
         """
-        with self._lock:
-            service_info = self._services.get(service_id)
-            return service_info.service if service_info else None
+        entry = self._snapshot.get(service_id)
+        return entry.service if entry else None
 
     def get_service_info(self, service_id: str) -> Optional[ServiceInfo]:
         """
@@ -233,28 +524,110 @@ class ServiceManager:
         Returns:
             Dictionary mapping service IDs to status dictionaries
         """
+        now = time.time()
+        return {sid: entry.to_dict(now) for sid, entry in self._snapshot.items()}
+
+    def supervised_services(self) -> List[tuple]:
+        """Snapshot of (service_id, ServiceInfo) for the supervisor."""
         with self._lock:
-            snapshot = {}
-            for sid, info in self._services.items():
-                status = {
-                    'status': info.status.name,
-                    'running': info.status == ServiceStatus.RUNNING,
-                    'uptime': info.uptime + (time.time() - info.start_time if info.start_time else 0),
-                    'error': info.last_error
-                }
-                snapshot[sid] = status
-            return snapshot
-
-    def stop_all(self, force: bool = False):
-        """
-        Stop all running services.
+            return list(self._services.items())
+
+    def mark_faulted(self, service_id: str, kind: str, reason: str):
+        """
+        Record that a running service has failed, and announce it as a
+        'service_fault' event.
+
+        Args:
+            service_id: ID of the failed service
+            kind: Fault kind, e.g. 'crashed', 'hung' or 'stalled'
+            reason: Human-readable description
+        """
+        with self._lock:
+            service_info = self._services.get(service_id)
+            if service_info is None or service_info.status != ServiceStatus.RUNNING:
+                return
+        error_msg = f"Service {service_id} {kind}: {reason}"
+        self.logger.error(error_msg)
+        service_info.uptime += (time.time() - (service_info.start_time or time.time()))
+        service_info.start_time = None
+        self._set_status(service_info, ServiceStatus.ERROR, error_msg)
+        self.events.publish('service_fault', (service_id, kind, reason))
+
+    def recover(self, service_id: str) -> bool:
+        """
+        Replace a failed service with a fresh instance.
+
+        Args:
+            service_id: ID of a service in the ERROR state
+
+        Returns:
+            bool: True if the new instance started
+        """
+        with self._lock:
+            service_info = self._services.get(service_id)
+            if (service_info is None or not service_info.wanted or
+                    service_info.status != ServiceStatus.ERROR):
+                return False
+        old_service = service_info.service
+        try:
+            if old_service is not None and hasattr(old_service, 'stop'):
+                # Release its port, threads and subscriptions before replacing it
+                try:
+                    old_service.stop()
+                except Exception as e:
+                    self.logger.warning(f"Error stopping failed service {service_id}: {str(e)}")
+                is_alive = getattr(old_service, 'is_alive', None)
+                if callable(is_alive) and is_alive():
+                    # A second instance would share its journal, port or
+                    # device; leave it failed until its thread has exited
+                    self._set_status(
+                        service_info, ServiceStatus.ERROR,
+                        f"Service {service_id} did not stop, not replacing it yet"
+                    )
+                    return False
+            self._start_one(service_id)
+            return True
+        except (RuntimeError, ValueError):
+            return False
+        finally:
+            with self._lock:
+                self._services[service_id].restarts += 1
+                self._publish_snapshot()
+
+    def give_up(self, service_id: str):
+        """Stop restarting a service until it is started again by hand."""
+        with self._lock:
+            service_info = self._services.get(service_id)
+            if service_info is None:
+                return
+            service_info.wanted = False
+        self._set_status(
+            service_info, ServiceStatus.ERROR,
+            f"{service_info.last_error} (gave up after {service_info.restarts} restarts)"
+        )
+
+    def stop_all(self, force: bool = False, timeout: float = 10.0):
+        """
+        Stop all running services, dependents before their dependencies.
+        Independent services stop in parallel, so shutdown takes about as
+        long as the slowest chain of dependent services, not their sum.
         
         Args:
             force: If True, force stop services
+            timeout: Seconds to wait for each dependency level
         """
+        # Otherwise it would restart what is being stopped
+        self.supervisor.stop()
         with self._lock:
-            for service_id in list(self._services.keys()):
-                self.stop(service_id, force)
+            active = [
+                sid for sid, info in self._services.items()
+                if info.status in (ServiceStatus.RUNNING, ServiceStatus.STARTING)
+            ]
+        for wave in self._dependency_waves(active, include_dependencies=False, dependents_first=True):
+            results = self._run_parallel(wave, lambda sid: self.stop(sid, force), timeout)
+            for service_id, error in results.items():
+                if error:
+                    self.logger.error(f"Service {service_id} did not stop: {error}")
 
     def restart(self, service_id: str) -> bool:
         """
@@ -266,10 +639,9 @@ class ServiceManager:
         Returns:
             bool: True if restart was successful
         """
-        with self._lock:
-            if self.stop(service_id):
-                return self.start(service_id) is not None
-            return False
+        if self.stop(service_id):
+            return self.start(service_id) is not None
+        return False
 
     def is_service_running(self, service_id: str) -> bool:
         """
@@ -281,10 +653,8 @@ class ServiceManager:
         Returns:
             bool: True if the service is running
         """
-        with self._lock:
-            if service_id not in self._services:
-                return False
-            return self._services[service_id].status == ServiceStatus.RUNNING
+        entry = self._snapshot.get(service_id)
+        return entry is not None and entry.running
 
     def get_service_status(self, service_id: str) -> Optional[ServiceStatus]:
         """
@@ -296,10 +666,8 @@ class ServiceManager:
         Returns:
             ServiceStatus or None if service not found
         """
-        with self._lock:
-            if service_id not in self._services:
-                return None
-            return self._services[service_id].status
+        entry = self._snapshot.get(service_id)
+        return entry.status if entry else None
 
     def __enter__(self):
         """Context manager entry point."""
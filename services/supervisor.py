@@ -0,0 +1,156 @@
+import time
+from collections import deque
+from threading import Thread, Event
+
+from core.metrics import REGISTRY
+from services.service_manager import ServiceStatus
+
+FAULTS = REGISTRY.counter('service_faults_total', 'Service faults detected by the supervisor', ['service', 'kind'])
+RESTARTS = REGISTRY.counter('service_restarts_total', 'Automatic service restarts', ['service', 'result'])
+
+CRASHED = 'crashed'
+HUNG = 'hung'
+STALLED = 'stalled'
+
+
+class Supervisor:
+    """
+    Watches the services of a ServiceManager and restarts the ones that fail.
+
+    Every ``supervisor_interval_s`` each running service is checked for:
+
+    - crashed: it has ``is_alive`` and that returns False;
+    - hung: its ``health()`` heartbeat is older than
+      ``supervisor_heartbeat_timeout_s``;
+    - stalled: ``health()`` sets ``stall_after`` and the progress counter
+      has not moved for that many seconds.
+
+    ``health()`` is optional and returns a dict with ``heartbeat``
+    (time.monotonic() of the service loop's last pass), ``progress`` (any
+    counter that moves while the service does useful work) and
+    ``stall_after`` (seconds, or None while no progress is expected).
+
+    A faulted service is marked ERROR, announced as a 'service_fault'
+    event and restarted after an exponential backoff. Services that
+    failed to start are retried the same way. Once a service has been
+    restarted ``supervisor_max_restarts`` times within
+    ``supervisor_restart_window_s`` the supervisor gives up on it until
+    it is started again by hand. Services stopped on purpose are left
+    alone.
+    """
+
+    def __init__(self, service_manager, logger, config):
+        self.service_manager = service_manager
+        self.logger = logger
+        self.config = config
+        self.interval = self.config.get('supervisor_interval_s', 1.0)
+        self.heartbeat_timeout = self.config.get('supervisor_heartbeat_timeout_s', 15.0)
+        self.max_restarts = self.config.get('supervisor_max_restarts', 5)
+        self.restart_window = self.config.get('supervisor_restart_window_s', 600.0)
+        self.backoff_base = self.config.get('supervisor_backoff_base_s', 1.0)
+        self.backoff_max = self.config.get('supervisor_backoff_max_s', 60.0)
+        # Only touched by the supervisor thread
+        self._progress = {}
+        self._restarts = {}
+        self._retry_at = {}
+        self._stop_event = Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name='supervisor', daemon=True)
+        self._thread.start()
+        self.logger.info("Service supervisor started")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=10.0)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"Supervisor error: {str(e)}", exc_info=True)
+
+    def check(self, now=None):
+        """Run one round of checks and due restarts"""
+        now = now if now is not None else time.monotonic()
+        manager = self.service_manager
+        for service_id, info in manager.supervised_services():
+            if not info.wanted:
+                self._forget(service_id)
+                continue
+            if info.status == ServiceStatus.RUNNING:
+                fault = self._diagnose(service_id, info.service, now)
+                if fault:
+                    kind, reason = fault
+                    FAULTS.labels(service_id, kind).inc()
+                    manager.mark_faulted(service_id, kind, reason)
+                continue
+            if info.status != ServiceStatus.ERROR or self._stop_event.is_set():
+                continue
+            retry_at = self._retry_at.get(service_id)
+            if retry_at is None:
+                self._schedule(service_id, info, now)
+            elif now >= retry_at:
+                del self._retry_at[service_id]
+                self._restart(service_id, now)
+
+    def _diagnose(self, service_id, service, now):
+        is_alive = getattr(service, 'is_alive', None)
+        if callable(is_alive) and not is_alive():
+            return CRASHED, "Service thread is no longer running"
+        health = getattr(service, 'health', None)
+        if not callable(health):
+            return None
+        state = health()
+        heartbeat = state.get('heartbeat')
+        if heartbeat is not None and now - heartbeat > self.heartbeat_timeout:
+            return HUNG, f"No heartbeat for {now - heartbeat:.0f}s"
+        stall_after = state.get('stall_after')
+        progress = state.get('progress')
+        last = self._progress.get(service_id)
+        if not stall_after or last is None or last[0] != progress or last[2] is not service:
+            # Progress moved, nothing is expected, or a new instance: restart the clock
+            self._progress[service_id] = (progress, now, service)
+            return None
+        if now - last[1] > stall_after:
+            return STALLED, f"No progress for {now - last[1]:.0f}s"
+        return None
+
+    def _schedule(self, service_id, info, now):
+        history = self._restarts.setdefault(service_id, deque())
+        while history and now - history[0] > self.restart_window:
+            history.popleft()
+        if len(history) >= self.max_restarts:
+            self.logger.error(
+                f"Service {service_id} failed {len(history)} times in {self.restart_window:.0f}s, "
+                f"not restarting it again: {info.last_error}"
+            )
+            self.service_manager.give_up(service_id)
+            self._forget(service_id)
+            return
+        delay = min(self.backoff_base * 2 ** len(history), self.backoff_max)
+        self._retry_at[service_id] = now + delay
+        self.logger.warning(f"Restarting service {service_id} in {delay:.0f}s: {info.last_error}")
+
+    def _restart(self, service_id, now):
+        self._restarts.setdefault(service_id, deque()).append(now)
+        self._progress.pop(service_id, None)
+        if self.service_manager.recover(service_id):
+            RESTARTS.labels(service_id, 'started').inc()
+        else:
+            RESTARTS.labels(service_id, 'failed').inc()
+
+    def _forget(self, service_id):
+        # A service started again by hand gets a fresh restart budget
+        self._retry_at.pop(service_id, None)
+        self._progress.pop(service_id, None)
+        self._restarts.pop(service_id, None)
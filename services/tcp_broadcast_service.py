@@ -0,0 +1,167 @@
+import json
+import socket
+import threading
+from datetime import datetime
+
+from core.broadcast import Broadcaster
+from core.metrics import REGISTRY
+
+CLIENTS = REGISTRY.gauge('tcp_broadcast_clients', 'Connected raw TCP weight clients')
+ACCEPTED = REGISTRY.counter('tcp_broadcast_connections_total', 'Raw TCP weight clients accepted or refused', ['result'])
+
+# Named frame formats; any other value of tcp_broadcast_format is used as
+# a str.format template with the fields documented on TcpBroadcastService
+FRAME_FORMATS = {
+    # Common "continuous output" style: ST,GS,+0001234.5kg
+    'ascii': '{status},GS,{weight:+010.1f}kg\r\n',
+    # Fixed width weight only, for simple remote displays
+    'display': '{weight:8.1f}\r\n',
+    'json': '{json}\n',
+}
+
+
+class TcpBroadcastService:
+    """
+    Pushes every weight sample as a text frame to raw TCP clients.
+
+    For PLCs and remote displays that expect a continuous weight string
+    instead of HTTP. The frame is built once per sample and fanned out by
+    a Broadcaster, which serves all connections from a single thread with
+    non-blocking writes; a client that cannot keep up is only ever sent
+    the newest frame, and one that stops reading is dropped. Clients only
+    receive; anything they send is discarded.
+
+    ``tcp_broadcast_format`` is 'ascii', 'display', 'json' or a template
+    with the fields ``weight``, ``status`` ('ST' or 'US'), ``stable``
+    (1 or 0), ``seq``, ``device`` (-1 for none), ``time`` (HH:MM:SS) and
+    ``json``, e.g. ``'{seq};{weight:.2f};{stable}\\r\\n'``.
+    """
+
+    def __init__(self, logger, db, config, service_manager=None, host=None, port=None):
+        self.logger = logger
+        self.db = db
+        self.config = config
+        self.service_manager = service_manager
+        self.host = host or self.config.get('tcp_broadcast_host', '0.0.0.0')
+        self.port = port or self.config.get('tcp_broadcast_port', 5300)
+        self.device_id = self.config.get('tcp_broadcast_device_id')
+        fmt = self.config.get('tcp_broadcast_format', 'ascii')
+        self.template = FRAME_FORMATS.get(fmt, fmt)
+        self.encoding = self.config.get('tcp_broadcast_encoding', 'ascii')
+        self.broadcaster = Broadcaster(
+            'tcp-broadcast',
+            encode=self._encode,
+            max_subscribers=self.config.get('tcp_broadcast_max_clients', 500),
+            stall_timeout=self.config.get('tcp_broadcast_stall_s', 10.0),
+            # No heartbeat bytes (they would corrupt the stream); the
+            # interval only paces the sweep for stalled clients
+            heartbeat_interval=1.0,
+            logger=self.logger
+        )
+        self._listener = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Bind the listening socket and start accepting clients"""
+        if self._thread and self._thread.is_alive():
+            self.logger.warning("TCP broadcast service is already running")
+            return
+        # Fail on a bad template now rather than on the first sample
+        self._format(1, 0.0, True, None, 0.0)
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            listener.bind((self.host, self.port))
+            listener.listen(64)
+        except OSError:
+            listener.close()
+            raise
+        # Lets the accept loop notice stop() without a wake-up connection
+        listener.settimeout(1.0)
+        self._listener = listener
+        self._stop_event.clear()
+        self.broadcaster.start()
+        CLIENTS.set_function(lambda: self.broadcaster.subscriber_count)
+        self._thread = threading.Thread(target=self._accept_loop, name='tcp-broadcast-accept', daemon=True)
+        self._thread.start()
+        if self.service_manager:
+            self.service_manager.events.subscribe('sample', self._on_sample)
+        self.logger.info(f"TCP weight broadcast listening on {self.host}:{self.port}")
+
+    def stop(self):
+        """Stop accepting and disconnect all clients"""
+        if self.service_manager:
+            self.service_manager.events.unsubscribe('sample', self._on_sample)
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        if self._listener:
+            self._listener.close()
+            self._listener = None
+        self.broadcaster.stop()
+        self.logger.info("TCP weight broadcast stopped")
+
+    def is_alive(self):
+        """Check if the service is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def client_count(self):
+        return self.broadcaster.subscriber_count
+
+    def _on_sample(self, sample):
+        if self.device_id is None or sample.device_id == self.device_id:
+            self.broadcaster.publish(sample)
+
+    def _accept_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                sock, address = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if not self._stop_event.is_set():
+                    self.logger.error(f"TCP broadcast accept failed: {str(e)}")
+                    self._stop_event.wait(1.0)
+                continue
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # Start the client off with the current weight rather than
+            # leaving its display blank until the next sample
+            latest = self.broadcaster.latest_frame()
+            try:
+                if latest:
+                    sock.settimeout(1.0)
+                    sock.sendall(latest)
+            except OSError:
+                sock.close()
+                continue
+            if self.broadcaster.add_socket(sock):
+                ACCEPTED.labels('accepted').inc()
+            else:
+                ACCEPTED.labels('refused').inc()
+                self.logger.warning(f"TCP broadcast full, refused {address[0]}")
+                sock.close()
+
+    def _encode(self, sample):
+        return self._format(
+            sample.seq, sample.weight_kg, sample.is_stable, sample.device_id, sample.timestamp
+        ).encode(self.encoding, errors='replace')
+
+    def _format(self, seq, weight_kg, is_stable, device_id, timestamp):
+        fields = {
+            'weight': weight_kg,
+            'status': 'ST' if is_stable else 'US',
+            'stable': 1 if is_stable else 0,
+            'seq': seq,
+            'device': -1 if device_id is None else device_id,
+            'time': datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')
+        }
+        if '{json' in self.template:
+            fields['json'] = json.dumps({
+                'seq': seq, 'weight_kg': weight_kg, 'is_stable': is_stable,
+                'device_id': device_id, 'timestamp': timestamp
+            }, separators=(',', ':'))
+        return self.template.format(**fields)
@@ -0,0 +1,386 @@
+import hashlib
+import hmac
+import http.client
+import json
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import urlsplit
+
+from core.metrics import REGISTRY
+from core.weighing import WeighingDetector
+
+DELIVERIES = REGISTRY.counter('webhook_deliveries_total', 'Webhook delivery attempts by outcome', ['subscription', 'result'])
+DELIVERY_SECONDS = REGISTRY.histogram('webhook_delivery_seconds', 'Webhook request latency', ['subscription'])
+QUEUE_DEPTH = REGISTRY.gauge('webhook_queue_depth', 'Events waiting per webhook subscription', ['subscription'])
+DROPPED = REGISTRY.counter('webhook_events_dropped_total', 'Events dropped because a subscriber fell behind', ['subscription'])
+
+
+class DeliveryError(Exception):
+    """Raised when a webhook endpoint fails or answers with a non-2xx status."""
+
+
+class _Subscriber:
+    """
+    Delivery state and worker threads of one subscription.
+
+    Events are queued per device. A device with an event in flight is not
+    handed to another worker until that delivery (with its retries) is
+    finished, so each device's events arrive in order while different
+    devices are delivered in parallel, up to ``max_concurrency`` at once.
+    """
+
+    def __init__(self, dispatcher, subscription):
+        self.dispatcher = dispatcher
+        self.subscription = subscription
+        self.id = subscription['id']
+        self.label = str(self.id)
+        self.url = urlsplit(subscription['url'])
+        self.event_types = set(subscription['event_types'])
+        self.device_id = subscription['device_id']
+        self.secret = subscription.get('secret')
+        self.concurrency = max(1, subscription['max_concurrency'])
+        self.queues = {}
+        self.ready = deque()
+        self.in_flight = set()
+        self.depth = 0
+        self.consecutive_failures = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_error = None
+        self.last_latency_ms = None
+        self.cond = threading.Condition()
+        self.stopping = False
+        self.stop_event = threading.Event()
+        self.threads = []
+        self._delivered = DELIVERIES.labels(self.label, 'delivered')
+        self._retried = DELIVERIES.labels(self.label, 'retried')
+        self._failed = DELIVERIES.labels(self.label, 'failed')
+        self._dropped = DROPPED.labels(self.label)
+        self._latency = DELIVERY_SECONDS.labels(self.label)
+        QUEUE_DEPTH.labels(self.label).set_function(lambda: self.depth)
+
+    def wants(self, event_type, device_id):
+        return ((not self.event_types or event_type in self.event_types) and
+                (self.device_id is None or self.device_id == device_id))
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._work, name=f'webhook-{self.id}-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, remove_metrics=True):
+        """
+        Args:
+            remove_metrics: Drop this subscription's metric series; False
+                            when a replacement with the same id keeps them
+        """
+        self.stop_event.set()
+        with self.cond:
+            self.stopping = True
+            self.queues.clear()
+            self.ready.clear()
+            self.depth = 0
+            self.cond.notify_all()
+        if remove_metrics:
+            for result in ('delivered', 'retried', 'failed'):
+                DELIVERIES.remove(self.label, result)
+            DROPPED.remove(self.label)
+            DELIVERY_SECONDS.remove(self.label)
+            QUEUE_DEPTH.remove(self.label)
+
+    def join(self, timeout):
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def offer(self, device_id, event):
+        """Queue an event; called on the publishing thread, never blocks"""
+        with self.cond:
+            if self.stopping:
+                return
+            if self.depth and self.depth >= self.dispatcher.max_queue:
+                # Behind by too much: lose the oldest event of this device,
+                # or of the longest backlog if this one has none queued,
+                # rather than grow without bound
+                if device_id not in self.queues:
+                    device_id_to_trim = max(self.queues, key=lambda d: len(self.queues[d]))
+                else:
+                    device_id_to_trim = device_id
+                self._drop_oldest(device_id_to_trim)
+            queue = self.queues.get(device_id)
+            if queue is None:
+                queue = self.queues[device_id] = deque()
+                if device_id not in self.in_flight:
+                    self.ready.append(device_id)
+            queue.append(event)
+            self.depth += 1
+            self.cond.notify()
+
+    def _drop_oldest(self, device_id):
+        queue = self.queues[device_id]
+        queue.popleft()
+        if not queue:
+            del self.queues[device_id]
+            if device_id in self.ready:
+                self.ready.remove(device_id)
+        self.depth -= 1
+        self.dropped += 1
+        self._dropped.inc()
+
+    def snapshot(self):
+        return {
+            'queued': self.depth,
+            'in_flight': len(self.in_flight),
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'last_latency_ms': self.last_latency_ms
+        }
+
+    def _take(self):
+        with self.cond:
+            while not self.ready and not self.stopping:
+                self.cond.wait()
+            if self.stopping:
+                return None, None
+            device_id = self.ready.popleft()
+            queue = self.queues[device_id]
+            event = queue.popleft()
+            self.depth -= 1
+            if not queue:
+                del self.queues[device_id]
+            self.in_flight.add(device_id)
+            return device_id, event
+
+    def _release(self, device_id):
+        with self.cond:
+            self.in_flight.discard(device_id)
+            if device_id in self.queues:
+                self.ready.append(device_id)
+                self.cond.notify()
+
+    def _work(self):
+        conn = None
+        while True:
+            device_id, event = self._take()
+            if event is None:
+                break
+            try:
+                conn = self._deliver_with_retries(conn, event)
+            finally:
+                self._release(device_id)
+        if conn is not None:
+            conn.close()
+
+    def _deliver_with_retries(self, conn, event):
+        dispatcher = self.dispatcher
+        body = event['body']
+        for attempt in range(1, dispatcher.max_attempts + 1):
+            started = time.perf_counter()
+            try:
+                conn = self._post(conn, body, event)
+            except (OSError, http.client.HTTPException, DeliveryError) as e:
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                self.last_error = str(e)
+                if attempt < dispatcher.max_attempts:
+                    self._retried.inc()
+                    # Retries hold this device's slot, which keeps its
+                    # events in order; other devices carry on
+                    if self.stop_event.wait(min(dispatcher.retry_base_s * 2 ** (attempt - 1), 60)):
+                        return conn
+                    continue
+                self.failed += 1
+                self._failed.inc()
+                self.consecutive_failures += 1
+                dispatcher.on_failure(self)
+                return conn
+            elapsed = time.perf_counter() - started
+            self._latency.observe(elapsed)
+            self.last_latency_ms = round(elapsed * 1000, 1)
+            self.delivered += 1
+            self._delivered.inc()
+            self.consecutive_failures = 0
+            return conn
+        return conn
+
+    def _post(self, conn, body, event):
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+            conn = conn_class(self.url.netloc, timeout=self.dispatcher.timeout)
+            conn.connect()
+            conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Webhook-Event': event['type'],
+            'X-Webhook-Id': event['event_id']
+        }
+        if self.secret:
+            signature = hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            headers['X-Webhook-Signature'] = f'sha256={signature}'
+        path = (self.url.path or '/') + (f'?{self.url.query}' if self.url.query else '')
+        conn.request('POST', path, body=body, headers=headers)
+        response = conn.getresponse()
+        payload = response.read()
+        if not 200 <= response.status < 300:
+            conn.close()
+            raise DeliveryError(f"HTTP {response.status}: {payload[:200]!r}")
+        if response.getheader('Connection', '').lower() == 'close':
+            conn.close()
+            return None
+        return conn
+
+
+class WebhookService:
+    """
+    Delivers weighing events to the webhook subscriptions stored in the DB.
+
+    Each subscription gets its own queue and worker threads, so a slow or
+    dead endpoint only ever delays itself. The acquisition thread runs the
+    WeighingDetector and appends each event to the queues of interested
+    subscribers; it never waits on the network. Deliveries time out after
+    ``webhook_timeout_s`` and are retried with exponential backoff up to
+    ``webhook_max_attempts`` times. A subscription whose last
+    ``webhook_disable_after`` events all failed is disabled in the DB.
+    The registry is reloaded on the 'webhooks_changed' event.
+
+    Request body: the event as JSON, e.g.
+    ``{"event_id": "...", "type": "weight.stable", "created": ..., "device_id": null,
+    "weight_kg": 1234.5, "timestamp": ..., "seq": 42}``, with headers
+    ``X-Webhook-Event``, ``X-Webhook-Id`` and, when the subscription has a
+    secret, ``X-Webhook-Signature: sha256=<hex HMAC of the body>``.
+    """
+
+    def __init__(self, logger, db, config, service_manager=None):
+        self.logger = logger
+        self.db = db
+        self.config = config
+        self.service_manager = service_manager
+        self.timeout = self.config.get('webhook_timeout_s', 5.0)
+        self.max_attempts = self.config.get('webhook_max_attempts', 5)
+        self.retry_base_s = self.config.get('webhook_retry_base_s', 1.0)
+        self.disable_after = self.config.get('webhook_disable_after', 10)
+        self.max_queue = self.config.get('webhook_max_queue', 1000)
+        self.detector = WeighingDetector(self.config.get('webhook_min_weight_kg', 0.0))
+        # Copy-on-write tuple, read without a lock on the acquisition path
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        """Load subscriptions and start delivering"""
+        if self._running:
+            self.logger.warning("Webhook service is already running")
+            return
+        self._running = True
+        self.reload()
+        if self.service_manager:
+            self.service_manager.events.subscribe('sample', self._on_sample)
+            self.service_manager.events.subscribe('webhooks_changed', self._on_changed)
+        self.logger.info(f"Webhook service started with {len(self._subscribers)} subscriptions")
+
+    def stop(self):
+        """Stop delivering; queued events are dropped"""
+        if self.service_manager:
+            self.service_manager.events.unsubscribe('sample', self._on_sample)
+            self.service_manager.events.unsubscribe('webhooks_changed', self._on_changed)
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, ()
+            self._running = False
+        for sub in subscribers:
+            sub.stop()
+        for sub in subscribers:
+            sub.join(self.timeout + 1)
+        self.logger.info("Webhook service stopped")
+
+    def is_alive(self):
+        """Check if the service is running"""
+        return self._running
+
+    def reload(self):
+        """Apply the subscriptions in the DB, keeping unchanged ones running"""
+        subscriptions = self.db.list_webhooks(enabled_only=True, include_secret=True)
+        with self._lock:
+            if not self._running:
+                return
+            current = {sub.id: sub for sub in self._subscribers}
+            kept, started, replaced = [], [], []
+            for subscription in subscriptions:
+                sub = current.pop(subscription['id'], None)
+                if sub is not None and sub.subscription == subscription:
+                    kept.append(sub)
+                    continue
+                new = _Subscriber(self, subscription)
+                if sub is not None:
+                    # Starts once the old instance is gone; until then it
+                    # only queues
+                    replaced.append((sub, new))
+                else:
+                    new.start()
+                started.append(new)
+            self._subscribers = tuple(kept + started)
+            removed = list(current.values())
+        for sub in removed:
+            sub.stop()
+        for sub, new in replaced:
+            # The new instance carries on the same series. Its workers wait
+            # for the old ones to finish their in-flight deliveries, so a
+            # device's events are never sent by both at once
+            sub.stop(remove_metrics=False)
+            sub.join(self.timeout + 1)
+            if any(thread.is_alive() for thread in sub.threads):
+                self.logger.warning(f"Webhook {sub.id} is still delivering after the reload, starting anyway")
+            new.start()
+
+    def stats(self):
+        """Delivery counters per subscription id"""
+        return {sub.id: sub.snapshot() for sub in self._subscribers}
+
+    def on_failure(self, sub):
+        """Called by a worker after an event exhausted its retries"""
+        if sub.consecutive_failures < self.disable_after:
+            self.logger.warning(f"Webhook {sub.id} failed to deliver an event: {sub.last_error}")
+            return
+        reason = f"Disabled after {sub.consecutive_failures} consecutive failed events: {sub.last_error}"
+        self.logger.error(f"Webhook {sub.id} ({sub.url.netloc}): {reason}")
+        try:
+            self.db.update_webhook(sub.id, enabled=False, disabled_reason=reason)
+        except Exception as e:
+            self.logger.error(f"Could not disable webhook {sub.id}: {str(e)}")
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not sub)
+        sub.stop()
+
+    def _on_sample(self, sample):
+        events = self.detector.feed(sample)
+        if not events:
+            return
+        subscribers = self._subscribers
+        for event_type, data in events:
+            event = None
+            for sub in subscribers:
+                if not sub.wants(event_type, sample.device_id):
+                    continue
+                if event is None:
+                    event = self._encode(event_type, data)
+                sub.offer(sample.device_id, event)
+
+    def _on_changed(self, _):
+        self.reload()
+
+    @staticmethod
+    def _encode(event_type, data):
+        event_id = uuid.uuid4().hex
+        body = json.dumps(
+            {'event_id': event_id, 'type': event_type, 'created': time.time(), **data},
+            separators=(',', ':')
+        ).encode('utf-8')
+        return {'event_id': event_id, 'type': event_type, 'body': body}
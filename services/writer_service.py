@@ -0,0 +1,160 @@
+import os
+import time
+from threading import Thread, Event
+from queue import Queue, Empty
+
+from core.journal import SampleJournal
+from core.metrics import REGISTRY
+from core.tracing import TRACER, COMMITTED
+
+QUEUE_DEPTH = REGISTRY.gauge('writer_queue_depth', 'Samples journaled but not yet committed')
+
+class WriterService:
+    """
+    Persists weight samples published by the serial service.
+
+    Each sample is appended to a crash-safe mmap journal on the publishing
+    thread (a memcpy, no fsync), then committed to the database in batches
+    by a background thread. The journal checkpoint is advanced in the same
+    transaction as each batch, so samples are applied exactly once even if
+    the process dies between the two; on start the journal is replayed
+    from the last checkpoint.
+    """
+
+    def __init__(self, logger, db, config, service_manager=None):
+        self.logger = logger
+        self.db = db
+        self.config = config
+        self.service_manager = service_manager
+        self.journal_dir = self.config.get('journal_dir', 'journal')
+        self.segment_size = self.config.get('journal_segment_size', 4 * 1024 * 1024)
+        self.sync_interval = self.config.get('journal_sync_ms', 100) / 1000.0
+        self.batch_interval = self.config.get('writer_batch_ms', 250) / 1000.0
+        self.batch_size = self.config.get('writer_batch_size', 500)
+        self.journal = None
+        self.rows_written = 0
+        self._heartbeat = time.monotonic()
+        self._queue = Queue()
+        self._stop_event = Event()
+        self._thread = None
+
+    def start(self):
+        """Open the journal, replay unapplied samples and start the writer thread"""
+        if self._thread and self._thread.is_alive():
+            self.logger.warning("Writer service is already running")
+            return
+
+        missing = self.db.missing_columns('readings')
+        if missing:
+            # Every batch would fail and be retried forever while samples
+            # pile up in the journal; refuse to start instead
+            raise RuntimeError(f"readings table is missing columns {', '.join(missing)}; the database needs migrating")
+        applied_seq = self.db.journal_applied_seq()
+        self.journal = SampleJournal(
+            os.path.abspath(self.journal_dir),
+            segment_size=self.segment_size,
+            sync_interval=self.sync_interval,
+            min_seq=applied_seq
+        )
+        replayed = self._replay(applied_seq)
+        if replayed:
+            self.logger.info(f"Replayed {replayed} journaled samples into the database")
+
+        QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+        if self.service_manager:
+            self.service_manager.events.subscribe('sample', self.submit)
+        self.logger.info("Writer service started")
+
+    def stop(self):
+        """Stop accepting samples, flush what is queued and close the journal"""
+        if self.service_manager:
+            self.service_manager.events.unsubscribe('sample', self.submit)
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+            if self._thread.is_alive():
+                # Still inside a database call; it needs the journal to finish
+                self.logger.warning("Writer thread is still busy, leaving the journal open")
+                return
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        self.logger.info("Writer service stopped")
+
+    def submit(self, sample):
+        """Journal a sample and queue it for the next database batch"""
+        journal = self.journal
+        if journal is None:
+            return
+        seq = journal.append(sample.weight_kg, sample.is_stable, sample.timestamp, sample.device_id)
+        self._queue.put((seq, (sample.timestamp, sample.weight_kg, sample.is_stable, sample.device_id), sample.seq))
+
+    def is_alive(self):
+        """Check if the service is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def health(self):
+        """Heartbeat and progress for the supervisor"""
+        return {'heartbeat': self._heartbeat, 'progress': self.rows_written, 'stall_after': None}
+
+    def _replay(self, applied_seq):
+        batch, last_seq, total = [], applied_seq, 0
+        for seq, timestamp, weight_kg, is_stable, device_id in self.journal.replay(applied_seq):
+            batch.append((timestamp, weight_kg, is_stable, device_id))
+            last_seq = seq
+            if len(batch) >= self.batch_size:
+                self.db.insert_readings(batch, journal_seq=last_seq)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.db.insert_readings(batch, journal_seq=last_seq)
+            total += len(batch)
+        self.journal.release(last_seq)
+        return total
+
+    def _run(self):
+        """Drain the queue into batched transactions"""
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            self._heartbeat = time.monotonic()
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            last_seq = batch[-1][0]
+            rows = [row for _, row, _ in batch]
+            while True:
+                try:
+                    # A slow commit (lock wait, busy disk) is not a hang
+                    self._heartbeat = time.monotonic()
+                    self.db.insert_readings(rows, journal_seq=last_seq)
+                    self._heartbeat = time.monotonic()
+                    TRACER.mark_many([sample_seq for _, _, sample_seq in batch], COMMITTED)
+                    self.rows_written += len(rows)
+                    break
+                except Exception as e:
+                    # Still alive, just failing; a restart would not help
+                    self._heartbeat = time.monotonic()
+                    self.logger.error(f"Failed to write {len(rows)} readings, retrying: {str(e)}")
+                    # On shutdown the batch stays in the journal and is
+                    # replayed on the next start.
+                    if self._stop_event.wait(1.0):
+                        return
+            try:
+                self.journal.release(last_seq)
+            except OSError as e:
+                self.logger.warning(f"Could not release journal segments: {str(e)}")
+
+    def _collect_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except Empty:
+                break
+        return batch
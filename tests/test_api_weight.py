@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+import unittest
+
+from core.events import EventBus
+from services.api_service import ApiService
+from services.serial_service import SerialService
+
+
+class FakeLogger:
+    def __getattr__(self, level):
+        return lambda message, **kwargs: None
+
+
+class FakeReader(SerialService):
+    """Serial service fed by hand instead of from a port."""
+
+    def is_alive(self):
+        return True
+
+
+class FakeManager:
+    def __init__(self):
+        self.events = EventBus()
+        self.serial = FakeReader(FakeLogger(), None, {'stable_window': 2}, service_manager=self)
+
+    def get_service(self, service_id):
+        return self.serial if service_id == 'serial' else None
+
+
+class WeightEndpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = FakeManager()
+        self.api = ApiService(logging.getLogger('test'), config={'api_rate_limit': 1000.0, 'api_rate_burst': 1000},
+                              service_manager=self.manager)
+        self.manager.events.subscribe('sample', self.api._on_sample)
+        self.client = self.api.app.test_client()
+
+    def feed(self, *weights):
+        for weight in weights:
+            self.manager.serial._process_reading(str(weight))
+
+    def test_identical_stable_frames_keep_the_etag(self):
+        self.feed(1000.0, 1000.0)
+        first = self.client.get('/api/weight')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.get_json()['weight_kg'], 1000.0)
+        etag = first.headers['ETag']
+
+        self.feed(1000.0, 1000.0, 1000.0)
+        response = self.client.get('/api/weight', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+        self.feed(1040.0, 1040.0)
+        response = self.client.get('/api/weight', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['weight_kg'], 1040.0)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_settling_again_is_a_new_reading(self):
+        self.feed(1000.0, 1000.0)
+        etag = self.client.get('/api/weight').headers['ETag']
+        self.feed(1500.0, 1000.0, 1000.0)
+        response = self.client.get('/api/weight', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_long_poll_waits_through_identical_frames(self):
+        self.feed(1000.0, 1000.0)
+        version = self.client.get('/api/weight').get_json()['version']
+        result = {}
+
+        def poll():
+            started = time.monotonic()
+            response = self.client.get(f'/api/weight?since={version}&wait=5')
+            result.update(elapsed=time.monotonic() - started, body=response.get_json())
+
+        poller = threading.Thread(target=poll)
+        poller.start()
+        for _ in range(5):
+            time.sleep(0.05)
+            self.feed(1000.0)
+        self.assertTrue(poller.is_alive())
+
+        self.feed(1040.0, 1040.0)
+        poller.join(2.0)
+        self.assertFalse(poller.is_alive())
+        self.assertEqual(result['body']['weight_kg'], 1040.0)
+        self.assertEqual(result['body']['version'], version + 1)
+        self.assertLess(result['elapsed'], 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
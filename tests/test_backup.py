@@ -0,0 +1,81 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from core.backup import BackupError, DatabaseBackup
+from core.db import Database
+from tests.test_db_migration import LEGACY_SCHEMA
+
+CURRENT_TABLES = (
+    'readings', 'logs', 'journal_checkpoint', 'replication_state',
+    'reading_rollups', 'forward_outbox', 'webhook_subscriptions'
+)
+
+
+class RestoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'live.db')
+        self.db = Database(f'sqlite:///{self.path}')
+        self.db.insert_readings([(1763847600.0 + i, 100.0 + i, True, 1) for i in range(5)])
+        self.backup = DatabaseBackup(self.path, backup_dir=os.path.join(self.directory, 'backups'))
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def make_file(self, name, script, rows=()):
+        path = os.path.join(self.directory, name)
+        conn = sqlite3.connect(path)
+        conn.executescript(script)
+        conn.executemany('INSERT INTO readings (timestamp, raw, stable) VALUES (?, ?, ?)', rows)
+        conn.commit()
+        conn.close()
+        return path
+
+    def tables(self):
+        with self.db.engine.connect() as conn:
+            return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    def test_restore_round_trip(self):
+        backup_path = self.backup.create()
+        self.db.insert_readings([(1763847700.0, 999.0, True, 1)])
+        self.backup.restore(self.db, backup_path)
+        self.assertEqual(len(self.db.search_readings(limit=10)), 5)
+        self.assertTrue(set(CURRENT_TABLES) <= self.tables())
+
+    def test_restore_legacy_backup_builds_the_current_schema(self):
+        backup_path = self.make_file(
+            'legacy.db', LEGACY_SCHEMA,
+            [('2025-11-22 21:38:53', 1001.5, 0), ('2025-11-22 21:38:54', 1002.0, 1)]
+        )
+        self.backup.restore(self.db, backup_path)
+
+        self.assertTrue(set(CURRENT_TABLES) <= self.tables())
+        self.assertEqual(self.db.missing_columns('readings'), [])
+        readings = self.db.search_readings(limit=10)
+        self.assertEqual([(r['weight_kg'], r['is_stable']) for r in readings], [(1001.5, False), (1002.0, True)])
+        # Ids handed out before the restore stay reserved
+        self.db.insert_readings([(1763847700.0, 1500.0, True, 1)])
+        self.assertEqual(self.db.search_readings(limit=1, descending=True)[0]['id'], 6)
+        with self.db.engine.connect() as conn:
+            self.assertEqual(conn.execute('SELECT sum(count) FROM reading_rollups WHERE resolution = 60').scalar(), 3)
+        self.assertFalse(os.path.exists(self.path + '.restore'))
+
+    def test_unusable_backup_is_rejected_before_the_swap(self):
+        backup_path = self.make_file(
+            'foreign.db', 'CREATE TABLE readings (id INTEGER PRIMARY KEY, timestamp TEXT, raw REAL, stable INTEGER, '
+                          'weight_kg TEXT);'
+        )
+        with self.assertRaises(BackupError):
+            self.backup.restore(self.db, backup_path)
+        self.assertEqual(len(self.db.search_readings(limit=10)), 5)
+        for suffix in ('', '-wal', '-shm'):
+            self.assertFalse(os.path.exists(self.path + '.restore' + suffix))
+
+
+if __name__ == '__main__':
+    unittest.main()
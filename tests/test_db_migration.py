@@ -0,0 +1,99 @@
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from core.db import Database
+from services.writer_service import WriterService
+
+LEGACY_SCHEMA = """
+    CREATE TABLE readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        raw REAL,
+        stable INTEGER
+    );
+    CREATE TABLE logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        level TEXT,
+        message TEXT
+    );
+"""
+
+
+class LegacySchemaTest(unittest.TestCase):
+    """Databases written by the first releases must open and accept new readings."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'legacy.db')
+        conn = sqlite3.connect(self.path)
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany(
+            'INSERT INTO readings (timestamp, raw, stable) VALUES (?, ?, ?)',
+            [('2025-11-22 21:38:53', 1001.5, 0), ('2025-11-22 21:38:54', 1002.0, 1), ('2025-11-22 21:38:55', None, 1)]
+        )
+        conn.execute("INSERT INTO logs (timestamp, level, message) VALUES ('2025-11-22 21:38:53', 'INFO', 'Service started')")
+        # The newest reading was deleted; its id must not come back
+        conn.execute("UPDATE sqlite_sequence SET seq = 10 WHERE name = 'readings'")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_readings_are_migrated(self):
+        db = Database(f'sqlite:///{self.path}')
+        self.assertEqual(db.missing_columns('readings'), [])
+        readings = db.search_readings(limit=10)
+        self.assertEqual([(r['id'], r['weight_kg'], r['is_stable']) for r in readings],
+                         [(1, 1001.5, False), (2, 1002.0, True)])
+        self.assertEqual(db.last_stable_reading()[1], 1002.0)
+        db.insert_readings([(1763847600.0, 1500.0, True, 3)])
+        newest = db.search_readings(limit=1, descending=True)[0]
+        self.assertEqual((newest['id'], newest['device_id']), (11, 3))
+        self.assertEqual(db.search_logs(limit=10)[0]['message'], 'Service started')
+
+    def test_indexes_and_rollups_are_built(self):
+        Database(f'sqlite:///{self.path}')
+        conn = sqlite3.connect(self.path)
+        try:
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            rollups = conn.execute('SELECT sum(count) FROM reading_rollups WHERE resolution = 60').fetchone()[0]
+        finally:
+            conn.close()
+        self.assertIn('ix_readings_device_timestamp', indexes)
+        self.assertEqual(rollups, 2)
+
+    def test_migration_runs_once(self):
+        Database(f'sqlite:///{self.path}')
+        db = Database(f'sqlite:///{self.path}')
+        self.assertEqual(len(db.search_readings(limit=10)), 2)
+
+    def test_shipped_database_opens(self):
+        shipped = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'weighbridge_local.db')
+        if not os.path.exists(shipped):
+            self.skipTest('weighbridge_local.db is not present')
+        copy = os.path.join(self.directory, 'shipped.db')
+        shutil.copyfile(shipped, copy)
+        db = Database(f'sqlite:///{copy}')
+        self.assertEqual(db.missing_columns('readings'), [])
+        self.assertEqual(db.missing_columns('logs'), [])
+
+    def test_writer_refuses_an_unmigrated_table(self):
+        db = Database(f'sqlite:///{os.path.join(self.directory, "new.db")}')
+        with db.engine.begin() as conn:
+            conn.execute('DROP INDEX ix_readings_device_timestamp')
+            conn.execute('ALTER TABLE readings DROP COLUMN device_id')
+        writer = WriterService(logging.getLogger('test'), db, {'journal_dir': os.path.join(self.directory, 'journal')})
+        with self.assertRaises(RuntimeError) as raised:
+            writer.start()
+        self.assertIn('device_id', str(raised.exception))
+        self.assertFalse(writer.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import deque
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from core.db import Database
+from services.forward_receiver import create_forward_receiver_app
+from services.forwarder_service import ForwardError, ForwarderService
+
+SITE = 'site-a'
+
+
+class KeepAliveQuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class ScriptedEndpoint:
+    """
+    The forward receiver behind a middleware that records every request and
+    can answer the next ones with scripted failures.
+
+    Each script entry is (status, headers, deliver); with ``deliver`` the
+    batch reaches the receiver first and only the response is replaced, as
+    when a response is lost on the way back.
+    """
+
+    def __init__(self):
+        self.app = create_forward_receiver_app()
+        self.store = self.app.config['store']
+        self.script = deque()
+        self.requests = []
+        self.server = make_server('127.0.0.1', 0, self, threaded=True, request_handler=KeepAliveQuietHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}/events'
+
+    def __call__(self, environ, start_response):
+        self.requests.append((time.monotonic(), environ.get('HTTP_IDEMPOTENCY_KEY')))
+        if not self.script:
+            return self.app(environ, start_response)
+        status, headers, deliver = self.script.popleft()
+        if deliver:
+            b''.join(self.app(environ, lambda *args: None))
+        else:
+            environ['wsgi.input'].read(int(environ.get('CONTENT_LENGTH') or 0))
+        body = b'{"status":"error"}'
+        start_response(f'{status} Scripted', [('Content-Type', 'application/json'),
+                                               ('Content-Length', str(len(body)))] + list(headers))
+        return [body]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ForwarderEndToEndTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger('test.forwarder').disabled = True
+        self.directory = tempfile.mkdtemp()
+        self.db = Database(f"sqlite:///{os.path.join(self.directory, 'site.db')}")
+        self.endpoint = ScriptedEndpoint()
+        self.service = ForwarderService(logging.getLogger('test.forwarder'), self.db, {
+            'api_endpoint': self.endpoint.url,
+            'site_id': SITE,
+            'forward_batch_size': 2,
+            'forward_interval_s': 0.05
+        })
+
+    def tearDown(self):
+        self.service.stop()
+        self.endpoint.stop()
+        self.db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def queue(self, count):
+        for i in range(count):
+            self.service._queue_event('weight.stable', {'device_id': None, 'weight_kg': 1000.0 + i})
+        self.service._persist_pending()
+
+    def keys(self):
+        return [key for _, key in self.endpoint.requests]
+
+    def wait_for(self, condition, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertTrue(condition())
+
+    def test_batches_carry_idempotency_keys(self):
+        self.queue(5)
+        self.assertEqual([self.service._send_batch() for _ in range(4)], [2, 2, 1, 0])
+        self.assertEqual(self.keys(), [f'{SITE}-1-2', f'{SITE}-3-4', f'{SITE}-5-5'])
+        self.assertEqual(self.endpoint.store.stats()['events'], 5)
+        self.assertEqual(self.db.outbox_counts(), (0, 0))
+
+    def test_batch_resent_after_a_lost_response_is_deduplicated(self):
+        self.queue(2)
+        self.endpoint.script.append((503, (), True))
+        with self.assertRaises(ForwardError):
+            self.service._send_batch()
+        self.assertEqual(self.db.outbox_counts(), (2, 0))
+        self.service._close()
+        self.assertEqual(self.service._send_batch(), 2)
+
+        self.assertEqual(self.keys(), [f'{SITE}-1-2', f'{SITE}-1-2'])
+        stats = self.endpoint.store.stats()
+        self.assertEqual((stats['events'], stats['batches'], stats['duplicate_batches']), (2, 1, 1))
+        self.assertEqual(self.db.outbox_counts(), (0, 0))
+
+    def test_retries_with_backoff_after_5xx_and_429(self):
+        self.queue(2)
+        self.endpoint.script.extend([(503, [('Retry-After', '1')], False), (429, (), False)])
+        self.service.start()
+        self.wait_for(lambda: self.endpoint.store.stats()['events'] == 2)
+
+        times = [at for at, _ in self.endpoint.requests]
+        self.assertEqual(self.keys(), [f'{SITE}-1-2'] * 3)
+        # One second after the 503, then doubled after the 429
+        self.assertGreaterEqual(times[1] - times[0], 0.9)
+        self.assertGreaterEqual(times[2] - times[1], 1.9)
+        self.wait_for(lambda: self.db.outbox_counts() == (0, 0))
+
+    def test_other_4xx_marks_the_batch_dead(self):
+        self.queue(3)
+        self.endpoint.script.append((400, (), False))
+        self.assertEqual(self.service._send_batch(), 2)
+        self.assertEqual(self.db.outbox_counts(), (1, 2))
+        # The rest goes out and the dead events are never resent
+        self.assertEqual(self.service._send_batch(), 1)
+        self.assertEqual(self.service._send_batch(), 0)
+        self.assertEqual(self.keys(), [f'{SITE}-1-2', f'{SITE}-3-3'])
+        self.assertEqual(self.endpoint.store.stats()['events'], 1)
+        self.assertEqual(self.db.outbox_counts(), (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
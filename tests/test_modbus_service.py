@@ -0,0 +1,194 @@
+import logging
+import socket
+import struct
+import time
+import unittest
+
+from core.events import EventBus
+from core.sample import WeightSample
+from services import modbus_service as modbus
+from services.modbus_service import ModbusService
+
+
+class FakeSerial:
+    def __init__(self):
+        self.commands = []
+        self.fail = False
+
+    def send_command(self, command):
+        if self.fail:
+            raise OSError("port closed")
+        self.commands.append(command)
+
+
+class FakeManager:
+    def __init__(self):
+        self.events = EventBus()
+        self.serial = FakeSerial()
+
+    def get_service(self, service_id):
+        return self.serial if service_id == 'serial' else None
+
+
+class ModbusClient:
+    """Bare Modbus TCP master over a raw socket."""
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(('127.0.0.1', port), timeout=5.0)
+        self.transaction = 0
+
+    def request(self, unit, pdu):
+        self.transaction += 1
+        self.sock.sendall(struct.pack('>HHHB', self.transaction, 0, len(pdu) + 1, unit) + pdu)
+        header = self._recv(7)
+        transaction, protocol, length, response_unit = struct.unpack('>HHHB', header)
+        assert (transaction, protocol, response_unit) == (self.transaction, 0, unit)
+        return self._recv(length - 1)
+
+    def read_registers(self, unit, function, address, count):
+        return self.request(unit, struct.pack('>BHH', function, address, count))
+
+    def _recv(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Server closed the connection")
+            data += chunk
+        return data
+
+    def close(self):
+        self.sock.close()
+
+
+class ModbusServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = FakeManager()
+        self.service = ModbusService(
+            logging.getLogger('test'), None,
+            {'modbus_host': '127.0.0.1', 'modbus_port': 0, 'modbus_unit_id': 1, 'modbus_weight_scale': 10},
+            service_manager=self.manager
+        )
+        self.service.start()
+        self.client = ModbusClient(self.service._server.server_address[1])
+
+    def tearDown(self):
+        self.client.close()
+        self.service.stop()
+
+    def publish(self, weight_kg, is_stable=True, device_id=None, seq=42, timestamp=1700000000.0):
+        self.manager.events.publish('sample', WeightSample(seq, weight_kg, is_stable, timestamp, device_id))
+
+    def assertException(self, response, function, code):
+        self.assertEqual(response, bytes((function | 0x80, code)))
+
+    def test_read_holding_registers(self):
+        self.publish(1234.5)
+        response = self.client.read_registers(1, modbus.READ_HOLDING_REGISTERS, 0, modbus.REGISTER_COUNT)
+        self.assertEqual(response[:2], bytes((modbus.READ_HOLDING_REGISTERS, modbus.REGISTER_COUNT * 2)))
+        weight, scaled, status, stable, seq, timestamp = struct.unpack('>fiHHII', response[2:])
+        self.assertEqual(weight, 1234.5)
+        self.assertEqual(scaled, 12345)
+        self.assertEqual(status, modbus.STATUS_VALID | modbus.STATUS_STABLE | modbus.STATUS_FRESH)
+        self.assertEqual(stable, 1)
+        self.assertEqual(seq, 42)
+        self.assertEqual(timestamp, 1700000000)
+
+    def test_read_input_registers_slice(self):
+        self.publish(-20.0, is_stable=False)
+        response = self.client.read_registers(1, modbus.READ_INPUT_REGISTERS, modbus.REG_WEIGHT_INT, 3)
+        self.assertEqual(response[:2], bytes((modbus.READ_INPUT_REGISTERS, 6)))
+        scaled, status = struct.unpack('>iH', response[2:])
+        self.assertEqual(scaled, -200)
+        self.assertEqual(status, modbus.STATUS_VALID | modbus.STATUS_NEGATIVE | modbus.STATUS_FRESH)
+
+    def test_unit_id_selects_device(self):
+        self.publish(100.0)
+        self.publish(200.0, device_id=7)
+        for unit, expected in ((1, 100.0), (0, 100.0), (255, 100.0), (7, 200.0)):
+            response = self.client.read_registers(unit, modbus.READ_HOLDING_REGISTERS, modbus.REG_WEIGHT_FLOAT, 2)
+            self.assertEqual(struct.unpack('>f', response[2:])[0], expected)
+
+    def test_default_unit_before_first_sample_is_not_valid(self):
+        response = self.client.read_registers(1, modbus.READ_HOLDING_REGISTERS, 0, modbus.REGISTER_COUNT)
+        self.assertEqual(response[2:], bytes(modbus.REGISTER_COUNT * 2))
+
+    def test_stale_sample_loses_fresh_bit(self):
+        self.service.stale_after = 0.05
+        self.publish(10.0)
+        time.sleep(0.1)
+        response = self.client.read_registers(1, modbus.READ_HOLDING_REGISTERS, modbus.REG_STATUS, 1)
+        self.assertEqual(struct.unpack('>H', response[2:])[0], modbus.STATUS_VALID | modbus.STATUS_STABLE)
+
+    def test_write_single_coil_sends_command(self):
+        self.publish(10.0)
+        request = struct.pack('>BHH', modbus.WRITE_SINGLE_COIL, 0, 0xFF00)
+        self.assertEqual(self.client.request(1, request), request)
+        request = struct.pack('>BHH', modbus.WRITE_SINGLE_COIL, 1, 0xFF00)
+        self.assertEqual(self.client.request(1, request), request)
+        # Writing 0 is accepted and does nothing
+        request = struct.pack('>BHH', modbus.WRITE_SINGLE_COIL, 0, 0x0000)
+        self.assertEqual(self.client.request(1, request), request)
+        self.assertEqual(self.manager.serial.commands, ['tare', 'zero'])
+
+    def test_write_multiple_coils_sends_commands(self):
+        self.publish(10.0)
+        request = struct.pack('>BHHBB', modbus.WRITE_MULTIPLE_COILS, 0, 2, 1, 0b11)
+        self.assertEqual(self.client.request(1, request), request[:5])
+        request = struct.pack('>BHHBB', modbus.WRITE_MULTIPLE_COILS, 1, 1, 1, 0b1)
+        self.assertEqual(self.client.request(1, request), request[:5])
+        self.assertEqual(self.manager.serial.commands, ['tare', 'zero', 'zero'])
+
+    def test_read_coils_are_zero(self):
+        response = self.client.request(1, struct.pack('>BHH', modbus.READ_COILS, 0, 2))
+        self.assertEqual(response, bytes((modbus.READ_COILS, 1, 0)))
+
+    def test_exception_responses(self):
+        self.publish(10.0)
+        function = modbus.READ_HOLDING_REGISTERS
+        # Unsupported function code
+        self.assertException(self.client.request(1, bytes((0x06, 0, 0, 0, 1))), 0x06, modbus.ILLEGAL_FUNCTION)
+        # Past the end of the register map
+        self.assertException(
+            self.client.read_registers(1, function, modbus.REGISTER_COUNT - 1, 2), function, modbus.ILLEGAL_DATA_ADDRESS
+        )
+        # Quantity out of range
+        self.assertException(self.client.read_registers(1, function, 0, 0), function, modbus.ILLEGAL_DATA_VALUE)
+        self.assertException(self.client.read_registers(1, function, 0, 126), function, modbus.ILLEGAL_DATA_VALUE)
+        # Unknown unit
+        self.assertException(self.client.read_registers(9, function, 0, 1), function, modbus.GATEWAY_TARGET_FAILED)
+        # Bad coil value and address
+        self.assertException(
+            self.client.request(1, struct.pack('>BHH', modbus.WRITE_SINGLE_COIL, 0, 0x1234)),
+            modbus.WRITE_SINGLE_COIL, modbus.ILLEGAL_DATA_VALUE
+        )
+        self.assertException(
+            self.client.request(1, struct.pack('>BHH', modbus.WRITE_SINGLE_COIL, 2, 0xFF00)),
+            modbus.WRITE_SINGLE_COIL, modbus.ILLEGAL_DATA_ADDRESS
+        )
+        # Byte count that does not match the quantity
+        self.assertException(
+            self.client.request(1, struct.pack('>BHHBB', modbus.WRITE_MULTIPLE_COILS, 0, 2, 2, 0b11)),
+            modbus.WRITE_MULTIPLE_COILS, modbus.ILLEGAL_DATA_VALUE
+        )
+        # The scale refusing the command
+        self.manager.serial.fail = True
+        self.assertException(
+            self.client.request(1, struct.pack('>BHH', modbus.WRITE_SINGLE_COIL, 0, 0xFF00)),
+            modbus.WRITE_SINGLE_COIL, modbus.SERVER_DEVICE_FAILURE
+        )
+        self.assertEqual(self.manager.serial.commands, [])
+        # The connection is still usable after every exception
+        response = self.client.read_registers(1, function, modbus.REG_STABLE, 1)
+        self.assertEqual(response, bytes((function, 2, 0, 1)))
+
+    def test_stop_disconnects_masters(self):
+        self.client.read_registers(1, modbus.READ_HOLDING_REGISTERS, 0, 1)
+        self.service.stop()
+        self.client.sock.settimeout(2.0)
+        self.assertEqual(self.client.sock.recv(1), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from core.db import Database
+from services.replication_receiver import create_receiver_app
+from services.replication_service import ReplicationError, ReplicationService
+
+SITE = 'site-a'
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Receiver:
+    """The central receiver on a loopback port that survives restarts."""
+
+    def __init__(self, db_path):
+        self.app = create_receiver_app(db_path)
+        self.port = 0
+        self.server = None
+
+    def start(self):
+        self.server = make_server('127.0.0.1', self.port, self.app, threaded=True, request_handler=QuietHandler)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class ReplicationEndToEndTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger('test.replication').disabled = True
+        self.directory = tempfile.mkdtemp()
+        self.central_path = os.path.join(self.directory, 'central.db')
+        self.receiver = Receiver(self.central_path)
+        self.receiver.start()
+        self.db = Database(f"sqlite:///{os.path.join(self.directory, 'site.db')}")
+        self.add_readings(5)
+        self.service = ReplicationService(logging.getLogger('test.replication'), self.db, {
+            'replication_url': f'http://127.0.0.1:{self.receiver.port}',
+            'site_id': SITE,
+            'replication_tables': ['readings'],
+            'replication_batch_rows': 3,
+            'replication_interval_s': 0.05
+        })
+
+    def tearDown(self):
+        self.service.stop()
+        self.receiver.stop()
+        self.db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def add_readings(self, count):
+        start = 1763847600.0 + len(self.db.search_readings(limit=1000))
+        self.db.insert_readings([(start + i, 1000.0 + i, True, 1) for i in range(count)])
+
+    def central(self, sql, *params):
+        conn = sqlite3.connect(self.central_path)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def central_ids(self):
+        return [row[0] for row in self.central('SELECT id FROM site_readings WHERE site_id = ? ORDER BY id', SITE)]
+
+    def acked(self):
+        rows = self.central("SELECT acked_id FROM replication_sites WHERE site_id = ? AND table_name = 'readings'", SITE)
+        return rows[0][0] if rows else 0
+
+    def ship_all(self):
+        while self.service._ship('readings'):
+            pass
+
+    def wait_for_acked(self, acked_id, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while self.acked() != acked_id and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.acked(), acked_id)
+
+    def test_batches_are_applied_in_order(self):
+        self.assertEqual(self.service._ship('readings'), 3)
+        self.assertEqual((self.central_ids(), self.acked()), ([1, 2, 3], 3))
+        self.assertEqual(self.service._ship('readings'), 2)
+        self.assertEqual(self.service._ship('readings'), 0)
+        self.assertEqual((self.central_ids(), self.acked()), ([1, 2, 3, 4, 5], 5))
+        self.assertEqual(self.db.get_replication_hwm('readings'), 5)
+        weights = self.central('SELECT weight_kg FROM site_readings ORDER BY id')
+        self.assertEqual([row[0] for row in weights], [1000.0, 1001.0, 1002.0, 1003.0, 1004.0])
+
+    def test_catches_up_after_an_outage(self):
+        self.service.start()
+        self.wait_for_acked(5)
+
+        self.receiver.stop()
+        self.add_readings(4)
+        time.sleep(0.3)
+        self.assertEqual(self.db.get_replication_hwm('readings'), 5)
+
+        self.receiver.start()
+        self.wait_for_acked(9)
+        self.assertEqual(self.central_ids(), list(range(1, 10)))
+        self.assertEqual(self.db.get_replication_hwm('readings'), 9)
+
+    def test_gap_resends_what_the_receiver_lost(self):
+        self.ship_all()
+        # The receiver is rolled back to an older state behind the sender
+        self.central('DELETE FROM site_readings WHERE id > 3')
+        self.central("UPDATE replication_sites SET acked_id = 3")
+        self.add_readings(2)
+
+        with self.assertRaisesRegex(ReplicationError, 'HTTP 409'):
+            self.service._ship('readings')
+        self.assertEqual(self.db.get_replication_hwm('readings'), 5)
+
+        # What _run does after a failed batch
+        self.service._close()
+        self.service._synced_tables.clear()
+        self.ship_all()
+        self.assertEqual(self.central_ids(), list(range(1, 8)))
+        self.assertEqual((self.acked(), self.db.get_replication_hwm('readings')), (7, 7))
+
+    def test_resent_batches_are_ignored(self):
+        self.ship_all()
+        # The acknowledgement was lost, so the sender still has its old mark
+        self.db.set_replication_hwm('readings', 0)
+        self.ship_all()
+        self.add_readings(1)
+        self.db.set_replication_hwm('readings', 2)
+        self.ship_all()
+
+        duplicates = self.central('SELECT id FROM site_readings GROUP BY site_id, id HAVING count(*) > 1')
+        self.assertEqual(duplicates, [])
+        self.assertEqual(self.central_ids(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual((self.acked(), self.db.get_replication_hwm('readings')), (6, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+import unittest
+
+from services.service_manager import ServiceManager, ServiceStatus
+
+TRANSITION_S = 0.2
+
+
+class SlowService:
+    """Stub whose start and stop each take TRANSITION_S."""
+
+    def __init__(self, logger, db, config, service_manager=None):
+        self.running = False
+
+    def start(self):
+        time.sleep(TRANSITION_S)
+        self.running = True
+
+    def stop(self):
+        time.sleep(TRANSITION_S)
+        self.running = False
+
+    def is_alive(self):
+        return self.running
+
+
+class StatusReadsTest(unittest.TestCase):
+    """Status reads must not wait for services that are starting or stopping."""
+
+    def setUp(self):
+        self.manager = ServiceManager(logging.getLogger('test'), None, {})
+        self.manager._service_registry.clear()
+        for service_id in ('slow', 'other'):
+            self.manager.register_service(service_id, __name__, 'SlowService')
+        self.manager.start_many(['slow', 'other'])
+
+    def tearDown(self):
+        self.manager.stop_all()
+
+    def test_reads_stay_fast_while_a_service_restarts(self):
+        stop = threading.Event()
+
+        def restart_loop():
+            while not stop.is_set():
+                self.manager.restart('slow')
+
+        restarter = threading.Thread(target=restart_loop, daemon=True)
+        restarter.start()
+        latencies = []
+        statuses = set()
+        try:
+            deadline = time.monotonic() + 5 * TRANSITION_S
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                services = self.manager.list_services()
+                other = self.manager.get_service('other')
+                latencies.append(time.perf_counter() - started)
+                statuses.add(services['slow']['status'])
+                self.assertIsNotNone(other)
+                time.sleep(0.001)
+        finally:
+            stop.set()
+            restarter.join(timeout=10.0)
+
+        # The reads overlapped real transitions...
+        self.assertTrue({'STARTING', 'STOPPING'} & statuses)
+        # ...and never waited for one
+        self.assertLess(max(latencies), TRANSITION_S / 4)
+
+    def test_reads_do_not_take_the_lock(self):
+        results = []
+
+        def read():
+            results.append(self.manager.list_services())
+            results.append(self.manager.get_service('slow'))
+            results.append(self.manager.is_service_running('slow'))
+
+        with self.manager._lock:
+            reader = threading.Thread(target=read, daemon=True)
+            reader.start()
+            reader.join(timeout=1.0)
+            self.assertFalse(reader.is_alive())
+        self.assertEqual(len(results), 3)
+        self.assertTrue(results[2])
+
+    def test_snapshot_is_read_only_and_current(self):
+        snapshot = self.manager.snapshot()
+        self.assertEqual(snapshot['slow'].status, ServiceStatus.RUNNING)
+        with self.assertRaises(TypeError):
+            snapshot['slow'] = None
+        self.manager.stop('slow')
+        self.assertEqual(snapshot['slow'].status, ServiceStatus.RUNNING)
+        self.assertEqual(self.manager.snapshot()['slow'].status, ServiceStatus.STOPPED)
+
+
+if __name__ == '__main__':
+    unittest.main()
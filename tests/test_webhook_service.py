@@ -0,0 +1,137 @@
+import json
+import logging
+import threading
+import time
+import unittest
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from services.webhook_service import WebhookService, _Subscriber
+
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class SlowEndpoint:
+    """Webhook endpoint that takes ``delay`` seconds per request and logs when each ran."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+        self.server = make_server('127.0.0.1', 0, self, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}/hook'
+
+    def __call__(self, environ, start_response):
+        started = time.monotonic()
+        body = environ['wsgi.input'].read(int(environ.get('CONTENT_LENGTH') or 0))
+        time.sleep(self.delay)
+        self.calls.append((json.loads(body)['seq'], started, time.monotonic()))
+        start_response('204 No Content', [('Content-Length', '0')])
+        return [b'']
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeDb:
+    def __init__(self, subscriptions):
+        self.subscriptions = subscriptions
+
+    def list_webhooks(self, enabled_only=False, include_secret=False):
+        return [dict(subscription) for subscription in self.subscriptions]
+
+
+def subscription(url, name='erp'):
+    return {'id': 1, 'name': name, 'url': url, 'event_types': [], 'device_id': None,
+            'secret': None, 'max_concurrency': 2}
+
+
+def event(seq):
+    return {'event_id': f'event-{seq}', 'type': 'weight.stable',
+            'body': json.dumps({'seq': seq}).encode('utf-8')}
+
+
+class QueueBoundTest(unittest.TestCase):
+
+    def setUp(self):
+        service = WebhookService(logging.getLogger('test'), None, {'webhook_max_queue': 3})
+        # Not started, so nothing is taken off the queues
+        self.sub = _Subscriber(service, subscription('http://127.0.0.1:1/hook'))
+
+    def tearDown(self):
+        self.sub.stop()
+
+    def queued(self):
+        return {device_id: [e['event_id'] for e in queue] for device_id, queue in self.sub.queues.items()}
+
+    def test_limit_holds_across_devices(self):
+        for seq, device_id in enumerate((1, 1, 2, 3, 4, 5)):
+            self.sub.offer(device_id, event(seq))
+            self.assertLessEqual(self.sub.depth, 3)
+        self.assertEqual(self.sub.depth, 3)
+        self.assertEqual(self.sub.dropped, 3)
+        self.assertEqual(self.queued(), {3: ['event-3'], 4: ['event-4'], 5: ['event-5']})
+        self.assertEqual(list(self.sub.ready), [3, 4, 5])
+
+    def test_device_with_a_backlog_loses_its_own_oldest(self):
+        for seq, device_id in enumerate((1, 2, 2, 2)):
+            self.sub.offer(device_id, event(seq))
+        self.assertEqual(self.queued(), {1: ['event-0'], 2: ['event-2', 'event-3']})
+
+    def test_queues_drain_after_drops(self):
+        for seq in range(5):
+            self.sub.offer(seq % 2, event(seq))
+        taken = []
+        while self.sub.ready:
+            device_id, taken_event = self.sub._take()
+            taken.append(taken_event['event_id'])
+            self.sub._release(device_id)
+        self.assertEqual(sorted(taken), ['event-2', 'event-3', 'event-4'])
+        self.assertEqual(self.sub.depth, 0)
+
+
+class ReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.endpoint = SlowEndpoint(0.5)
+        self.db = FakeDb([subscription(self.endpoint.url)])
+        self.service = WebhookService(logging.getLogger('test'), self.db, {'webhook_max_attempts': 1})
+        self.service.start()
+
+    def tearDown(self):
+        self.service.stop()
+        self.endpoint.stop()
+
+    def test_replacement_waits_for_in_flight_delivery(self):
+        old = self.service._subscribers[0]
+        old.offer(None, event(1))
+        while not old.in_flight:
+            time.sleep(0.01)
+
+        self.db.subscriptions = [subscription(self.endpoint.url, name='erp-renamed')]
+        reload = threading.Thread(target=self.service.reload)
+        reload.start()
+        while self.service._subscribers[0] is old:
+            time.sleep(0.01)
+        self.service._subscribers[0].offer(None, event(2))
+        reload.join(5.0)
+
+        deadline = time.monotonic() + 5.0
+        while len(self.endpoint.calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        (first, _, first_end), (second, second_start, _) = sorted(self.endpoint.calls, key=lambda call: call[1])
+        self.assertEqual((first, second), (1, 2))
+        self.assertGreaterEqual(second_start, first_end)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,23 +2,109 @@ from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QTabWidget,
     QLabel, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
     QComboBox, QGroupBox, QCheckBox, QMessageBox, QFileDialog,
-    QHeaderView, QProgressBar, QTextEdit, QSplitter, QWidget
+    QHeaderView, QProgressBar, QTextEdit, QSplitter, QWidget, QTableView, QSpinBox
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QSize
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QSize, QThread, QAbstractTableModel, QModelIndex
 from PyQt5.QtGui import QIcon, QPixmap
 import os
 import json
 import platform
 import psutil
 import sqlite3
-from datetime import datetime
-import shutil
+import threading
+from datetime import datetime, timedelta
+
+from core.backup import DatabaseBackup
+from core.profiling import PROFILER
+from core.tracing import TRACER
+
+
+class LogTableModel(QAbstractTableModel):
+    """Read-only view of the logs table that loads keyset pages on demand."""
+    COLUMNS = ["Time", "Level", "Message"]
+    PAGE_SIZE = 200
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.filters = {}
+        self._rows = []
+        self._exhausted = False
+
+    def set_filters(self, **filters):
+        self.beginResetModel()
+        self.filters = filters
+        self._rows = []
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        return (row['timestamp'][:19].replace('T', ' '), row['level'], row['message'])[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return self.db is not None and not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        before_id = self._rows[-1]['id'] if self._rows else None
+        page = self.db.search_logs(before_id=before_id, limit=self.PAGE_SIZE, **self.filters)
+        if len(page) < self.PAGE_SIZE:
+            self._exhausted = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
+
+
+
+class BackupWorker(QThread):
+    """Runs a backup (and optionally a restore) off the UI thread."""
+    progress = pyqtSignal(str, int, int)  # stage, done, total
+    succeeded = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, backup, db=None, restore_from=None, parent=None):
+        super().__init__(parent)
+        self.backup = backup
+        self.db = db
+        self.restore_from = restore_from
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            # Always take a fresh backup first, so a restore can be undone
+            path = self.backup.create(progress=self.progress.emit, cancel_event=self.cancel_event)
+            if self.restore_from:
+                self.backup.restore(self.db, self.restore_from, progress=self.progress.emit)
+            self.succeeded.emit(path)
+        except Exception as e:
+            self.failed.emit(str(e))
+
 
 class AdminDialog(QDialog):
-    def __init__(self, parent=None, db_path=None, logger=None):
+    def __init__(self, parent=None, db_path=None, logger=None, db=None):
         super().__init__(parent)
-        self.db_path = db_path or 'weighbridge_local.db'
+        self.db_path = db_path or (db.path if db else 'weighbridge_local.db')
+        # Log search and restore go through the app's own Database, so the
+        # restore can quiesce its writers; without one they are disabled
+        self.db = db
         self.logger = logger
+        self.backup = DatabaseBackup(self.db_path)
+        self.backup_worker = None
         self.setWindowTitle("Administration Panel")
         self.setMinimumSize(800, 600)
         
@@ -38,11 +124,13 @@ class AdminDialog(QDialog):
         system_tab = self.create_system_tab()
         backup_tab = self.create_backup_tab()
         logs_tab = self.create_logs_tab()
+        diagnostics_tab = self.create_diagnostics_tab()
         
         tabs.addTab(user_tab, "User Management")
         tabs.addTab(system_tab, "System Info")
         tabs.addTab(backup_tab, "Backup & Restore")
         tabs.addTab(logs_tab, "Logs")
+        tabs.addTab(diagnostics_tab, "Diagnostics")
         
         main_layout.addWidget(tabs)
         
@@ -155,6 +243,9 @@ class AdminDialog(QDialog):
         backup_layout.addWidget(self.backup_btn)
         backup_group.setLayout(backup_layout)
         
+        self.backup_progress = QProgressBar()
+        self.backup_progress.setVisible(False)
+        
         # Restore controls
         restore_group = QGroupBox("Restore")
         restore_layout = QVBoxLayout()
@@ -162,11 +253,13 @@ class AdminDialog(QDialog):
         self.restore_btn = QPushButton("Restore from Backup")
         self.restore_btn.clicked.connect(self.restore_backup)
         
+        self.restore_btn.setEnabled(self.db is not None)
         restore_layout.addWidget(self.restore_btn)
         restore_group.setLayout(restore_layout)
         
         layout.addWidget(backup_group)
         layout.addWidget(restore_group)
+        layout.addWidget(self.backup_progress)
         layout.addStretch()
         
         return tab
@@ -175,9 +268,30 @@ class AdminDialog(QDialog):
         tab = QWidget()
         layout = QVBoxLayout(tab)
         
-        self.log_view = QTextEdit()
-        self.log_view.setReadOnly(True)
-        self.log_view.setFontFamily("Courier")
+        filter_layout = QHBoxLayout()
+        self.log_level_combo = QComboBox()
+        self.log_level_combo.addItems(["All Levels", "DEBUG", "INFO", "WARN", "ERROR"])
+        self.log_range_combo = QComboBox()
+        self.log_range_combo.addItems(["All Time", "Last Hour", "Last 24 Hours", "Last 7 Days", "Last 30 Days"])
+        self.log_search_edit = QLineEdit()
+        self.log_search_edit.setPlaceholderText("Search messages...")
+        
+        self.log_level_combo.currentIndexChanged.connect(self.refresh_logs)
+        self.log_range_combo.currentIndexChanged.connect(self.refresh_logs)
+        self.log_search_edit.returnPressed.connect(self.refresh_logs)
+        
+        filter_layout.addWidget(self.log_level_combo)
+        filter_layout.addWidget(self.log_range_combo)
+        filter_layout.addWidget(self.log_search_edit, stretch=1)
+        
+        self.log_model = LogTableModel(self.db, self)
+        self.log_view = QTableView()
+        self.log_view.setModel(self.log_model)
+        self.log_view.verticalHeader().setVisible(False)
+        self.log_view.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.log_view.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        self.log_view.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.log_view.setSelectionBehavior(QTableView.SelectRows)
         
         btn_layout = QHBoxLayout()
         self.refresh_logs_btn = QPushButton("Refresh")
@@ -194,11 +308,86 @@ class AdminDialog(QDialog):
         btn_layout.addStretch()
         
         layout.addWidget(QLabel("Application Logs"))
+        layout.addLayout(filter_layout)
         layout.addWidget(self.log_view)
         layout.addLayout(btn_layout)
         
-        # Load initial logs
-        self.refresh_logs()
+        if self.db is None:
+            for widget in (self.log_level_combo, self.log_range_combo, self.log_search_edit,
+                           self.refresh_logs_btn, self.clear_logs_btn, self.export_logs_btn):
+                widget.setEnabled(False)
+            layout.addWidget(QLabel("Logs require a live database connection."))
+        else:
+            # Load initial logs
+            self.refresh_logs()
+        
+        return tab
+    
+    def create_diagnostics_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        
+        # Latency from serial bytes to each later pipeline stage
+        latency_group = QGroupBox("Sample Latency (ms)")
+        latency_layout = QVBoxLayout()
+        
+        self.latency_summary = QLabel()
+        self.latency_table = QTableWidget()
+        self.latency_table.setColumnCount(8)
+        self.latency_table.setHorizontalHeaderLabels([
+            "Stage", "Samples", "Step p50", "Step p99", "Total p50", "Total p90", "Total p99", "Total max"
+        ])
+        self.latency_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.latency_table.verticalHeader().setVisible(False)
+        self.latency_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        
+        latency_layout.addWidget(self.latency_summary)
+        latency_layout.addWidget(self.latency_table)
+        latency_group.setLayout(latency_layout)
+        
+        # Time-boxed profiles of the running process
+        profile_group = QGroupBox("Profiling")
+        profile_layout = QVBoxLayout()
+        
+        controls = QHBoxLayout()
+        self.profile_seconds = QSpinBox()
+        self.profile_seconds.setRange(1, 300)
+        self.profile_seconds.setValue(10)
+        self.profile_seconds.setSuffix(" s")
+        self.profile_cpu_btn = QPushButton("Profile CPU")
+        self.profile_memory_btn = QPushButton("Capture Allocations")
+        self.save_cpu_btn = QPushButton("Save CPU Report...")
+        self.save_memory_btn = QPushButton("Save Allocation Report...")
+        
+        self.profile_cpu_btn.clicked.connect(lambda: self.start_profile('cpu'))
+        self.profile_memory_btn.clicked.connect(lambda: self.start_profile('memory'))
+        self.save_cpu_btn.clicked.connect(lambda: self.save_profile_report('cpu'))
+        self.save_memory_btn.clicked.connect(lambda: self.save_profile_report('memory'))
+        
+        controls.addWidget(QLabel("Duration:"))
+        controls.addWidget(self.profile_seconds)
+        controls.addWidget(self.profile_cpu_btn)
+        controls.addWidget(self.profile_memory_btn)
+        controls.addStretch()
+        controls.addWidget(self.save_cpu_btn)
+        controls.addWidget(self.save_memory_btn)
+        
+        self.profile_status = QLabel()
+        profile_layout.addLayout(controls)
+        profile_layout.addWidget(self.profile_status)
+        profile_group.setLayout(profile_layout)
+        
+        layout.addWidget(latency_group)
+        layout.addWidget(profile_group)
+        
+        self.profile_timer = QTimer(self)
+        self.profile_timer.timeout.connect(self.refresh_profile_status)
+        self.refresh_profile_status()
+        
+        self.latency_timer = QTimer(self)
+        self.latency_timer.timeout.connect(self.refresh_latency)
+        self.latency_timer.start(2000)
+        self.refresh_latency()
         
         return tab
     
@@ -308,14 +497,11 @@ class AdminDialog(QDialog):
                 conn.close()
             
             # Get last backup time
-            backup_dir = os.path.join(os.path.dirname(self.db_path), 'backups')
-            if os.path.exists(backup_dir):
-                backups = [f for f in os.listdir(backup_dir) if f.endswith('.db')]
-                if backups:
-                    latest = max(backups, key=lambda f: os.path.getmtime(os.path.join(backup_dir, f)))
-                    mtime = os.path.getmtime(os.path.join(backup_dir, latest))
-                    self.last_backup.setText(datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S'))
-                    return
+            backups = self.backup.list_backups()
+            if backups:
+                mtime = os.path.getmtime(backups[0])
+                self.last_backup.setText(datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S'))
+                return
             
             self.last_backup.setText("Never")
                 
@@ -325,59 +511,161 @@ class AdminDialog(QDialog):
     
     # Backup/Restore Methods
     def create_backup(self):
-        try:
-            backup_dir = os.path.join(os.path.dirname(self.db_path), 'backups')
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_path = os.path.join(backup_dir, f"weighbridge_backup_{timestamp}.db")
-            
-            shutil.copy2(self.db_path, backup_path)
-            
-            self.status_bar.setText(f"Backup created: {os.path.basename(backup_path)}")
-            self.load_database_stats()
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Backup Failed", f"Failed to create backup:\n{str(e)}")
+        self._start_backup_worker()
     
     def restore_backup(self):
-        try:
-            backup_dir = os.path.join(os.path.dirname(self.db_path), 'backups')
-            if not os.path.exists(backup_dir):
-                os.makedirs(backup_dir, exist_ok=True)
-            
-            filename, _ = QFileDialog.getOpenFileName(
-                self, "Select Backup File", 
-                backup_dir,
-                "Database Files (*.db);;All Files (*)"
-            )
-            
-            if filename:
-                if QMessageBox.question(
-                    self, "Confirm Restore",
-                    "WARNING: This will overwrite the current database. Continue?",
-                    QMessageBox.Yes | QMessageBox.No
-                ) == QMessageBox.Yes:
-                    # Create a backup before restoring
-                    self.create_backup()
-                    
-                    # Restore the selected backup
-                    shutil.copy2(filename, self.db_path)
-                    
-                    self.status_bar.setText("Database restored successfully")
-                    self.load_database_stats()
+        if self.db is None:
+            QMessageBox.warning(self, "Restore Unavailable",
+                                "Restore requires a live database connection.")
+            return
         
-        except Exception as e:
-            QMessageBox.critical(self, "Restore Failed", f"Failed to restore backup:\n{str(e)}")
+        os.makedirs(self.backup.backup_dir, exist_ok=True)
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "Select Backup File", 
+            self.backup.backup_dir,
+            "Database Files (*.db *.db.gz);;All Files (*)"
+        )
+        
+        if filename:
+            if QMessageBox.question(
+                self, "Confirm Restore",
+                "WARNING: This will overwrite the current database. Continue?",
+                QMessageBox.Yes | QMessageBox.No
+            ) == QMessageBox.Yes:
+                self._start_backup_worker(restore_from=filename)
+    
+    def _start_backup_worker(self, restore_from=None):
+        if self.backup_worker and self.backup_worker.isRunning():
+            return
+        
+        self.backup_worker = BackupWorker(self.backup, db=self.db, restore_from=restore_from, parent=self)
+        self.backup_worker.progress.connect(self._on_backup_progress)
+        self.backup_worker.succeeded.connect(self._on_backup_succeeded)
+        self.backup_worker.failed.connect(self._on_backup_failed)
+        self.backup_worker.finished.connect(self._on_backup_finished)
+        
+        self.backup_btn.setEnabled(False)
+        self.restore_btn.setEnabled(False)
+        self.backup_progress.setValue(0)
+        self.backup_progress.setVisible(True)
+        self.backup_worker.start()
+    
+    def _on_backup_progress(self, stage, done, total):
+        self.backup_progress.setMaximum(max(total, 1))
+        self.backup_progress.setValue(done)
+        self.status_bar.setText(f"Backup: {stage}...")
+    
+    def _on_backup_succeeded(self, path):
+        if self.backup_worker.restore_from:
+            self.status_bar.setText("Database restored successfully")
+            if self.logger:
+                self.logger.info(f"Database restored from {os.path.basename(self.backup_worker.restore_from)}")
+        else:
+            self.status_bar.setText(f"Backup created: {os.path.basename(path)}")
+        self.load_database_stats()
+    
+    def _on_backup_failed(self, message):
+        title = "Restore Failed" if self.backup_worker.restore_from else "Backup Failed"
+        QMessageBox.critical(self, title, f"{title}:\n{message}")
+        if self.logger:
+            self.logger.error(f"{title}: {message}")
+    
+    def _on_backup_finished(self):
+        self.backup_btn.setEnabled(True)
+        self.restore_btn.setEnabled(self.db is not None)
+        self.backup_progress.setVisible(False)
+    
+    # Diagnostics Methods
+    def refresh_latency(self):
+        summary = TRACER.summary()
+        state = "on" if summary['enabled'] else "off"
+        self.latency_summary.setText(f"Tracing {state}, {summary['samples']} recent samples")
+        
+        def cell(percentiles, key):
+            return f"{percentiles[key]:.3f}" if percentiles else "-"
+        
+        self.latency_table.setRowCount(len(summary['stages']))
+        for i, stage in enumerate(summary['stages']):
+            values = [
+                stage['stage'], str(stage['count']),
+                cell(stage['step_ms'], 'p50'), cell(stage['step_ms'], 'p99'),
+                cell(stage['total_ms'], 'p50'), cell(stage['total_ms'], 'p90'),
+                cell(stage['total_ms'], 'p99'), cell(stage['total_ms'], 'max')
+            ]
+            for j, value in enumerate(values):
+                self.latency_table.setItem(i, j, QTableWidgetItem(value))
+    
+    def start_profile(self, kind):
+        try:
+            PROFILER.start(kind, seconds=self.profile_seconds.value())
+        except (ValueError, RuntimeError) as e:
+            QMessageBox.warning(self, "Profiling", str(e))
+            return
+        if self.logger:
+            self.logger.info(f"Started {kind} profile for {self.profile_seconds.value()}s")
+        self.profile_timer.start(500)
+        self.refresh_profile_status()
+    
+    def refresh_profile_status(self):
+        names = {'cpu': "CPU", 'memory': "Allocations"}
+        parts = []
+        running = False
+        for kind in ('cpu', 'memory'):
+            job = PROFILER.status(kind)
+            if job is None:
+                continue
+            if job['state'] == 'running':
+                running = True
+                elapsed = datetime.now().timestamp() - job['started']
+                parts.append(f"{names[kind]}: running ({elapsed:.0f}/{job['seconds']:.0f} s)")
+            elif job['state'] == 'failed':
+                parts.append(f"{names[kind]}: failed ({job['error']})")
+            else:
+                parts.append(f"{names[kind]}: {job['state']}")
+        self.profile_status.setText("; ".join(parts) or "No profiles taken")
+        self.profile_cpu_btn.setEnabled(not self._profile_running('cpu'))
+        self.profile_memory_btn.setEnabled(not self._profile_running('memory'))
+        self.save_cpu_btn.setEnabled(PROFILER.report('cpu') is not None)
+        self.save_memory_btn.setEnabled(PROFILER.report('memory') is not None)
+        if not running:
+            self.profile_timer.stop()
+    
+    @staticmethod
+    def _profile_running(kind):
+        job = PROFILER.status(kind)
+        return job is not None and job['state'] == 'running'
+    
+    def save_profile_report(self, kind):
+        report = PROFILER.report(kind)
+        if report is None:
+            return
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save Profile Report",
+            f"weighbridge_{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            "Text Files (*.txt);;All Files (*)"
+        )
+        if filename:
+            try:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.write(report)
+                self.status_bar.setText(f"Saved {kind} profile to {filename}")
+            except OSError as e:
+                QMessageBox.critical(self, "Save Failed", f"Failed to save report:\n{str(e)}")
     
     # Logs Methods
+    def log_filters(self):
+        """Current filter settings as keyword arguments for Database.search_logs"""
+        ranges = [None, timedelta(hours=1), timedelta(days=1), timedelta(days=7), timedelta(days=30)]
+        window = ranges[self.log_range_combo.currentIndex()]
+        level = self.log_level_combo.currentText()
+        return {
+            'level': None if level == "All Levels" else level,
+            'since': datetime.utcnow() - window if window else None,
+            'text_query': self.log_search_edit.text().strip() or None
+        }
+    
     def refresh_logs(self):
-        # TODO: Load logs from file or database
-        self.log_view.clear()
-        self.log_view.append("2023-11-22 15:30:45 - INFO: Application started")
-        self.log_view.append("2023-11-22 15:31:10 - INFO: Connected to scale")
-        self.log_view.append("2023-11-22 15:35:22 - WARNING: Scale connection lost, retrying...")
-        self.log_view.append("2023-11-22 15:35:25 - INFO: Scale reconnected")
+        self.log_model.set_filters(**self.log_filters())
     
     def clear_logs(self):
         if QMessageBox.question(
@@ -385,9 +673,12 @@ class AdminDialog(QDialog):
             "Are you sure you want to clear all logs?",
             QMessageBox.Yes | QMessageBox.No
         ) == QMessageBox.Yes:
-            # TODO: Clear logs from file or database
-            self.log_view.clear()
-            self.status_bar.setText("Logs cleared")
+            try:
+                self.db.clear_logs()
+                self.refresh_logs()
+                self.status_bar.setText("Logs cleared")
+            except Exception as e:
+                QMessageBox.critical(self, "Clear Failed", f"Failed to clear logs:\n{str(e)}")
     
     def export_logs(self):
         filename, _ = QFileDialog.getSaveFileName(
@@ -398,9 +689,17 @@ class AdminDialog(QDialog):
         
         if filename:
             try:
-                with open(filename, 'w') as f:
-                    f.write(self.log_view.toPlainText())
-                self.status_bar.setText(f"Logs exported to {filename}")
+                # Stream page by page so exporting a year of logs never
+                # holds more than one chunk in memory
+                count = 0
+                with open(filename, 'w', encoding='utf-8') as f:
+                    for page in self.db.iter_logs(**self.log_filters()):
+                        f.writelines(
+                            f"[{row['timestamp'][:19].replace('T', ' ')}] [{row['level']}] {row['message']}\n"
+                            for row in page
+                        )
+                        count += len(page)
+                self.status_bar.setText(f"Exported {count} log entries to {filename}")
             except Exception as e:
                 QMessageBox.critical(self, "Export Failed", f"Failed to export logs:\n{str(e)}")
     
@@ -408,4 +707,11 @@ class AdminDialog(QDialog):
         # Clean up resources
         if hasattr(self, 'stats_timer') and self.stats_timer.isActive():
             self.stats_timer.stop()
+        if hasattr(self, 'latency_timer') and self.latency_timer.isActive():
+            self.latency_timer.stop()
+        if hasattr(self, 'profile_timer') and self.profile_timer.isActive():
+            self.profile_timer.stop()
+        if self.backup_worker and self.backup_worker.isRunning():
+            self.backup_worker.cancel_event.set()
+            self.backup_worker.wait()
         event.accept()
\ No newline at end of file
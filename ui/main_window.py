@@ -4,19 +4,37 @@ from PyQt5.QtWidgets import (
     QTableWidget, QTableWidgetItem, QHeaderView,
     QPushButton, QLabel, QSizePolicy
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtWidgets import QDialog
 from ui.components.styled_components import RoundedButton, StatusIndicator, LogPanel
 from ui.dialogs.settings_dialog import SettingsDialog
 from ui.dialogs.api_settings_dialog import ApiSettingsDialog
+from core.metrics import REGISTRY
+
+LOG_APPENDS = REGISTRY.counter('ui_log_appends_total', 'Lines appended to the log panel')
 
 class MainWindow(QMainWindow):
+    # Emitted from the logger's sink thread; Qt queues it onto the GUI thread
+    log_received = pyqtSignal(str, str)
+    # Emitted from whichever thread changed a service's state
+    service_state_changed = pyqtSignal(str, str)
+
+    # Services shown in the table, by row
+    SERVICE_ROWS = {'serial': 0, 'api': 1}
+
     def __init__(self, service_manager, logger, config, parent=None):
         super().__init__(parent)
         self.service_manager = service_manager
         self.logger = logger
         self.config = config
         self.setup_ui()
+        self.log_received.connect(self.append_log)
+        self.service_state_changed.connect(self.on_service_state)
+        # The supervisor can stop and restart services behind the buttons'
+        # back; keep the table in line with the real state
+        self.service_manager.events.subscribe(
+            'service_state', lambda change: self.service_state_changed.emit(change[0], change[1].name)
+        )
         self.show_settings_dialog = self.show_settings_dialog_with_update
 
     def show_settings_dialog_with_update(self, row):
@@ -187,9 +205,10 @@ class MainWindow(QMainWindow):
         settings_btn.clicked.connect(lambda checked, r=row: self.show_settings_dialog(r))
 
     def setup_connections(self):
-        self.logger.set_ui_callback(self.append_log)
+        self.logger.set_ui_callback(self.log_received.emit)
 
     def append_log(self, level, message):
+        LOG_APPENDS.inc()
         self.log_panel.append(f"[{level}] {message}")
 
     def start_service(self, row):
@@ -207,7 +226,7 @@ class MainWindow(QMainWindow):
                 self.logger.info(f"{service_name} started.")
             except Exception as e:
                 self.logger.error(f"Failed to start {service_name}: {str(e)}")
-        self.update_service_status(row, True)
+            self.update_service_status(row, self.service_manager.is_service_running(service_id))
 
     def stop_service(self, row):
         service_name = self.services_table.item(row, 0).text()
@@ -223,7 +242,12 @@ class MainWindow(QMainWindow):
                 self.logger.info(f"{service_name} stopped.")
             except Exception as e:
                 self.logger.error(f"Failed to stop {service_name}: {str(e)}")
-        self.update_service_status(row, False)
+            self.update_service_status(row, self.service_manager.is_service_running(service_id))
+
+    def on_service_state(self, service_id, status):
+        row = self.SERVICE_ROWS.get(service_id)
+        if row is not None:
+            self.update_service_status(row, status == 'RUNNING')
 
     def update_service_status(self, row, is_running):
         status_indicator = self.services_table.cellWidget(row, 2).findChild(StatusIndicator)